@@ -1,4 +1,18 @@
-from . import parser
+import importlib
+from types import ModuleType
+from typing import TYPE_CHECKING
+
 from ._version import __version__
 
+if TYPE_CHECKING:
+    from . import parser
+
 __all__ = ["__version__", "parser"]
+
+
+def __getattr__(name: str) -> ModuleType:
+    # the parser imports markdown-it and pylatexenc, so it is loaded on first use
+    if name == "parser":
+        return importlib.import_module(f"{__name__}.parser")
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
@@ -0,0 +1,222 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import io
+import pathlib
+import time
+import weakref
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Self
+
+from .batch import (
+    call_in_worker,
+    dump_sources,
+    init_worker,
+    is_json_object,
+    load_sources,
+    new_renumberer,
+    renumber_sources,
+)
+from .stats import RenumberStats
+
+if TYPE_CHECKING:
+    from .parser import TagRenumberer
+
+DEFAULT_MAX_CONCURRENCY = 4
+""" documents renumbered at the same time by an ``AsyncRenumberer`` """
+
+_DOCUMENT_PATH = pathlib.Path("<bytes>")
+
+
+@dataclass
+class RenumberResult:
+    """Renumbered bytes of a notebook or a markdown document, with a summary of the changes."""
+
+    data: bytes
+    """ the document with its markdown sources replaced (the input bytes if nothing changed) """
+    changed_cells: list[int] = field(default_factory=list)
+    """ indices (among all cells) of the markdown cells whose source changed """
+    stats: RenumberStats = field(default_factory=RenumberStats)
+    """ counters and phase times, e.g. ``insertions`` and ``refs_rewritten`` """
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.changed_cells)
+
+
+def renumber_bytes(
+    data: bytes,
+    renumberer: "TagRenumberer | None" = None,
+    *,
+    markdown: bool | None = None,
+) -> RenumberResult:
+    """Renumber a notebook or a markdown document held in memory.
+
+    Args:
+        data (bytes): the document
+        renumberer (TagRenumberer | None): renumberer to reuse
+        markdown (bool | None): whether the document is a markdown document,
+            None reads a JSON object as a notebook and anything else as markdown
+    Returns:
+        RenumberResult: new bytes and summary of the changes
+
+    """
+    renumberer = renumberer or new_renumberer()
+    stats = RenumberStats()
+    if markdown is None:
+        markdown = not is_json_object(data)
+    start = time.perf_counter()
+    sources = load_sources(_DOCUMENT_PATH, data, markdown=markdown)
+    stats.read_time += time.perf_counter() - start
+    texts = renumber_sources(sources.texts, renumberer)
+    stats.merge(renumberer.stats)
+    changed_cells = [
+        index
+        for index, source, text in zip(sources.cell_indices, sources.texts, texts, strict=True)
+        if text != source
+    ]
+    if not changed_cells:
+        return RenumberResult(data, stats=stats)
+    start = time.perf_counter()
+    f = io.BytesIO()
+    dump_sources(sources, texts, f)
+    stats.write_time += time.perf_counter() - start
+    return RenumberResult(f.getvalue(), changed_cells, stats)
+
+
+def _renumber_item(item: tuple[bytes, bool | None], renumberer: "TagRenumberer") -> RenumberResult:
+    data, markdown = item
+    return renumber_bytes(data, renumberer, markdown=markdown)
+
+
+class AsyncRenumberer:
+    """Renumber documents from an event loop without blocking it.
+
+    The documents are renumbered by a pool of ``max_concurrency`` worker processes,
+    each reusing its own ``TagRenumberer``, or of threads sharing one ``TagParser``.
+    At most ``max_concurrency`` documents are submitted at a time, the others wait in
+    the event loop, where they can be cancelled without costing any work. A document
+    that is cancelled while it is renumbered keeps its worker until it is done, and its
+    result is dropped.
+
+    Use it as an async context manager, or call ``aclose`` when done::
+
+        async with AsyncRenumberer(max_concurrency=8) as renumberer:
+            result = await renumberer.renumber(nb_bytes)
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        renumberer_factory: Callable[[], "TagRenumberer"] = new_renumberer,
+        *,
+        processes: bool = True,
+    ) -> None:
+        """Create the renumberer; the workers are started on first use.
+
+        Args:
+            max_concurrency (int): documents renumbered at the same time
+            renumberer_factory (Callable[[], TagRenumberer]): callable building the
+                renumberer of each process (picklable), or the parser of the threads
+            processes (bool): renumber in worker processes, so that documents are
+                renumbered in parallel; threads only run in parallel on free-threaded Python
+
+        """
+        if max_concurrency < 1:
+            msg = "max_concurrency must be 1 or greater"
+            raise ValueError(msg)
+        self.max_concurrency = max_concurrency
+        self.renumberer_factory = renumberer_factory
+        self._executor: concurrent.futures.Executor
+        self._call: Callable[[tuple[bytes, bool | None]], RenumberResult]
+        if processes:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_concurrency,
+                initializer=init_worker,
+                initargs=(renumberer_factory,),
+            )
+            self._call = functools.partial(call_in_worker, _renumber_item)
+        else:
+            # the threads share one parser, each document gets its own session
+            self._parser = renumberer_factory().parser
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency)
+            self._call = self._call_in_thread
+        # one semaphore per event loop, as a semaphore cannot be shared between loops
+        self._slots: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop,
+            asyncio.Semaphore,
+        ] = weakref.WeakKeyDictionary()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *_: object) -> None:
+        await self.aclose()
+
+    async def renumber(self, data: bytes, *, markdown: bool | None = None) -> RenumberResult:
+        """Renumber a notebook or a markdown document held in memory.
+
+        Errors of the document (for example invalid JSON) are raised here.
+
+        Args:
+            data (bytes): the document
+            markdown (bool | None): whether the document is a markdown document,
+                None reads a JSON object as a notebook and anything else as markdown
+        Returns:
+            RenumberResult: new bytes and summary of the changes
+
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        await slots.acquire()
+        try:
+            future = self._executor.submit(self._call, (data, markdown))
+        except BaseException:
+            slots.release()
+            raise
+
+        def release(_: concurrent.futures.Future[RenumberResult]) -> None:
+            # the slot is freed when the worker is, even if the caller was cancelled
+            with contextlib.suppress(RuntimeError):  # the loop is closed
+                loop.call_soon_threadsafe(slots.release)
+
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    async def aclose(self) -> None:
+        """Cancel the documents not started yet and wait for the workers to exit."""
+        await asyncio.to_thread(self._executor.shutdown, cancel_futures=True)
+
+    def _call_in_thread(self, item: tuple[bytes, bool | None]) -> RenumberResult:
+        return _renumber_item(item, self._parser.session())
+
+
+async def renumber_notebook_async(
+    data: bytes,
+    renumberer: AsyncRenumberer | None = None,
+    *,
+    markdown: bool | None = None,
+) -> RenumberResult:
+    """Renumber a notebook or a markdown document without blocking the event loop.
+
+    Args:
+        data (bytes): the document
+        renumberer (AsyncRenumberer | None): renumberer bounding the concurrency,
+            None uses a shared renumberer with ``DEFAULT_MAX_CONCURRENCY`` threads
+        markdown (bool | None): whether the document is a markdown document,
+            None reads a JSON object as a notebook and anything else as markdown
+    Returns:
+        RenumberResult: new bytes and summary of the changes
+
+    """
+    renumberer = renumberer or _default_renumberer()
+    return await renumberer.renumber(data, markdown=markdown)
+
+
+@functools.cache
+def _default_renumberer() -> AsyncRenumberer:
+    return AsyncRenumberer(processes=False)
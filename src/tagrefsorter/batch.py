@@ -0,0 +1,677 @@
+import contextlib
+import difflib
+import functools
+import glob
+import json
+import logging
+import os
+import pathlib
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, BinaryIO, Self, TypeVar
+
+from .refs import DEFAULT_REF_FORMS
+from .stats import RenumberStats
+from .stream import (
+    MarkdownSource,
+    NotebookFormatError,
+    atomic_write,
+    read_markdown_sources,
+    scan_markdown_sources,
+    splice_sources,
+)
+
+if TYPE_CHECKING:
+    import mmap
+    from concurrent.futures import ProcessPoolExecutor
+
+    import nbformat
+
+    from .cache import ParseCache
+    from .parser import CellPlan, TagRenumberer
+
+logger = logging.getLogger(__name__)
+
+NOTEBOOK_SUFFIX = ".ipynb"
+
+MARKDOWN_SUFFIX = ".md"
+""" markdown (or MyST) documents, renumbered as a notebook with a single markdown cell """
+
+STDIO = "-"
+""" input name reading a document from stdin and writing the result to stdout """
+
+IGNORED_DIRS = [".ipynb_checkpoints", ".git"]
+""" directories skipped while searching notebooks """
+
+PARALLEL_MIN_CELLS = 64
+""" fewer markdown cells than this are analyzed in the calling process even with a pool """
+
+ENGINES = ["pylatexenc", "fast"]
+""" LaTeX engines of the renumberer: "fast" scans only the macros that the rewrites need,
+and falls back to pylatexenc on a math block it cannot classify """
+
+MARKDOWN_PROFILES = ["full", "minimal"]
+""" rule sets of the markdown parser: "minimal" only enables the rules that decide where
+math can appear, and finds the same math as "full" (the commonmark preset) """
+
+_GLOB_CHARS = frozenset("*?[")
+
+_INPUT_SUFFIXES = (NOTEBOOK_SUFFIX, MARKDOWN_SUFFIX)
+
+_NO_NEWLINE = "\\ No newline at end of cell"
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_worker_renumberer: "TagRenumberer | None" = None
+""" renumberer built once per worker process """
+
+
+@dataclass
+class FileResult:
+    path: pathlib.Path
+    output: pathlib.Path | None = None
+    changed: bool = False
+    error: str | None = None
+    stats: RenumberStats | None = None
+    """ counters and phase times of the notebook (None if it failed or was not parsed) """
+    skipped: bool = False
+    """ not read because a manifest recorded it as renumbered """
+    diff: str | None = None
+    """ unified diff of the markdown cells that would change (``check_notebook`` only) """
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def new_renumberer(
+    cache: "ParseCache | None" = None,
+    engine: str = "pylatexenc",
+    ref_forms: tuple[str, ...] = DEFAULT_REF_FORMS,
+    markdown_profile: str = "full",
+) -> "TagRenumberer":
+    """Build a renumberer.
+
+    The parser (and with it markdown-it and pylatexenc) is imported on the first call,
+    so that commands failing early or doing no renumbering start quickly.
+
+    Args:
+        cache (ParseCache | None): on-disk cache of cell plans
+        engine (str): one of ``ENGINES``
+        ref_forms (tuple[str, ...]): spellings of the references, keys of ``REF_FORMS``
+        markdown_profile (str): one of ``MARKDOWN_PROFILES``
+    Returns:
+        TagRenumberer: new renumberer
+
+    """
+    from .parser import TagRenumberer  # noqa: PLC0415
+
+    return TagRenumberer(cache, engine, ref_forms, markdown_profile)
+
+
+def renumber_sources(
+    sources: list[str],
+    renumberer: "TagRenumberer | None" = None,
+    pool: "WorkerPool | None" = None,
+) -> list[str]:
+    """Renumber tags and refs in the sources of the markdown cells of a notebook.
+
+    The cells are analyzed into plans, the plans are numbered in notebook order,
+    and each cell is then rewritten in a single pass.
+    With a pool, the cells of a notebook having at least ``PARALLEL_MIN_CELLS`` cells
+    are analyzed by the workers, and only the numbering is done here in notebook order.
+
+    Args:
+        sources (list[str]): markdown sources in notebook order
+        renumberer (TagRenumberer | None): renumberer to reuse across notebooks
+        pool (WorkerPool | None): workers analyzing the cells
+    Returns:
+        list[str]: updated sources
+
+    """
+    if renumberer is None:
+        renumberer = new_renumberer()
+    else:
+        renumberer.reset()
+    if pool is not None and pool.jobs > 1 and len(sources) >= PARALLEL_MIN_CELLS:
+        plans = _plan_cells(sources, renumberer, pool)
+    else:
+        plans = [renumberer.plan_cell(source) for source in sources]
+    # references may point to tags of later cells, so every plan is numbered before rendering
+    first_tags = [renumberer.number_plan(plan) if plan is not None else 0 for plan in plans]
+    results = [
+        renumberer.render_plan(source, plan, first_tag) if plan is not None else source
+        for source, plan, first_tag in zip(sources, plans, first_tags, strict=True)
+    ]
+    logger.debug(
+        "%d of %d markdown cells took the fast path",
+        renumberer.stats.skipped_cells,
+        renumberer.stats.markdown_cells,
+    )
+    return results
+
+
+def _plan_cells(
+    sources: list[str],
+    renumberer: "TagRenumberer",
+    pool: "WorkerPool",
+) -> "list[CellPlan | None]":
+    """Analyze the cells in chunks on the workers and add their stats to the renumberer."""
+    size = -(-len(sources) // (pool.jobs * 4))
+    chunks = [sources[i : i + size] for i in range(0, len(sources), size)]
+    plans: list[CellPlan | None] = []
+    for chunk_plans, stats in pool.map(_plan_chunk, chunks):
+        plans.extend(chunk_plans)
+        renumberer.stats.merge(stats)
+    return plans
+
+
+def _plan_chunk(
+    sources: list[str],
+    renumberer: "TagRenumberer",
+) -> "tuple[list[CellPlan | None], RenumberStats]":
+    renumberer.reset()
+    return [renumberer.plan_cell(source) for source in sources], renumberer.stats
+
+
+def update_nb(
+    nb: "nbformat.NotebookNode",
+    renumberer: "TagRenumberer | None" = None,
+) -> "nbformat.NotebookNode":
+    """Renumber tags and refs in all markdown cells of a notebook.
+
+    Args:
+        nb (nbformat.NotebookNode): notebook to update in place
+        renumberer (TagRenumberer | None): renumberer to reuse across notebooks
+    Returns:
+        nbformat.NotebookNode: updated notebook
+
+    """
+    cells = [cell for cell in nb.cells if cell.cell_type == "markdown"]
+    sources = renumber_sources([cell.source for cell in cells], renumberer)
+    for cell, source in zip(cells, sources, strict=True):
+        cell.source = source
+    return nb
+
+
+def collect_notebooks(patterns: Iterable[str]) -> tuple[list[pathlib.Path], list[FileResult]]:
+    """Expand files, directories and glob patterns into notebook paths.
+
+    Directories are searched recursively for ``.ipynb`` files. Markdown documents are
+    accepted when given by path or matched by a glob pattern.
+
+    Args:
+        patterns (Iterable[str]): paths, directories or glob patterns
+    Returns:
+        tuple[list[pathlib.Path], list[FileResult]]: notebooks found (in order, without
+        duplicates) and failed results for inputs that could not be used
+
+    """
+    found: dict[pathlib.Path, None] = {}
+    errors: list[FileResult] = []
+    for pattern in patterns:
+        if _GLOB_CHARS.intersection(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))  # noqa: PTH207
+            paths = [pathlib.Path(m) for m in matches if m.endswith(_INPUT_SUFFIXES)]
+            if not paths:
+                errors.append(FileResult(pathlib.Path(pattern), error="no notebook matched"))
+            found.update(dict.fromkeys(paths))
+            continue
+        path = pathlib.Path(pattern)
+        if path.is_dir():
+            found.update(dict.fromkeys(_search_dir(path)))
+        elif not path.exists():
+            errors.append(FileResult(path, error="file not found"))
+        elif path.suffix not in _INPUT_SUFFIXES:
+            errors.append(FileResult(path, error="input file must be .ipynb or .md"))
+        else:
+            found[path] = None
+    return list(found), errors
+
+
+def _search_dir(directory: pathlib.Path) -> list[pathlib.Path]:
+    results: list[pathlib.Path] = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS)
+        results.extend(
+            pathlib.Path(root, name) for name in sorted(files) if name.endswith(NOTEBOOK_SUFFIX)
+        )
+    return results
+
+
+@dataclass
+class NotebookSources:
+    """Markdown sources of an opened notebook, with what is needed to write them back."""
+
+    path: pathlib.Path
+    buf: "bytes | mmap.mmap"
+    """ bytes of the notebook file """
+    texts: list[str]
+    """ sources of the markdown cells in notebook order """
+    spans: list[MarkdownSource] | None = None
+    """ byte spans of the sources when streamed """
+    nb: "nbformat.NotebookNode | None" = None
+    """ notebook loaded and validated with nbformat, None when streamed """
+    markdown: bool = False
+    """ whether the file is a markdown document, whose whole text is the only source """
+
+    @property
+    def cell_indices(self) -> list[int]:
+        """Index in the notebook of the cell of each source (0 for a markdown document)."""
+        if self.spans is not None:
+            return [span.index for span in self.spans]
+        if self.nb is not None:
+            return [i for i, cell in enumerate(self.nb.cells) if cell.cell_type == "markdown"]
+        return [0] * len(self.texts)
+
+
+@contextlib.contextmanager
+def open_notebook(path: pathlib.Path, *, stream: bool = False) -> Iterator[NotebookSources]:
+    """Read the markdown sources of a notebook, or the text of a markdown document.
+
+    Args:
+        path (pathlib.Path): notebook or markdown document to read
+        stream (bool): read only the markdown sources of a notebook from a memory map
+            instead of loading and validating the whole notebook with nbformat
+    Yields:
+        NotebookSources: sources to renumber and pass to ``write_sources``
+
+    """
+    if stream and path.suffix != MARKDOWN_SUFFIX:
+        with read_markdown_sources(path) as (buf, spans):
+            yield NotebookSources(path, buf, [span.text for span in spans], spans=spans)
+        return
+    yield load_sources(path, path.read_bytes(), markdown=path.suffix == MARKDOWN_SUFFIX)
+
+
+def load_sources(path: pathlib.Path, raw: bytes, *, markdown: bool) -> NotebookSources:
+    """Read the markdown sources of a notebook or a markdown document from its bytes.
+
+    Args:
+        path (pathlib.Path): path the bytes were read from
+        raw (bytes): bytes of the file
+        markdown (bool): whether the file is a markdown document
+    Returns:
+        NotebookSources: sources to renumber and pass to ``write_sources``
+
+    """
+    if markdown:
+        return NotebookSources(path, raw, [raw.decode("utf-8")], markdown=True)
+    import nbformat  # noqa: PLC0415
+
+    nb = nbformat.reads(raw.decode("utf-8"), as_version=4)
+    texts = [cell.source for cell in nb.cells if cell.cell_type == "markdown"]
+    return NotebookSources(path, raw, texts, nb=nb)
+
+
+def write_sources(sources: NotebookSources, texts: list[str], onb_path: pathlib.Path) -> bool:
+    """Write a notebook with its markdown sources replaced.
+
+    The file is replaced atomically, and not touched at all when nothing changed.
+
+    Args:
+        sources (NotebookSources): notebook opened by ``open_notebook``
+        texts (list[str]): updated markdown sources
+        onb_path (pathlib.Path): path to write
+    Returns:
+        bool: whether any source changed
+
+    """
+    changed = texts != sources.texts
+    if not changed and _same_file(sources.path, onb_path):
+        return False
+    with atomic_write(onb_path) as f:
+        dump_sources(sources, texts, f)
+    return changed
+
+
+def dump_sources(sources: NotebookSources, texts: list[str], f: BinaryIO) -> None:
+    """Write the bytes of a notebook with its markdown sources replaced.
+
+    The updated sources are spliced into the original bytes when possible.
+
+    Args:
+        sources (NotebookSources): notebook opened by ``open_notebook``
+        texts (list[str]): updated markdown sources
+        f (BinaryIO): file to write to
+
+    """
+    if sources.markdown:
+        f.write(texts[0].encode("utf-8"))
+        return
+    spans = sources.spans
+    if spans is None:
+        try:
+            spans = scan_markdown_sources(sources.buf)
+        except NotebookFormatError:
+            spans = None  # e.g. nbformat 3, converted by nbformat.reads
+        if spans is not None and [span.text for span in spans] != sources.texts:
+            spans = None
+    if spans is not None:
+        patches = [
+            (span, text) for span, text in zip(spans, texts, strict=True) if text != span.text
+        ]
+        splice_sources(sources.buf, f, patches)
+        return
+    import nbformat  # noqa: PLC0415
+
+    nb = sources.nb
+    if nb is None:  # sources made from the bytes only, e.g. by a caller of NotebookSources
+        nb = nbformat.reads(bytes(sources.buf).decode("utf-8"), as_version=4)
+    cells = [cell for cell in nb.cells if cell.cell_type == "markdown"]
+    for cell, text in zip(cells, texts, strict=True):
+        cell.source = text
+    text = nbformat.writes(nb)
+    f.write(text.encode("utf-8"))
+    if not text.endswith("\n"):
+        f.write(b"\n")
+
+
+def process_notebook(
+    nb_path: pathlib.Path,
+    onb_path: pathlib.Path | None = None,
+    renumberer: "TagRenumberer | None" = None,
+    *,
+    stream: bool = False,
+    pool: "WorkerPool | None" = None,
+) -> FileResult:
+    """Read, renumber and write a single notebook or markdown document.
+
+    Errors are reported in the result instead of being raised,
+    so that one bad notebook does not stop a batch.
+    The result holds the stats of the renumberer, with the read and write times.
+
+    Args:
+        nb_path (pathlib.Path): notebook or markdown document to read
+        onb_path (pathlib.Path | None): path to write (defaults to ``nb_path``)
+        renumberer (TagRenumberer | None): renumberer to reuse
+        stream (bool): read only the markdown sources from a memory map
+            instead of loading and validating the whole notebook with nbformat
+        pool (WorkerPool | None): workers analyzing the cells of a large notebook
+    Returns:
+        FileResult: result of the file
+
+    """
+    onb_path = onb_path or nb_path
+    stats = RenumberStats()
+    try:
+        renumberer = renumberer or new_renumberer()
+        start = time.perf_counter()
+        with open_notebook(nb_path, stream=stream) as sources:
+            stats.read_time += time.perf_counter() - start
+            texts = renumber_sources(sources.texts, renumberer, pool)
+            stats.merge(renumberer.stats)
+            start = time.perf_counter()
+            changed = write_sources(sources, texts, onb_path)
+            stats.write_time += time.perf_counter() - start
+    except Exception as e:  # noqa: BLE001
+        return FileResult(nb_path, error=f"{type(e).__name__}: {e}")
+    return FileResult(nb_path, output=onb_path, changed=changed, stats=stats)
+
+
+def check_notebook(
+    nb_path: pathlib.Path,
+    renumberer: "TagRenumberer | None" = None,
+    *,
+    stream: bool = False,
+    diff: bool = False,
+) -> FileResult:
+    """Tell whether a notebook or a markdown document would change, without writing it.
+
+    Without ``diff``, the analysis stops at the first tag or reference that would change.
+
+    Args:
+        nb_path (pathlib.Path): notebook or markdown document to read
+        renumberer (TagRenumberer | None): renumberer to reuse
+        stream (bool): read only the markdown sources from a memory map
+        diff (bool): renumber every cell and make a unified diff of the changed cells
+    Returns:
+        FileResult: result whose ``changed`` tells whether the file would change,
+        with the diff in ``diff``
+
+    """
+    stats = RenumberStats()
+    patch = None
+    try:
+        renumberer = renumberer or new_renumberer()
+        start = time.perf_counter()
+        with open_notebook(nb_path, stream=stream) as sources:
+            stats.read_time += time.perf_counter() - start
+            if diff:
+                texts = renumber_sources(sources.texts, renumberer)
+                changed = texts != sources.texts
+                patch = _unified_diff(sources, texts)
+            else:
+                renumberer.reset()
+                changed = renumberer.needs_renumbering(sources.texts)
+            stats.merge(renumberer.stats)
+    except Exception as e:  # noqa: BLE001
+        return FileResult(nb_path, error=f"{type(e).__name__}: {e}")
+    return FileResult(nb_path, changed=changed, stats=stats, diff=patch)
+
+
+def _unified_diff(sources: NotebookSources, texts: list[str]) -> str:
+    name = sources.path.as_posix()
+    lines: list[str] = []
+    for index, old, new in zip(sources.cell_indices, sources.texts, texts, strict=True):
+        if old == new:
+            continue
+        cell = name if sources.markdown else f"{name}:cell {index}"
+        hunks = difflib.unified_diff(
+            old.splitlines(keepends=True),
+            new.splitlines(keepends=True),
+            f"a/{cell}",
+            f"b/{cell}",
+        )
+        # the last line of a cell has no line break, marked like git does
+        lines.extend(line if line.endswith("\n") else f"{line}\n{_NO_NEWLINE}\n" for line in hunks)
+    return "".join(lines)
+
+
+def process_stdio(
+    stdin: BinaryIO,
+    stdout: BinaryIO,
+    renumberer: "TagRenumberer | None" = None,
+) -> FileResult:
+    """Renumber a notebook or a markdown document read from stdin and write it to stdout.
+
+    A JSON object is read as a notebook, anything else as a markdown document.
+    Nothing is written if the document cannot be renumbered.
+
+    Args:
+        stdin (BinaryIO): stream to read
+        stdout (BinaryIO): stream to write
+        renumberer (TagRenumberer | None): renumberer to reuse
+    Returns:
+        FileResult: result of the document, with ``STDIO`` as its path
+
+    """
+    path = pathlib.Path(STDIO)
+    stats = RenumberStats()
+    try:
+        renumberer = renumberer or new_renumberer()
+        start = time.perf_counter()
+        raw = stdin.read()
+        sources = load_sources(path, raw, markdown=not is_json_object(raw))
+        stats.read_time += time.perf_counter() - start
+        texts = renumber_sources(sources.texts, renumberer)
+        stats.merge(renumberer.stats)
+        start = time.perf_counter()
+        dump_sources(sources, texts, stdout)
+        stdout.flush()
+        stats.write_time += time.perf_counter() - start
+    except Exception as e:  # noqa: BLE001
+        return FileResult(path, error=f"{type(e).__name__}: {e}")
+    return FileResult(path, output=path, changed=texts != sources.texts, stats=stats)
+
+
+def is_json_object(raw: bytes) -> bool:
+    """Tell whether bytes hold a JSON object, read as a notebook rather than markdown."""
+    if raw.lstrip()[:1] != b"{":
+        return False
+    try:
+        json.loads(raw)
+    except ValueError:
+        return False
+    return True
+
+
+def _same_file(path: pathlib.Path, other: pathlib.Path) -> bool:
+    return path.resolve() == other.resolve()
+
+
+class WorkerPool:
+    """Call ``func(item, renumberer)`` over items, in worker processes if ``jobs > 1``.
+
+    Each worker builds its ``TagRenumberer`` once and reuses it across items and calls
+    of ``map``, so the parsers are set up once per process.
+    """
+
+    def __init__(
+        self,
+        jobs: int,
+        renumberer_factory: Callable[[], "TagRenumberer"] = new_renumberer,
+    ) -> None:
+        """Create the pool.
+
+        Args:
+            jobs (int): number of worker processes, 0 means all CPUs
+            renumberer_factory (Callable[[], TagRenumberer]): picklable callable
+                building the renumberer of each worker
+
+        """
+        self.jobs = jobs or os.cpu_count() or 1
+        self.renumberer_factory = renumberer_factory
+        self._renumberer: TagRenumberer | None = None
+        self._executor: ProcessPoolExecutor | None = None
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    @property
+    def renumberer(self) -> "TagRenumberer":
+        """Renumberer of the calling process, built on first use."""
+        if self._renumberer is None:
+            self._renumberer = self.renumberer_factory()
+        return self._renumberer
+
+    def map(self, func: Callable[[T, "TagRenumberer"], R], items: list[T]) -> list[R]:
+        """Return the results of ``func`` in the order of ``items``.
+
+        Args:
+            func (Callable[[T, TagRenumberer], R]): picklable module level function
+            items (list[T]): picklable items
+        Returns:
+            list[R]: results
+
+        """
+        if self.jobs <= 1 or len(items) <= 1:
+            return [func(item, self.renumberer) for item in items]
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.jobs,
+                initializer=init_worker,
+                initargs=(self.renumberer_factory,),
+            )
+        chunksize = max(1, len(items) // (self.jobs * 4))
+        call = functools.partial(call_in_worker, func)
+        return list(self._executor.map(call, items, chunksize=chunksize))
+
+
+def init_worker(renumberer_factory: Callable[[], "TagRenumberer"]) -> None:
+    """Build the renumberer of a worker process, the initializer of its executor."""
+    global _worker_renumberer  # noqa: PLW0603
+    _worker_renumberer = renumberer_factory()
+
+
+def call_in_worker(func: Callable[[T, "TagRenumberer"], R], item: T) -> R:  # noqa: UP047
+    """Call ``func(item, renumberer)`` with the renumberer built by ``init_worker``."""
+    if _worker_renumberer is None:
+        msg = "the worker renumberer is not initialized"
+        raise RuntimeError(msg)
+    return func(item, _worker_renumberer)
+
+
+def _process_with(
+    nb_path: pathlib.Path,
+    renumberer: "TagRenumberer",
+    *,
+    stream: bool,
+) -> FileResult:
+    return process_notebook(nb_path, renumberer=renumberer, stream=stream)
+
+
+def _check_with(
+    nb_path: pathlib.Path,
+    renumberer: "TagRenumberer",
+    *,
+    stream: bool,
+    diff: bool,
+) -> FileResult:
+    return check_notebook(nb_path, renumberer, stream=stream, diff=diff)
+
+
+def run_check(
+    nb_paths: list[pathlib.Path],
+    jobs: int = 1,
+    renumberer_factory: Callable[[], "TagRenumberer"] = new_renumberer,
+    *,
+    stream: bool = False,
+    diff: bool = False,
+) -> list[FileResult]:
+    """Tell which notebooks would change, without writing any of them.
+
+    Args:
+        nb_paths (list[pathlib.Path]): notebooks to check
+        jobs (int): number of worker processes, 0 means all CPUs
+        renumberer_factory (Callable[[], TagRenumberer]): picklable callable
+            building the renumberer of each worker
+        stream (bool): use the streaming reader of ``check_notebook``
+        diff (bool): make the unified diff of each notebook
+    Returns:
+        list[FileResult]: results of ``check_notebook`` in the order of ``nb_paths``
+
+    """
+    with WorkerPool(jobs, renumberer_factory) as pool:
+        return pool.map(functools.partial(_check_with, stream=stream, diff=diff), nb_paths)
+
+
+def run_batch(
+    nb_paths: list[pathlib.Path],
+    jobs: int = 1,
+    renumberer_factory: Callable[[], "TagRenumberer"] = new_renumberer,
+    *,
+    stream: bool = False,
+) -> list[FileResult]:
+    """Renumber many notebooks in place.
+
+    With ``jobs > 1`` the notebooks are distributed to a process pool.
+    Each worker builds its ``TagRenumberer`` once and reuses it across files.
+    A single notebook is renumbered here, with its cells analyzed by the pool.
+
+    Args:
+        nb_paths (list[pathlib.Path]): notebooks to process
+        jobs (int): number of worker processes, 0 means all CPUs
+        renumberer_factory (Callable[[], TagRenumberer]): picklable callable
+            building the renumberer of each worker
+        stream (bool): use the streaming reader (see ``process_notebook``)
+
+    Returns:
+        list[FileResult]: results in the order of ``nb_paths``
+
+    """
+    if not nb_paths:
+        return []
+    with WorkerPool(jobs, renumberer_factory) as pool:
+        if len(nb_paths) == 1:
+            renumberer = pool.renumberer
+            return [process_notebook(nb_paths[0], renumberer=renumberer, stream=stream, pool=pool)]
+        return pool.map(functools.partial(_process_with, stream=stream), nb_paths)
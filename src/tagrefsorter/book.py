@@ -0,0 +1,235 @@
+import functools
+import hashlib
+import json
+import pathlib
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from .batch import FileResult, WorkerPool, dump_sources, new_renumberer, open_notebook
+from .stats import RenumberStats
+from .stream import staged_write
+
+if TYPE_CHECKING:
+    from .parser import CellPlan, TagRenumberer
+
+
+@dataclass
+class NotebookPlan:
+    path: pathlib.Path
+    digest: str = ""
+    """ hash of the markdown sources the plans were made from """
+    plans: "list[CellPlan | None]" = field(default_factory=list)
+    """ plan of each markdown cell (None for a cell without math nor reference) """
+    stats: RenumberStats = field(default_factory=RenumberStats)
+    error: str | None = None
+
+    @property
+    def tag_count(self) -> int:
+        return sum(len(plan.tags) for plan in self.plans if plan is not None)
+
+
+@dataclass
+class _ApplyJob:
+    plan: NotebookPlan
+    first_tag: int
+    update_map: dict[str, str]
+    """ numbers of the labels referenced by the notebook """
+
+
+def _digest(texts: list[str]) -> str:
+    return hashlib.sha256(json.dumps(texts).encode()).hexdigest()
+
+
+def plan_notebook(
+    path: pathlib.Path,
+    renumberer: "TagRenumberer",
+    *,
+    stream: bool = False,
+) -> NotebookPlan:
+    """Read a notebook and find the tag rewrites and references of its cells.
+
+    Args:
+        path (pathlib.Path): notebook to read
+        renumberer (TagRenumberer): renumberer whose parsers and cache are used
+        stream (bool): use the streaming reader of ``open_notebook``
+    Returns:
+        NotebookPlan: plans of the markdown cells, or the error that occurred
+
+    """
+    renumberer.reset()
+    try:
+        start = time.perf_counter()
+        with open_notebook(path, stream=stream) as sources:
+            read_time = time.perf_counter() - start
+            plans = [renumberer.plan_cell(text) for text in sources.texts]
+            digest = _digest(sources.texts)
+    except Exception as e:  # noqa: BLE001
+        return NotebookPlan(path, error=f"{type(e).__name__}: {e}")
+    renumberer.stats.read_time += read_time
+    return NotebookPlan(path, digest, plans, renumberer.stats)
+
+
+def number_book(plans: list[NotebookPlan]) -> tuple[list[int], dict[str, str]]:
+    """Assign continuous tag numbers over the notebooks of a book.
+
+    The first number of each notebook is a prefix sum of the tag counts, and the labels
+    are mapped as if all markdown cells of the book were in a single notebook
+    (a label defined twice refers to its last definition).
+
+    Args:
+        plans (list[NotebookPlan]): plans of the notebooks in book order
+    Returns:
+        tuple[list[int], dict[str, str]]: first tag number of each notebook,
+        and the new number of each old label
+
+    """
+    first_tags: list[int] = []
+    update_map: dict[str, str] = {}
+    next_tag = 1
+    for notebook in plans:
+        first_tags.append(next_tag)
+        for plan in notebook.plans:
+            if plan is None:
+                continue
+            for tag in plan.tags:
+                if tag.label:
+                    update_map[tag.label] = str(next_tag)
+                next_tag += 1
+    return first_tags, update_map
+
+
+def _apply_notebook(
+    job: _ApplyJob,
+    renumberer: "TagRenumberer",
+    *,
+    stream: bool,
+) -> tuple[FileResult, pathlib.Path | None]:
+    """Renumber a notebook of the book into a temporary file next to it.
+
+    Returns:
+        tuple[FileResult, pathlib.Path | None]: result, and the temporary file holding
+        the updated notebook (None if nothing changed or on error)
+
+    """
+    path = job.plan.path
+    staged = None
+    renumberer.reset()
+    renumberer.next_tag = job.first_tag
+    stats = job.plan.stats
+    try:
+        start = time.perf_counter()
+        with open_notebook(path, stream=stream) as sources:
+            stats.read_time += time.perf_counter() - start
+            if _digest(sources.texts) != job.plan.digest:
+                error = "notebook changed while the book was numbered"
+                return FileResult(path, error=error), None
+            plans = job.plan.plans
+            first_tags = [renumberer.number_plan(plan) if plan is not None else 0 for plan in plans]
+            # references are resolved with the labels of the whole book
+            renumberer.update_map = job.update_map
+            texts = [
+                renumberer.render_plan(text, plan, first_tag) if plan is not None else text
+                for text, plan, first_tag in zip(sources.texts, plans, first_tags, strict=True)
+            ]
+            stats.merge(renumberer.stats)
+            stats.update_map_size = 0  # counted once for the whole book
+            changed = texts != sources.texts
+            if changed:
+                start = time.perf_counter()
+                with staged_write(path) as (f, staged):
+                    dump_sources(sources, texts, f)
+                stats.write_time += time.perf_counter() - start
+    except Exception as e:  # noqa: BLE001
+        if staged is not None:
+            staged.unlink(missing_ok=True)
+        return FileResult(path, error=f"{type(e).__name__}: {e}"), None
+    return FileResult(path, output=path, changed=changed, stats=stats), staged
+
+
+def run_book(
+    nb_paths: list[pathlib.Path],
+    jobs: int = 1,
+    renumberer_factory: Callable[[], "TagRenumberer"] = new_renumberer,
+    *,
+    stream: bool = False,
+) -> list[FileResult]:
+    """Renumber the notebooks of a book in place with continuous numbers.
+
+    Tags are numbered across notebooks in the order of ``nb_paths``, and references
+    may point to tags of any notebook. The notebooks are parsed in parallel, the numbers
+    are assigned by a sequential pass over the plans (which is cheap), and the rewrites
+    are applied in parallel into temporary files next to the notebooks. The notebooks
+    are replaced by these files only once all of them are written, so no notebook is
+    changed if any of them cannot be read or written (the final renames are not atomic
+    as a whole, a failing rename is reported in its result).
+
+    Args:
+        nb_paths (list[pathlib.Path]): notebooks in book order
+        jobs (int): number of worker processes, 0 means all CPUs
+        renumberer_factory (Callable[[], TagRenumberer]): picklable callable
+            building the renumberer of each worker
+        stream (bool): use the streaming reader of ``open_notebook``
+    Returns:
+        list[FileResult]: results in the order of ``nb_paths``
+
+    """
+    if not nb_paths:
+        return []
+    with WorkerPool(jobs, renumberer_factory) as pool:
+        plans = pool.map(functools.partial(plan_notebook, stream=stream), nb_paths)
+        if any(plan.error for plan in plans):
+            return [
+                FileResult(
+                    plan.path,
+                    error=plan.error or "not written because another notebook of the book failed",
+                )
+                for plan in plans
+            ]
+        first_tags, update_map = number_book(plans)
+        apply_jobs = [
+            _ApplyJob(
+                plan,
+                first_tag,
+                {
+                    ref.label: update_map[ref.label]
+                    for cell in plan.plans
+                    if cell is not None
+                    for ref in cell.refs
+                    if ref.label in update_map
+                },
+            )
+            for plan, first_tag in zip(plans, first_tags, strict=True)
+        ]
+        applied = pool.map(functools.partial(_apply_notebook, stream=stream), apply_jobs)
+    if any(not result.ok for result, _ in applied):
+        for _, staged in applied:
+            if staged is not None:
+                staged.unlink(missing_ok=True)
+        return [
+            result
+            if not result.ok
+            else FileResult(
+                result.path,
+                error="not written because another notebook of the book failed",
+            )
+            for result, _ in applied
+        ]
+    results = [_replace(result, staged) for result, staged in applied]
+    stats = next((result.stats for result in results if result.stats is not None), None)
+    if stats is not None:
+        stats.update_map_size = len(update_map)
+    return results
+
+
+def _replace(result: FileResult, staged: pathlib.Path | None) -> FileResult:
+    """Replace the notebook of a result with its staged update."""
+    if staged is None:
+        return result
+    try:
+        staged.replace(result.path)
+    except OSError as e:
+        staged.unlink(missing_ok=True)
+        return FileResult(result.path, error=f"{type(e).__name__}: {e}")
+    return result
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+from typing import TYPE_CHECKING, Any
+
+from ._version import __version__
+
+if TYPE_CHECKING:
+    from .parser import CellPlan
+
+CACHE_FORMAT = 4
+""" version of the layout of a cache entry """
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class ParseCache:
+    """On-disk cache of cell plans keyed by a hash of the cell source.
+
+    Entries live in a subdirectory named after the tagrefsorter version and the cache format,
+    so entries written by another release are never replayed and are removed by ``evict``.
+    """
+
+    def __init__(self, directory: pathlib.Path, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.root = directory / f"v{__version__}-{CACHE_FORMAT}"
+
+    def get(self, text: str, variant: str = "") -> "CellPlan | None":
+        """Return the cached plan of a cell, or None on a miss.
+
+        Args:
+            text (str): text of a markdown cell
+            variant (str): configuration of the parser the plan depends on
+        Returns:
+            CellPlan | None: cached plan
+
+        """
+        path = self._path(text, variant)
+        try:
+            data = json.loads(path.read_bytes())
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError):
+            return None
+        return _decode(data)
+
+    def put(self, text: str, plan: "CellPlan", variant: str = "") -> None:
+        """Store the plan of a cell.
+
+        The entry is written to a temporary file and renamed,
+        so concurrent workers never read a partial entry.
+
+        Args:
+            text (str): text of a markdown cell
+            plan (CellPlan): plan made from ``text``
+            variant (str): configuration of the parser the plan depends on
+
+        """
+        path = self._path(text, variant)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(_encode(plan), f, ensure_ascii=False, separators=(",", ":"))
+        pathlib.Path(tmp).replace(path)
+
+    def evict(self) -> int:
+        """Remove entries of other versions and the least recently used entries over the limit.
+
+        Returns:
+            int: number of entries removed from the current version
+
+        """
+        if not self.directory.is_dir():
+            return 0
+        for child in self.directory.iterdir():
+            if child.is_dir() and child.name.startswith("v") and child != self.root:
+                shutil.rmtree(child, ignore_errors=True)
+        entries: list[tuple[float, int, pathlib.Path]] = []
+        for path in self.root.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def _path(self, text: str, variant: str = "") -> pathlib.Path:
+        digest = hashlib.sha256(text.encode("utf-8", "surrogatepass"))
+        if variant:
+            digest.update(b"\0" + variant.encode())
+        key = digest.hexdigest()
+        return self.root / key[:2] / f"{key}.json"
+
+
+def _encode(plan: "CellPlan") -> dict[str, Any]:
+    return {
+        "tags": [[tag.start, tag.length, tag.label] for tag in plan.tags],
+        "refs": [[ref.start, ref.length, ref.label, ref.form] for ref in plan.refs],
+        "blocks": [plan.math_blocks, plan.aligner_blocks],
+    }
+
+
+def _decode(data: dict[str, Any]) -> "CellPlan":
+    # the cache is created before any cell is parsed, so the parser is imported on the first hit
+    from .parser import CellPlan, Reference, TagRewrite  # noqa: PLC0415
+
+    return CellPlan(
+        tags=[TagRewrite(start, length, label) for start, length, label in data["tags"]],
+        refs=[Reference(*ref) for ref in data["refs"]],
+        math_blocks=data["blocks"][0],
+        aligner_blocks=data["blocks"][1],
+    )
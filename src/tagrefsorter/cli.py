@@ -1,35 +1,192 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
+import dataclasses
+import functools
+import importlib
+import json
 import pathlib
 import sys
+import time
+from collections.abc import Callable
 from dataclasses import dataclass
-
-import nbformat
+from typing import TYPE_CHECKING
 
 from . import __version__
-from .parser import TagRenumberer
+from .batch import (
+    ENGINES,
+    MARKDOWN_PROFILES,
+    MARKDOWN_SUFFIX,
+    NOTEBOOK_SUFFIX,
+    STDIO,
+    FileResult,
+    WorkerPool,
+    collect_notebooks,
+    new_renumberer,
+    process_notebook,
+    process_stdio,
+    run_batch,
+    run_check,
+    update_nb,
+)
+from .book import run_book
+from .cache import DEFAULT_MAX_BYTES, ParseCache
+from .manifest import Manifest, run_incremental
+from .refs import DEFAULT_REF_FORMS, REF_FORMS, ref_forms_arg
+from .stats import RenumberStats
+from .watch import DEFAULT_DEBOUNCE, watch
+
+if TYPE_CHECKING:
+    from .parser import TagRenumberer
+
+__all__ = ["Args", "main", "parse_args", "update_nb"]
+
+_SUBCOMMANDS = {"serve": "server", "index": "index"}
+""" modules of the subcommands, which have their own parser """
 
 
 @dataclass
 class Args:
-    notebook: pathlib.Path
+    notebooks: list[str]
     output: pathlib.Path | None
+    jobs: int = 1
+    cache_dir: pathlib.Path | None = None
+    cache_size: int = DEFAULT_MAX_BYTES // (1024 * 1024)
+    stream: bool = False
+    engine: str = "pylatexenc"
+    ref_forms: tuple[str, ...] = DEFAULT_REF_FORMS
+    markdown_profile: str = "full"
+    book: bool = False
+    manifest: pathlib.Path | None = None
+    check: bool = False
+    diff: bool = False
+    watch: bool = False
+    debounce: float = DEFAULT_DEBOUNCE
+    stats: bool = False
+    stats_json: pathlib.Path | None = None
     version: str | None = None
 
 
-def parse_args() -> Args:
+def parse_args(argv: list[str] | None = None) -> Args:
     parser = argparse.ArgumentParser(
-        description="Read a Jupyter Notebook (.ipynb) file and normalize LaTeX \\tag numbering",
+        description="Read Jupyter Notebook (.ipynb) and markdown (.md) files and normalize LaTeX"
+        " \\tag numbering",
+        epilog="Run 'tagrefsorter serve' to serve JSON-RPC requests on stdin/stdout instead,"
+        " or 'tagrefsorter index' to index and query the labels and references of notebooks",
     )
     parser.add_argument(
-        "notebook",
-        type=pathlib.Path,
-        help="Path to the .ipynb file to be modified",
+        "notebooks",
+        nargs="+",
+        metavar="notebook",
+        help="Paths to .ipynb or .md files, directories (searched recursively for .ipynb files),"
+        " glob patterns, or - to read a notebook or a markdown document from stdin and write"
+        " the result to stdout",
     )
     parser.add_argument(
         "--output",
         type=pathlib.Path,
-        help="Path to save the modified .ipynb file (if not provided, overwrites the input file)",
+        help="Path to save the modified .ipynb file (if not provided, overwrites the input file)."
+        " Only allowed with a single input notebook",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes (0 means the number of CPUs, default: 1)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        help="Directory of an on-disk cache of cell analyses, so that unchanged cells"
+        " are not parsed again",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        metavar="MB",
+        help="Maximum size of the cache in MB; least recently used entries are evicted"
+        " (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Read only the markdown sources through a memory map instead of loading the whole"
+        " notebook, and splice the updated sources into the original bytes (nbformat 4 only)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="pylatexenc",
+        help="LaTeX engine: 'fast' scans math blocks only for tags and line breaks, and falls"
+        " back to pylatexenc on blocks it cannot classify (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--ref-forms",
+        type=ref_forms_arg,
+        default=DEFAULT_REF_FORMS,
+        metavar="FORMS",
+        help="Comma separated spellings of the references to renumber, among"
+        f" {', '.join(REF_FORMS)}: 'paren' is an inline math written as $(x)$, 'eqref' and"
+        " 'ref' are \\eqref{x} and \\ref{x} in inline math and math blocks (default: paren)",
+    )
+    parser.add_argument(
+        "--markdown-profile",
+        choices=MARKDOWN_PROFILES,
+        default="full",
+        help="Markdown rules: 'minimal' only enables the rules that decide where math can"
+        " appear (code, fences, HTML, links, ...), and finds the same math faster"
+        " (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--book",
+        action="store_true",
+        help="Number the tags continuously across the notebooks, in the order given (directories"
+        " in sorted order), and resolve references between notebooks",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=pathlib.Path,
+        metavar="PATH",
+        help="Record the size, mtime and content hash of each renumbered notebook in PATH,"
+        " and skip the notebooks left unchanged since (identical notebooks are renumbered once)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Write nothing, and exit with status 1 if any file would change; each file is read"
+        " only up to its first tag or reference that would change",
+    )
+    parser.add_argument(
+        "--diff",
+        action="store_true",
+        help="Write nothing, and print a unified diff of the markdown cells that would change",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and renumber the notebooks under the given paths shortly after"
+        " they are saved",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEFAULT_DEBOUNCE,
+        metavar="SECONDS",
+        help="With --watch, time to wait after the last save of a notebook (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print the time spent in each phase and work counters, summed over all notebooks,"
+        " to stderr",
+    )
+    parser.add_argument(
+        "--stats-json",
+        type=pathlib.Path,
+        metavar="PATH",
+        help="Write the stats of --stats as JSON to PATH",
     )
     parser.add_argument(
         "--version",
@@ -37,43 +194,224 @@ def parse_args() -> Args:
         version=f"%(prog)s {__version__}",
         help="Show the program version and exit",
     )
-    args = parser.parse_args()
-    return Args(args.notebook, args.output)
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or greater")
+    check = args.check or args.diff
+    if STDIO in args.notebooks and (
+        len(args.notebooks) > 1 or args.output or args.watch or args.book or args.manifest or check
+    ):
+        parser.error(
+            "- cannot be used with other inputs, --output, --watch, --book, --manifest,"
+            " --check or --diff",
+        )
+    if args.watch and args.output:
+        parser.error("--output cannot be used with --watch")
+    if args.book and (args.watch or args.output):
+        parser.error("--book cannot be used with --watch or --output")
+    if args.manifest and (args.book or args.watch or args.output):
+        parser.error("--manifest cannot be used with --book, --watch or --output")
+    if check and (args.output or args.watch or args.book or args.manifest):
+        parser.error(
+            "--check and --diff cannot be used with --output, --watch, --book or --manifest",
+        )
+    if args.watch and (args.stats or args.stats_json):
+        parser.error("--stats and --stats-json cannot be used with --watch")
+    return Args(
+        notebooks=args.notebooks,
+        output=args.output,
+        jobs=args.jobs,
+        cache_dir=args.cache_dir,
+        cache_size=args.cache_size,
+        stream=args.stream,
+        engine=args.engine,
+        ref_forms=args.ref_forms,
+        markdown_profile=args.markdown_profile,
+        book=args.book,
+        manifest=args.manifest,
+        check=args.check,
+        diff=args.diff,
+        watch=args.watch,
+        debounce=args.debounce,
+        stats=args.stats,
+        stats_json=args.stats_json,
+    )
+
+
+def _report(results: list[FileResult], *, written: bool) -> None:
+    for result in results:
+        if not result.ok:
+            print(f"Error: {result.path}: {result.error}", file=sys.stderr)  # noqa: T201
+        elif written:
+            print(f"Written: {result.output}")  # noqa: T201
+        elif result.skipped:
+            print(f"Skipped: {result.path}")  # noqa: T201
+        elif not result.changed:
+            print(f"Unchanged: {result.path}")  # noqa: T201
+        else:
+            print(f"Overwritten: {result.path}")  # noqa: T201
+    if len(results) > 1:
+        failed = sum(not result.ok for result in results)
+        print(f"{len(results) - failed} succeeded, {failed} failed")  # noqa: T201
+
+
+def _report_check(results: list[FileResult]) -> None:
+    # stdout carries the diffs only, so that it can be applied as a patch
+    for result in results:
+        if not result.ok:
+            print(f"Error: {result.path}: {result.error}", file=sys.stderr)  # noqa: T201
+        elif result.changed:
+            if result.diff:
+                sys.stdout.write(result.diff)
+            print(f"Would change: {result.path}", file=sys.stderr)  # noqa: T201
+    if len(results) > 1:
+        changed = sum(result.ok and result.changed for result in results)
+        failed = sum(not result.ok for result in results)
+        print(  # noqa: T201
+            f"{changed} would change, {len(results) - changed - failed} unchanged, {failed} failed",
+            file=sys.stderr,
+        )
+
+
+def _summarize(results: list[FileResult], wall_time: float) -> dict[str, float | int]:
+    """Sum the stats of the notebooks that were processed."""
+    total = RenumberStats()
+    for result in results:
+        if result.stats is not None:
+            total.merge(result.stats)
+    return {
+        "notebooks": sum(result.stats is not None for result in results),
+        "skipped_notebooks": sum(result.skipped for result in results),
+        "wall_time": wall_time,
+        **dataclasses.asdict(total),
+    }
 
 
-def update_nb(nb: nbformat.NotebookNode) -> nbformat.NotebookNode:
-    renumberer = TagRenumberer()
-    for cell in nb.cells:
-        if cell.cell_type == "markdown":
-            cell.source = renumberer.renumber_tags(cell.source)
-    for cell in nb.cells:
-        if cell.cell_type == "markdown":
-            cell.source = renumberer.renumber_refs(cell.source)
-    return nb
+def _output_stats(args: Args, summary: dict[str, float | int]) -> None:
+    if args.stats:
+        width = max(map(len, summary))
+        for name, value in summary.items():
+            text = f"{value:.3f}s" if isinstance(value, float) else str(value)
+            print(f"{name:<{width}}  {text:>10}", file=sys.stderr)  # noqa: T201
+    if args.stats_json:
+        args.stats_json.write_text(json.dumps(summary, indent=2) + "\n")
+
+
+def _watch(args: Args, renumberer_factory: Callable[[], "TagRenumberer"]) -> None:
+    paths = [pathlib.Path(path) for path in args.notebooks]
+    for path in paths:
+        if not path.exists():
+            print(f"Error: {path}: file not found", file=sys.stderr)  # noqa: T201
+            sys.exit(1)
+    print(f"Watching: {', '.join(map(str, paths))} (press Ctrl+C to stop)")  # noqa: T201
+    with contextlib.suppress(KeyboardInterrupt):
+        watch(
+            paths,
+            renumberer_factory,
+            lambda result: _report([result], written=False),
+            debounce=args.debounce,
+            stream=args.stream,
+        )
+
+
+def _run(args: Args, renumberer_factory: Callable[[], "TagRenumberer"]) -> list[FileResult]:
+    if args.notebooks == [STDIO]:
+        return [process_stdio(sys.stdin.buffer, sys.stdout.buffer, renumberer_factory())]
+    nb_paths, errors = collect_notebooks(args.notebooks)
+    if not nb_paths and not errors:
+        print("Error: no notebook found", file=sys.stderr)  # noqa: T201
+        sys.exit(1)
+
+    if args.output:
+        if len(nb_paths) + len(errors) != 1:
+            print("Error: --output requires exactly one input notebook", file=sys.stderr)  # noqa: T201
+            sys.exit(1)
+        if nb_paths and nb_paths[0].suffix != args.output.suffix:
+            print("Error: output file must have the suffix of the input file", file=sys.stderr)  # noqa: T201
+            sys.exit(1)
+        with WorkerPool(args.jobs, renumberer_factory) as pool:
+            return errors + [
+                process_notebook(
+                    path,
+                    args.output,
+                    pool.renumberer,
+                    stream=args.stream,
+                    pool=pool,
+                )
+                for path in nb_paths
+            ]
+    if args.book:
+        if not errors:
+            return run_book(nb_paths, args.jobs, renumberer_factory, stream=args.stream)
+        results = [
+            FileResult(path, error="not written because another notebook of the book failed")
+            for path in nb_paths
+        ]
+    elif args.check or args.diff:
+        results = run_check(
+            nb_paths,
+            args.jobs,
+            renumberer_factory,
+            stream=args.stream,
+            diff=args.diff,
+        )
+    elif args.manifest:
+        manifest = Manifest(args.manifest, args.ref_forms)
+        results = run_incremental(
+            nb_paths,
+            manifest,
+            args.jobs,
+            renumberer_factory,
+            stream=args.stream,
+        )
+        manifest.save()
+    else:
+        results = run_batch(nb_paths, args.jobs, renumberer_factory, stream=args.stream)
+    return errors + results
 
 
 def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] in _SUBCOMMANDS:
+        module = importlib.import_module(f"{__package__}.{_SUBCOMMANDS[sys.argv[1]]}")
+        module.main(sys.argv[2:])
+        return
+
     args = parse_args()
-    nb_path = args.notebook
-    onb_path = args.output or nb_path
+    onb_path = args.output
 
-    if not nb_path.exists():
-        print(f"Error: file not found: {nb_path}", file=sys.stderr)  # noqa: T201
+    if onb_path and onb_path.suffix not in {NOTEBOOK_SUFFIX, MARKDOWN_SUFFIX}:
+        print("Error: output file must be .ipynb or .md", file=sys.stderr)  # noqa: T201
         sys.exit(1)
 
-    if nb_path.suffix != ".ipynb":
-        print("Error: input file must be .ipynb", file=sys.stderr)  # noqa: T201
-        sys.exit(1)
+    cache = None
+    if args.cache_dir:
+        cache = ParseCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    renumberer_factory = functools.partial(
+        new_renumberer,
+        cache=cache,
+        engine=args.engine,
+        ref_forms=args.ref_forms,
+        markdown_profile=args.markdown_profile,
+    )
 
-    if args.output and onb_path.suffix != ".ipynb":
-        print("Error: output file must be .ipynb", file=sys.stderr)  # noqa: T201
-        sys.exit(1)
+    if args.watch:
+        _watch(args, renumberer_factory)
+        return
 
-    nb = nbformat.read(nb_path, as_version=4)
-    updated_nb = update_nb(nb)
-    nbformat.write(updated_nb, onb_path)
+    start = time.perf_counter()
+    results = _run(args, renumberer_factory)
+    if cache:
+        cache.evict()
 
-    if args.output:
-        print(f"Written: {onb_path}")  # noqa: T201
+    if args.check or args.diff:
+        _report_check(results)
     else:
-        print(f"Overwritten: {nb_path}")  # noqa: T201
+        # in the filter mode, stdout carries the document and only errors are reported
+        reported = results if args.notebooks != [STDIO] else [r for r in results if not r.ok]
+        _report(reported, written=onb_path is not None)
+    if args.stats or args.stats_json:
+        _output_stats(args, _summarize(results, time.perf_counter() - start))
+    if not all(result.ok for result in results):
+        sys.exit(1)
+    if args.check and any(result.changed for result in results):
+        sys.exit(1)
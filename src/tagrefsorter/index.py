@@ -0,0 +1,390 @@
+import argparse
+import contextlib
+import functools
+import os
+import pathlib
+import sqlite3
+import sys
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Self
+
+from ._version import __version__
+from .batch import ENGINES, FileResult, WorkerPool, collect_notebooks, new_renumberer, open_notebook
+from .manifest import Fingerprint, file_digest
+from .refs import DEFAULT_REF_FORMS, format_ref, ref_forms_arg
+
+if TYPE_CHECKING:
+    from .parser import TagRenumberer
+
+INDEX_FORMAT = 2
+""" version of the schema of the index """
+
+DEFAULT_INDEX = pathlib.Path(".tagrefsorter-index.sqlite")
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE notebooks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE tags (
+    notebook INTEGER NOT NULL,
+    cell INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    number INTEGER NOT NULL
+);
+CREATE TABLE refs (
+    notebook INTEGER NOT NULL,
+    cell INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    form TEXT NOT NULL
+);
+CREATE INDEX tags_label ON tags (label);
+CREATE INDEX tags_notebook ON tags (notebook, label);
+CREATE INDEX refs_label ON refs (label);
+CREATE INDEX refs_notebook ON refs (notebook, label);
+"""
+
+
+@dataclass
+class IndexedTag:
+    path: str
+    """ notebook, relative to the directory of the index """
+    cell: int
+    """ index of the cell in the notebook """
+    offset: int
+    """ offset of ``\\tag`` in the source of the cell """
+    label: str
+    number: int
+    """ number of the equation in its notebook, the label once renumbered """
+
+
+@dataclass
+class IndexedRef:
+    path: str
+    cell: int
+    offset: int
+    """ offset of the reference (such as ``$(`` or ``\\eqref``) in the source of the cell """
+    label: str
+    form: str = "paren"
+    """ spelling of the reference, a key of ``REF_FORMS`` """
+
+
+@dataclass
+class _NotebookEntry:
+    path: pathlib.Path
+    fingerprint: Fingerprint | None = None
+    unchanged: bool = False
+    """ the content is the indexed one, only the fingerprint is updated """
+    tags: list[tuple[int, int, str, int]] = field(default_factory=list)
+    refs: list[tuple[int, int, str, str]] = field(default_factory=list)
+    error: str | None = None
+
+
+def _scan_notebook(
+    item: tuple[pathlib.Path, str | None],
+    renumberer: "TagRenumberer",
+    *,
+    stream: bool,
+) -> _NotebookEntry:
+    """Find the labelled tags and the references of a notebook whose content changed."""
+    path, indexed_digest = item
+    try:
+        stat = path.stat()
+        fingerprint = Fingerprint(stat.st_size, stat.st_mtime_ns, file_digest(path))
+        if fingerprint.sha256 == indexed_digest:
+            return _NotebookEntry(path, fingerprint, unchanged=True)
+        entry = _NotebookEntry(path, fingerprint)
+        renumberer.reset()
+        with open_notebook(path, stream=stream) as sources:
+            for cell, text in zip(sources.cell_indices, sources.texts, strict=True):
+                plan = renumberer.plan_cell(text)
+                if plan is None:
+                    continue
+                first_tag = renumberer.number_plan(plan)
+                entry.tags += [
+                    (cell, tag.start, tag.label, number)
+                    for number, tag in enumerate(plan.tags, first_tag)
+                    if tag.label
+                ]
+                entry.refs += [(cell, ref.start, ref.label, ref.form) for ref in plan.refs]
+    except Exception as e:  # noqa: BLE001
+        return _NotebookEntry(path, error=f"{type(e).__name__}: {e}")
+    return entry
+
+
+class LabelIndex:
+    """SQLite index of the tag labels and the references of many notebooks.
+
+    Labels are scoped to their notebook, like the renumbering: a reference is dangling
+    if no tag of its notebook has its label. Notebooks are keyed by their path relative
+    to the index, and are parsed again only if their content changed.
+    """
+
+    def __init__(self, path: pathlib.Path = DEFAULT_INDEX) -> None:
+        """Open the index, or create it if it is missing or from another release.
+
+        Args:
+            path (pathlib.Path): SQLite file of the index
+
+        """
+        self.path = path
+        self.root = path.resolve().parent
+        self.db = sqlite3.connect(path)
+        meta = {"version": __version__, "format": str(INDEX_FORMAT)}
+        with contextlib.suppress(sqlite3.DatabaseError):
+            stored = dict(self.db.execute("SELECT key, value FROM meta"))
+            if {key: stored.get(key) for key in meta} == meta:
+                return
+        # a new file, or an index made by another parser: start over
+        with self.db:
+            for (table,) in self.db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'",
+            ).fetchall():
+                self.db.execute(f'DROP TABLE "{table}"')
+            self.db.executescript(_SCHEMA)
+            self.db.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def update(
+        self,
+        nb_paths: list[pathlib.Path],
+        jobs: int = 1,
+        renumberer_factory: Callable[[], "TagRenumberer"] = new_renumberer,
+        *,
+        stream: bool = False,
+    ) -> list[FileResult]:
+        """Index the notebooks that changed, and forget the indexed notebooks that were deleted.
+
+        A notebook whose size and mtime are indexed is skipped without being read, and one
+        whose content hash is indexed is not parsed, unless the index was updated with other
+        reference forms. A notebook that cannot be read keeps its previous entries.
+
+        Args:
+            nb_paths (list[pathlib.Path]): notebooks to index
+            jobs (int): number of worker processes, 0 means all CPUs
+            renumberer_factory (Callable[[], TagRenumberer]): picklable callable
+                building the renumberer of each worker
+            stream (bool): use the streaming reader of ``open_notebook``
+        Returns:
+            list[FileResult]: results in the order of ``nb_paths``, ``changed`` for the
+            notebooks indexed again and ``skipped`` for the others
+
+        """
+        indexed = {
+            path: Fingerprint(size, mtime_ns, sha256)
+            for path, size, mtime_ns, sha256 in self.db.execute(
+                "SELECT path, size, mtime_ns, sha256 FROM notebooks",
+            )
+        }
+        results: dict[pathlib.Path, FileResult] = {}
+        items: list[tuple[pathlib.Path, str | None]] = []
+        with WorkerPool(jobs, renumberer_factory) as pool:
+            ref_forms = ",".join(pool.renumberer.parser.ref_forms)
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'ref_forms'").fetchone()
+            # the references of other forms are indexed: every notebook is parsed again
+            known = {} if row != (ref_forms,) else indexed
+            for path in nb_paths:
+                try:
+                    stat = path.stat()
+                except OSError as e:
+                    results[path] = FileResult(path, error=f"{type(e).__name__}: {e}")
+                    continue
+                fingerprint = known.get(self._key(path))
+                if fingerprint is None:
+                    items.append((path, None))
+                elif (fingerprint.size, fingerprint.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                    results[path] = FileResult(path, skipped=True)
+                else:
+                    items.append((path, fingerprint.sha256))
+            entries = pool.map(functools.partial(_scan_notebook, stream=stream), items)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('ref_forms', ?)", (ref_forms,))
+            for nb_entry in entries:
+                results[nb_entry.path] = self._store(nb_entry)
+            for key in indexed:
+                if not (self.root / key).exists():
+                    self._delete(key)
+        return [results[path] for path in nb_paths]
+
+    def definitions(self, label: str) -> list[IndexedTag]:
+        """Return the tags having a label, in every notebook."""
+        return self._tags("WHERE t.label = ?", label)
+
+    def references(self, label: str) -> list[IndexedRef]:
+        """Return the references to a label, in every notebook."""
+        return self._refs("WHERE r.label = ?", label)
+
+    def dangling(self) -> list[IndexedRef]:
+        """Return the references to a label that no tag of their notebook has."""
+        return self._refs(
+            "WHERE NOT EXISTS"
+            " (SELECT 1 FROM tags t WHERE t.notebook = r.notebook AND t.label = r.label)",
+        )
+
+    def duplicates(self) -> list[IndexedTag]:
+        """Return the tags whose label is given to another tag of their notebook."""
+        return self._tags(
+            "WHERE (t.notebook, t.label) IN"
+            " (SELECT notebook, label FROM tags GROUP BY notebook, label HAVING COUNT(*) > 1)",
+        )
+
+    def _tags(self, where: str, *params: str) -> list[IndexedTag]:
+        rows = self.db.execute(
+            "SELECT n.path, t.cell, t.offset, t.label, t.number"  # noqa: S608
+            f" FROM tags t JOIN notebooks n ON n.id = t.notebook {where}"
+            " ORDER BY n.path, t.cell, t.offset",
+            params,
+        )
+        return [IndexedTag(*row) for row in rows]
+
+    def _refs(self, where: str, *params: str) -> list[IndexedRef]:
+        rows = self.db.execute(
+            "SELECT n.path, r.cell, r.offset, r.label, r.form"  # noqa: S608
+            f" FROM refs r JOIN notebooks n ON n.id = r.notebook {where}"
+            " ORDER BY n.path, r.cell, r.offset",
+            params,
+        )
+        return [IndexedRef(*row) for row in rows]
+
+    def _store(self, entry: _NotebookEntry) -> FileResult:
+        if entry.error is not None or entry.fingerprint is None:
+            return FileResult(entry.path, error=entry.error)
+        key = self._key(entry.path)
+        fingerprint = entry.fingerprint
+        if entry.unchanged:
+            self.db.execute(
+                "UPDATE notebooks SET size = ?, mtime_ns = ? WHERE path = ?",
+                (fingerprint.size, fingerprint.mtime_ns, key),
+            )
+            return FileResult(entry.path, skipped=True)
+        self._delete(key)
+        notebook = self.db.execute(
+            "INSERT INTO notebooks (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+            (key, fingerprint.size, fingerprint.mtime_ns, fingerprint.sha256),
+        ).lastrowid
+        self.db.executemany(
+            "INSERT INTO tags VALUES (?, ?, ?, ?, ?)",
+            ((notebook, *tag) for tag in entry.tags),
+        )
+        self.db.executemany(
+            "INSERT INTO refs VALUES (?, ?, ?, ?, ?)",
+            ((notebook, *ref) for ref in entry.refs),
+        )
+        return FileResult(entry.path, changed=True)
+
+    def _delete(self, key: str) -> None:
+        row = self.db.execute("SELECT id FROM notebooks WHERE path = ?", (key,)).fetchone()
+        if row is None:
+            return
+        for table in ("tags", "refs"):
+            self.db.execute(f"DELETE FROM {table} WHERE notebook = ?", row)  # noqa: S608
+        self.db.execute("DELETE FROM notebooks WHERE id = ?", row)
+
+    def _key(self, path: pathlib.Path) -> str:
+        # relative to the index, so that a checkout can be moved
+        return pathlib.Path(os.path.relpath(path.resolve(), self.root)).as_posix()
+
+
+def _format_tags(tags: list[IndexedTag]) -> Iterator[str]:
+    for tag in tags:
+        yield f"{tag.path}:{tag.cell}:{tag.offset}\t\\tag{{{tag.label}}}\t({tag.number})"
+
+
+def _format_refs(refs: list[IndexedRef]) -> Iterator[str]:
+    for ref in refs:
+        yield f"{ref.path}:{ref.cell}:{ref.offset}\t{format_ref(ref.form, ref.label)}"
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="tagrefsorter index",
+        description="Keep an index of the \\tag labels and references of notebooks"
+        " in a SQLite file, and query it",
+    )
+    parser.add_argument(
+        "--db",
+        type=pathlib.Path,
+        default=DEFAULT_INDEX,
+        metavar="PATH",
+        help="SQLite file of the index (default: %(default)s)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    update = commands.add_parser(
+        "update",
+        help="Index the notebooks that changed since the last update",
+    )
+    update.add_argument(
+        "notebooks",
+        nargs="*",
+        default=["."],
+        metavar="notebook",
+        help="Paths to .ipynb or .md files, directories or glob patterns (default: .)",
+    )
+    update.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes")
+    update.add_argument("--engine", choices=ENGINES, default="pylatexenc", help="LaTeX engine")
+    update.add_argument(
+        "--ref-forms",
+        type=ref_forms_arg,
+        default=DEFAULT_REF_FORMS,
+        metavar="FORMS",
+        help="Comma separated spellings of the references (default: paren)",
+    )
+    update.add_argument("--stream", action="store_true", help="Read notebooks through an mmap")
+    for name, help_text in [
+        ("defs", "Print where a label is defined, with the number it would get"),
+        ("refs", "Print the references to a label"),
+    ]:
+        commands.add_parser(name, help=help_text).add_argument("label")
+    commands.add_parser("dangling", help="Print the references to labels not defined")
+    commands.add_parser("duplicates", help="Print the labels defined twice in a notebook")
+    args = parser.parse_args(argv)
+
+    with LabelIndex(args.db) as index:
+        if args.command == "update":
+            _update(index, args)
+            return
+        if args.command == "defs":
+            lines = _format_tags(index.definitions(args.label))
+        elif args.command == "refs":
+            lines = _format_refs(index.references(args.label))
+        elif args.command == "dangling":
+            lines = _format_refs(index.dangling())
+        else:
+            lines = _format_tags(index.duplicates())
+        for line in lines:
+            print(line)  # noqa: T201
+
+
+def _update(index: LabelIndex, args: argparse.Namespace) -> None:
+    nb_paths, errors = collect_notebooks(args.notebooks)
+    renumberer_factory = functools.partial(
+        new_renumberer,
+        engine=args.engine,
+        ref_forms=args.ref_forms,
+    )
+    results = errors + index.update(nb_paths, args.jobs, renumberer_factory, stream=args.stream)
+    for result in results:
+        if not result.ok:
+            print(f"Error: {result.path}: {result.error}", file=sys.stderr)  # noqa: T201
+        elif result.changed:
+            print(f"Indexed: {result.path}")  # noqa: T201
+    indexed = sum(result.changed for result in results)
+    failed = sum(not result.ok for result in results)
+    print(f"{indexed} indexed, {len(results) - indexed - failed} unchanged, {failed} failed")  # noqa: T201
+    if failed:
+        sys.exit(1)
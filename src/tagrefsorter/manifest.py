@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import pathlib
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING
+
+from ._version import __version__
+from .batch import FileResult, new_renumberer, run_batch
+from .refs import DEFAULT_REF_FORMS
+from .stream import atomic_write
+
+if TYPE_CHECKING:
+    from .parser import TagRenumberer
+
+MANIFEST_FORMAT = 1
+""" version of the layout of the manifest file """
+
+_HASH_CHUNK = 1024 * 1024
+
+
+@dataclass
+class Fingerprint:
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+def file_digest(path: pathlib.Path) -> str:
+    """Return the SHA-256 of the content of a file."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Fingerprints of the files left in their renumbered state by a previous run.
+
+    Renumbering is idempotent, so a file whose content is recorded does not need to be
+    read again. The size and mtime are trusted like the index of git: a file is hashed
+    only if they changed, or if it was modified too close to the save of the manifest
+    for its mtime to tell a later write apart. Only the files checked or recorded since
+    the manifest was loaded are saved, so deleted and renamed files are forgotten.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        ref_forms: tuple[str, ...] = DEFAULT_REF_FORMS,
+    ) -> None:
+        """Load the manifest, or start an empty one if it is missing or from another release.
+
+        Args:
+            path (pathlib.Path): manifest file
+            ref_forms (tuple[str, ...]): spellings of the references renumbered by this run;
+                a manifest of a run with other forms is not trusted
+
+        """
+        self.path = path
+        self.ref_forms = list(ref_forms)
+        self.root = path.resolve().parent
+        self.files: dict[str, Fingerprint] = {}
+        self.digests: set[str] = set()
+        """ contents known to be renumbered """
+        self.seen: set[str] = set()
+        """ keys of the files checked or recorded since the manifest was loaded """
+        self.saved_ns = 0
+        """ mtime of the manifest file, files modified since are always hashed """
+        try:
+            data = json.loads(path.read_bytes())
+            self.saved_ns = path.stat().st_mtime_ns
+        except (OSError, ValueError):
+            return
+        if (
+            data.get("version") != __version__
+            or data.get("format") != MANIFEST_FORMAT
+            or data.get("ref_forms", list(DEFAULT_REF_FORMS)) != self.ref_forms
+        ):
+            return
+        self.files = {
+            key: Fingerprint(**entry)
+            for key, entry in data["files"].items()
+            # the content of a deleted file is not known to be renumbered anymore
+            if (self.root / key).exists()
+        }
+        self.digests = {entry.sha256 for entry in self.files.values()}
+
+    def match(self, path: pathlib.Path) -> tuple[bool, str | None]:
+        """Tell whether a file is in a recorded renumbered state.
+
+        A file whose content is the recorded content of any file (for example a copy
+        of a notebook) is also considered renumbered.
+
+        Args:
+            path (pathlib.Path): file to check
+        Returns:
+            tuple[bool, str | None]: whether the file can be skipped, and the hash of its
+            content if it had to be read
+
+        """
+        stat = path.stat()
+        key = self._key(path)
+        self.seen.add(key)
+        entry = self.files.get(key)
+        if (
+            entry is not None
+            and entry.size == stat.st_size
+            and entry.mtime_ns == stat.st_mtime_ns
+            and entry.mtime_ns < self.saved_ns
+        ):
+            return True, None
+        digest = file_digest(path)
+        if digest in self.digests:
+            self.record(path, digest)
+            return True, digest
+        return False, digest
+
+    def record(self, path: pathlib.Path, digest: str | None = None) -> None:
+        """Record the current state of a file.
+
+        Args:
+            path (pathlib.Path): file left in its renumbered state
+            digest (str | None): hash of its content, if already known
+
+        """
+        stat = path.stat()
+        digest = digest or file_digest(path)
+        key = self._key(path)
+        self.seen.add(key)
+        self.files[key] = Fingerprint(stat.st_size, stat.st_mtime_ns, digest)
+        self.digests.add(digest)
+
+    def save(self) -> None:
+        """Write the manifest atomically, with the files seen since it was loaded."""
+        files = {key: entry for key, entry in self.files.items() if key in self.seen}
+        data = {
+            "version": __version__,
+            "format": MANIFEST_FORMAT,
+            "ref_forms": self.ref_forms,
+            "files": {key: asdict(entry) for key, entry in sorted(files.items())},
+        }
+        with atomic_write(self.path) as f:
+            f.write(json.dumps(data, indent=1).encode("utf-8") + b"\n")
+
+    def _key(self, path: pathlib.Path) -> str:
+        # relative to the manifest, so that a checkout can be moved
+        return pathlib.Path(os.path.relpath(path.resolve(), self.root)).as_posix()
+
+
+def run_incremental(
+    nb_paths: list[pathlib.Path],
+    manifest: Manifest,
+    jobs: int = 1,
+    renumberer_factory: Callable[[], "TagRenumberer"] = new_renumberer,
+    *,
+    stream: bool = False,
+) -> list[FileResult]:
+    """Renumber in place the notebooks that changed since the manifest was saved.
+
+    Notebooks in a recorded state are skipped without being parsed, and notebooks with
+    the same content are renumbered once. The manifest is updated but not saved.
+
+    Args:
+        nb_paths (list[pathlib.Path]): notebooks to process
+        manifest (Manifest): fingerprints of the previous run
+        jobs (int): number of worker processes, 0 means all CPUs
+        renumberer_factory (Callable[[], TagRenumberer]): picklable callable
+            building the renumberer of each worker
+        stream (bool): use the streaming reader of ``process_notebook``
+    Returns:
+        list[FileResult]: results in the order of ``nb_paths``
+
+    """
+    results: dict[pathlib.Path, FileResult] = {}
+    copies: dict[str, list[pathlib.Path]] = {}
+    """ notebooks to renumber grouped by content, the first of each group is processed """
+    for path in nb_paths:
+        try:
+            unchanged, digest = manifest.match(path)
+        except OSError as e:
+            results[path] = FileResult(path, error=f"{type(e).__name__}: {e}")
+            continue
+        if unchanged:
+            results[path] = FileResult(path, output=path, skipped=True)
+        elif digest is not None:
+            copies.setdefault(digest, []).append(path)
+    processed = run_batch(
+        [paths[0] for paths in copies.values()],
+        jobs,
+        renumberer_factory,
+        stream=stream,
+    )
+    for result, (input_digest, paths) in zip(processed, copies.items(), strict=True):
+        results[result.path] = result
+        if not result.ok:
+            results.update((path, FileResult(path, error=result.error)) for path in paths[1:])
+            continue
+        content = result.path.read_bytes() if result.changed else None
+        digest = input_digest if content is None else hashlib.sha256(content).hexdigest()
+        manifest.record(result.path, digest)
+        for path in paths[1:]:
+            if content is not None:
+                with atomic_write(path) as f:
+                    f.write(content)
+            manifest.record(path, digest)
+            results[path] = FileResult(path, output=path, changed=result.changed)
+    return [results[path] for path in nb_paths]
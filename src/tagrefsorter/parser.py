@@ -1,9 +1,19 @@
+import bisect
+import functools
+import heapq
 import logging
-from dataclasses import dataclass
+import re
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
 
 from markdown_it import MarkdownIt
+from markdown_it.rules_block import StateBlock
+from markdown_it.rules_inline import StateInline, image
 from markdown_it.token import Token
+from markdown_it.utils import EnvType
 from mdit_py_plugins.texmath import texmath_plugin
+from mdit_py_plugins.texmath.index import dollar_post, dollar_pre
 from pylatexenc.latexwalker import (
     LatexCharsNode,
     LatexCommentNode,
@@ -15,6 +25,20 @@ from pylatexenc.latexwalker import (
 )
 from pylatexenc.macrospec import LatexContextDb, MacroSpec, MacroStandardArgsParser
 
+from .refs import (
+    DEFAULT_REF_FORMS,
+    find_macro_refs,
+    format_ref,
+    macro_pattern,
+    parse_ref_forms,
+    ref_markers,
+)
+from .scanner import scan_math_block
+from .stats import RenumberStats
+
+if TYPE_CHECKING:
+    from .cache import ParseCache
+
 logger = logging.getLogger(__name__)
 
 ALIGNER = ["align", "alignat", "gather"]
@@ -22,204 +46,713 @@ ALIGNER = ["align", "alignat", "gather"]
 
 LINE_BREAKER = ["\\", "newline"]
 
+MATH_BLOCK_MARKER = "$$"
+""" a cell without this substring cannot contain a math block """
+
+REF_MARKER = "$("
+""" a cell without this substring cannot contain a reference written as ``$(x)$`` """
+
+# the "dollars" rules of texmath, without "^" so that they match at a position of the source
+_MATH_INLINE = re.compile(r"\$(\S[^$]*?[^\s\\]{1}?)\$")
+_MATH_BLOCK = re.compile(r"\${2}([^$]*?)\${2}")
+_MATH_SINGLE = re.compile(r"\$([^$\s\\]{1}?)\$")
+
+_INLINE_MARKUP = re.compile(r"[$\\\[<]|`+")
+""" characters and runs of backticks where an inline rule of markdown-it may hide a ``$`` """
+_BACKTICKS = re.compile(r"`+")
 
-@dataclass
+_NEWLINE = re.compile(r"\r\n?|\n")
+
+_WARM_UP_TEXT = "$$\na\n$$\n\n`b` $(c)$"
+
+_MINIMAL_RULES = [
+    # block rules deciding where a line starts, so where a math block may open or be hidden
+    "code",
+    "fence",
+    "blockquote",
+    "hr",
+    "list",
+    "reference",
+    "html_block",
+    "heading",
+    "lheading",
+    # inline rules that may hide a "$" from the math rules, or nest inline math in a token
+    "escape",
+    "backticks",
+    "link",
+    "image",
+    "autolink",
+    "html_inline",
+]
+""" rules of the "minimal" profile besides the paragraph, text and math rules """
+
+
+@dataclass(slots=True)
 class Rewrite:
     start: int
     length: int
 
 
-@dataclass
+@dataclass(slots=True)
 class Insertion(Rewrite):
     length: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class Replacement(Rewrite):
     label_start: int
     label_length: int
 
 
-@dataclass
+@dataclass(slots=True)
+class Reference:
+    start: int
+    length: int
+    label: str
+    form: str = "paren"
+    """ spelling of the reference, a key of ``REF_FORMS`` """
+
+
+@dataclass(slots=True)
+class TagRewrite:
+    start: int
+    length: int
+    label: str | None
+    """ old label of a replaced tag, or None for an insertion """
+
+
+@dataclass(slots=True)
+class CellPlan:
+    tags: list[TagRewrite] = field(default_factory=list)
+    refs: list[Reference] = field(default_factory=list)
+    math_blocks: int = 0
+    aligner_blocks: int = 0
+
+
+@dataclass(slots=True)
 class MathBlock:
     content: str
     layer0_nodes: list[LatexNode]
 
 
-class TagRenumberer:
-    def __init__(self) -> None:
-        self.update_map: dict[str, str] = {}
-        self.next_tag: int = 1
-        self.md = MarkdownIt().use(texmath_plugin)
-        self.md.block.ruler.disable("math_block_eqno")  # disable eqno parsing like "$$...$$ (1)"
-        tag_spec = MacroSpec("tag", MacroStandardArgsParser("*{"))
-        self.latex_context = LatexContextDb()
-        # note: The LatexContextDb instance is meant to be (pseudo-)immutable.
-        self.latex_context.add_context_category(None, macros=[tag_spec], prepend=True)
+def _ref_label(inline: str) -> str | None:
+    """Return the label of an inline math written as ``$(x)$``, or None if it is not a reference."""
+    if inline[:2] == "$(" and inline[-2:] == ")$":
+        return inline.strip("$").removeprefix("(").removesuffix(")").strip()
+    return None
+
+
+def _tag_label(content: str, rep: Replacement) -> str:
+    """Return the label of a replaced tag, for example ``1`` for ``tag{ 1 }``."""
+    return (
+        content[rep.label_start : rep.label_start + rep.label_length]
+        .strip()
+        .removeprefix("{")
+        .removesuffix("}")
+        .strip()
+    )
+
+
+def _find_aligner(nodes: list[LatexNode]) -> LatexEnvironmentNode | None:
+    """Return the first environment of ``ALIGNER`` among the top level nodes of a math block."""
+    return next(
+        (
+            node
+            for node in nodes
+            if isinstance(node, LatexEnvironmentNode) and node.environmentname in ALIGNER
+        ),
+        None,
+    )
+
+
+@functools.cache
+def block_parser(profile: str = "full") -> MarkdownIt:
+    """Return the markdown parser with the texmath plugin, built once per process.
+
+    The math rules of texmath are replaced by equivalent rules recording the offset of
+    each math token in ``token.meta["offset"]``. The "full" profile is the commonmark
+    preset. The "minimal" profile only enables the rules that decide where math can
+    appear (``_MINIMAL_RULES``), so it skips emphasis, entities and the like, and finds
+    the same math tokens.
+
+    The inline phase is disabled, so the inline tokens are left without children: their
+    content is read by ``_scan_inline_math``, or by ``md.inline.parse`` when the scanner
+    gives up.
+
+    Args:
+        profile (str): "full" or "minimal"
+    Returns:
+        MarkdownIt: parser shared by the callers
+
+    """
+    md = _build_markdown_parser(profile)
+    md.core.ruler.disable("inline")
+    # the rule chains are compiled on first use, compile them before threads share the parser
+    md.parse(_WARM_UP_TEXT, {})
+    md.inline.parse(_WARM_UP_TEXT, md, {}, [])
+    return md
+
+
+def _build_markdown_parser(profile: str) -> MarkdownIt:
+    if profile == "full":
+        md = MarkdownIt().use(texmath_plugin)
+    elif profile == "minimal":
+        # html blocks and inline html hide their content, as in the commonmark preset
+        md = MarkdownIt("zero", {"html": True}).use(texmath_plugin)
+        md.enable(_MINIMAL_RULES)
+        # these only merge text tokens and pair emphasis delimiters
+        md.core.ruler.disable("text_join")
+        md.inline.ruler2.disable(["balance_pairs", "fragments_join"])
+    else:
+        msg = f"unknown markdown profile: {profile}"
+        raise ValueError(msg)
+    md.block.ruler.disable("math_block_eqno")  # disable eqno parsing like "$$...$$ (1)"
+    md.block.ruler.at("math_block", _math_block_rule)
+    md.inline.ruler.at("math_inline", _math_inline_rule)
+    md.inline.ruler.at("image", _image_rule)
+    return md
+
+
+def _math_block_rule(state: StateBlock, start_line: int, end_line: int, silent: bool) -> bool:  # noqa: FBT001
+    """Match ``$$...$$`` at the start of a line, like the math_block rule of texmath."""
+    begin = state.bMarks[start_line] + state.tShift[start_line]
+    if not state.src.startswith(MATH_BLOCK_MARKER, begin):
+        return False
+    match = _MATH_BLOCK.match(state.src, begin)
+    if match is None:
+        return False
+    end = match.end() - 1
+    next_line = next(
+        (
+            line + 1
+            for line in range(start_line, end_line)
+            if state.bMarks[line] <= end <= state.eMarks[line]
+        ),
+        None,
+    )
+    if next_line is None:
+        # the block ends outside of the parent block (e.g. ">$$\n$$"), where texmath
+        # leaves state.line unchanged and markdown-it loops forever
+        return False
+    if not silent:
+        token = state.push("math_block", "math", 0)
+        token.block = True
+        token.content = match[1]
+        token.info = match[1]
+        token.markup = MATH_BLOCK_MARKER
+        token.meta["offset"] = begin
+    state.line = next_line
+    return True
+
+
+def _math_inline_rule(state: StateInline, silent: bool) -> bool:  # noqa: FBT001
+    """Match ``$...$``, like the math_inline rule of texmath.
+
+    The offset is relative to the content of the parent inline token.
+    """
+    begin = state.pos
+    if not state.src.startswith("$", begin) or not dollar_pre(state.src, begin):
+        return False
+    match = _MATH_INLINE.match(state.src, begin)
+    if match is None or not dollar_post(state.src, match.end() - 1):
+        return False
+    if not silent:
+        token = state.push("math_inline", "math", 0)
+        token.content = match[1]
+        token.markup = "$"
+        token.meta["offset"] = begin
+    state.pos = match.end()
+    return True
+
+
+def _image_rule(state: StateInline, silent: bool) -> bool:  # noqa: FBT001
+    """Match an image like the image rule of markdown-it, recording the offset of its alt text.
+
+    The alt text is parsed on its own, so the offsets recorded in the children of the image
+    are relative to ``token.meta["offset"]``, itself relative to the parent source.
+    """
+    begin = state.pos
+    if not image(state, silent):
+        return False
+    if not silent:
+        state.tokens[-1].meta["offset"] = begin + len("![")
+    return True
+
+
+def _inline_maths(tokens: list[Token], base: int = 0) -> list[tuple[int, str]]:
+    """Return the offset and content of the math_inline tokens of an inline parse.
+
+    The inline math in the alt text of images is included, with offsets in the same source.
+    """
+    results: list[tuple[int, str]] = []
+    for token in tokens:
+        if token.type == "math_inline":
+            results.append((base + token.meta["offset"], token.content))
+        elif token.type == "image" and token.children:
+            results += _inline_maths(token.children, base + token.meta["offset"])
+    return results
 
-    def renumber_tags(self, text: str) -> str:
-        """Renumber tags.
+
+def _match_dollar(src: str, begin: int) -> re.Match[str] | None:
+    """Match the math_inline rule, then the math_single rule of texmath at a ``$``."""
+    if not dollar_pre(src, begin):
+        return None
+    for rule in (_MATH_INLINE, _MATH_SINGLE):
+        math = rule.match(src, begin)
+        if math is not None and dollar_post(src, math.end() - 1):
+            return math
+    return None
+
+
+class _CodeSpans:
+    """Skip code spans like the backticks rule of markdown-it, including its cache.
+
+    The cache of closing runs makes the rule linear, and also decides which runs of
+    backticks open a code span, so it is reproduced as is.
+    """
+
+    def __init__(self, src: str) -> None:
+        self.src = src
+        self.backticks: dict[int, int] = {}
+        """ start of the last closing run seen of each length """
+        self.scanned = False
+        """ whether a scan reached the end of ``src`` """
+
+    def skip(self, opener: re.Match[str]) -> int:
+        """Return the end of the code span, or of the run of backticks ``opener``."""
+        length = len(opener[0])
+        if self.scanned and self.backticks.get(length, 0) <= opener.start():
+            return opener.end()
+        for closer in _BACKTICKS.finditer(self.src, opener.end()):
+            if len(closer[0]) == length:
+                return closer.end()
+            self.backticks[len(closer[0])] = closer.start()
+        self.scanned = True
+        return opener.end()
+
+
+def _scan_inline_math(src: str) -> list[tuple[int, str]] | None:
+    """Find the inline math of the content of an inline token in a single pass.
+
+    The scan follows the inline rules of markdown-it that may hide a ``$``: the math
+    rules of texmath, backslash escapes and code spans. Links, autolinks and inline HTML
+    are not followed, so the scanner gives up on a content holding ``[`` or ``<``.
+
+    Args:
+        src (str): content of an inline token
+    Returns:
+        list[tuple[int, str]] | None: offset and content of each math_inline token
+        markdown-it would produce, or None if the inline parser is needed
+
+    """
+    results: list[tuple[int, str]] = []
+    code_spans = _CodeSpans(src)
+    pos = 0
+    while (markup := _INLINE_MARKUP.search(src, pos)) is not None:
+        pos = markup.start()
+        char = markup[0][0]
+        if char == "$":
+            math = _match_dollar(src, pos)
+            if math is None:
+                pos += 1
+                continue
+            if math.re is _MATH_INLINE:
+                results.append((pos, math[1]))
+            pos = math.end()
+        elif char == "\\":
+            pos += 2  # an escape or a hard break (a backslash ending the content is text)
+        elif char == "`":
+            pos = code_spans.skip(markup)
+        else:
+            return None
+    return results
+
+
+@functools.cache
+def latex_context() -> LatexContextDb:
+    """Return the LaTeX context knowing the ``tag`` macro, built once per process."""
+    tag_spec = MacroSpec("tag", MacroStandardArgsParser("*{"))
+    context = LatexContextDb()
+    # note: The LatexContextDb instance is meant to be (pseudo-)immutable.
+    context.add_context_category(None, macros=[tag_spec], prepend=True)
+    return context
+
+
+class _SourceLocator:
+    """Map the offsets recorded by the math rules back to the text of a cell.
+
+    markdown-it parses the text with normalized line breaks, and the source of an inline
+    token is made of its lines without indentation and block markers (such as ``>``),
+    so an offset in an inline token is mapped through the start of each of its lines.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.src = text
+        self.crlf: list[int] = []
+        """ offsets in ``src`` of the line breaks written as ``\\r\\n`` in the text """
+        if "\r" in text or "\0" in text:
+            self.src = _NEWLINE.sub("\n", text).replace("\0", "\ufffd")
+            self.crlf = [m.start() - i for i, m in enumerate(re.finditer("\r\n", text))]
+        self.line_starts = [0, *(m.end() for m in re.finditer("\n", self.src))]
+        self.cursors: dict[int, int] = {}
+        """ end of the last located fragment of each line, for several inline tokens on a line """
+        self.inlines: dict[int, tuple[list[int], list[int]]] = {}
+
+    def span(self, start: int, length: int) -> tuple[int, int]:
+        """Return the start and the length in the text of a span of the parsed source."""
+        if not self.crlf:
+            return start, length
+        end = start + length
+        start += bisect.bisect_left(self.crlf, start)
+        end += bisect.bisect_left(self.crlf, end)
+        return start, end - start
+
+    def reference(self, content: str, offset: int, inline: Token) -> Reference | None:
+        """Return the reference of an inline math, or None if it is not a reference.
 
         Args:
-            text (str): text of a markdown cell
+            content (str): content of the inline math, without the dollars
+            offset (int): offset of the inline math in the content of ``inline``
+            inline (Token): inline token holding the inline math
         Returns:
-            str: updated text
+            Reference | None: reference located in the text of the cell
 
         """
-        tokens = self.md.parse(text)
-        math_blocks: list[MathBlock] = self._search_math_block(tokens)
-        split_text: list[str] = []
-        pos = 0
-        for math_block in math_blocks:
-            layer0_nodes = math_block.layer0_nodes
-            content = math_block.content
-            rewrites: list[Rewrite] = []
-            aligner_node = next(
-                (
-                    token
-                    for token in layer0_nodes
-                    if isinstance(token, LatexEnvironmentNode) and token.environmentname in ALIGNER
-                ),
-                None,
-            )
-            if aligner_node:
-                # process each line in aligner environment
-                nodes = aligner_node.nodelist
-                self._ensure_sentinel_line_breaker_inplace(nodes)
-                rewrites = self._find_rewrites_in_aligner(nodes)
-            else:
-                # process single line math block
-                rewrites = self._find_rewrite_in_single_line(layer0_nodes)
-            # apply replacements in reverse order
-            out: list[str] = []
-            cur = 0
-            for rep in rewrites:
-                out.append(content[cur : rep.start])
-                out.append(rf"\tag{{{self.next_tag}}}")
-                if isinstance(rep, Replacement):
-                    old_tag = (
-                        content[rep.label_start : rep.label_start + rep.label_length]
-                        .strip()
-                        .removeprefix("{")
-                        .removesuffix("}")
-                        .strip()
-                    )
-                    if len(old_tag) > 0:
-                        self.update_map[old_tag] = str(self.next_tag)
-                self.next_tag += 1
-                cur = rep.start + rep.length
-            out.append(content[cur:])
-            # reconstruct math block
-            new_block = "".join(out)
-            # replace in text
-            idx = text.find(content, pos)
-            split_text.append(text[pos:idx])
-            split_text.append(new_block)
-            pos = idx + len(content)
-        split_text.append(text[pos:])
-        return "".join(split_text)
+        math = f"${content}$"
+        label = _ref_label(math)
+        if label is None:
+            return None
+        return self.inline_reference(inline, offset, len(math), label, "paren")
 
-    def renumber_refs(self, text: str) -> str:
-        """Renumber refs.
+    def inline_reference(
+        self,
+        inline: Token,
+        offset: int,
+        length: int,
+        label: str,
+        form: str,
+    ) -> Reference | None:
+        """Return a reference found in the content of an inline token, located in the text.
 
         Args:
-            text (str): text of a markdown cell
+            inline (Token): inline token holding the reference
+            offset (int): offset of the reference in the content of ``inline``
+            length (int): length of the reference
+            label (str): label of the reference
+            form (str): spelling of the reference, a key of ``REF_FORMS``
         Returns:
-            str: updated text
+            Reference | None: reference located in the text of the cell
 
         """
-        tokens: list[Token] = self.md.parse(text)
-        inlines: list[str] = self._search_math_inline(tokens)
-        split_text: list[str] = []
-        pos = 0
-        for inline in inlines:
-            if inline[:2] == "$(" and inline[-2:] == ")$":
-                label = inline.strip("$").removeprefix("(").removesuffix(")").strip()
-                if label in self.update_map:
-                    new_label = self.update_map[label]
-                    new_inline = rf"$({new_label})$"
-                    idx = text.find(inline, pos)
-                    split_text.append(text[pos:idx])
-                    split_text.append(new_inline)
-                    pos = idx + len(inline)
-        split_text.append(text[pos:])
-        return "".join(split_text)
+        start = self._inline_offset(inline, offset)
+        if start is None:
+            return None
+        start, length = self.span(start, length)
+        return Reference(start=start, length=length, label=label, form=form)
+
+    def _inline_offset(self, inline: Token, offset: int) -> int | None:
+        """Map an offset in the content of an inline token to an offset in ``src``."""
+        if id(inline) not in self.inlines:
+            self.inlines[id(inline)] = self._locate_lines(inline)
+        content_starts, src_starts = self.inlines[id(inline)]
+        i = bisect.bisect_right(content_starts, offset) - 1
+        if i < 0 or src_starts[i] < 0:
+            return None
+        return src_starts[i] + offset - content_starts[i]
+
+    def _locate_lines(self, inline: Token) -> tuple[list[int], list[int]]:
+        """Find where each line of the content of an inline token starts in ``src``.
+
+        Returns:
+            tuple[list[int], list[int]]: offsets of the lines in the content and in ``src``
+            (-1 for a line that was not found)
+
+        """
+        content_starts: list[int] = []
+        src_starts: list[int] = []
+        first_line = inline.map[0] if inline.map else 0
+        content_pos = 0
+        for i, fragment in enumerate(inline.content.split("\n")):
+            line = first_line + i
+            line_start = self.line_starts[line] if line < len(self.line_starts) else len(self.src)
+            line_end = (
+                self.line_starts[line + 1] - 1
+                if line + 1 < len(self.line_starts)
+                else len(self.src)
+            )
+            lstripped = fragment.lstrip()
+            indent = len(fragment) - len(lstripped)
+            # markdown-it may expand a tab of the indentation into spaces
+            pos = self.src.find(lstripped, self.cursors.get(line, line_start), line_end)
+            content_starts.append(content_pos + indent)
+            src_starts.append(pos)
+            if pos >= 0:
+                self.cursors[line] = pos + len(lstripped)
+            content_pos += len(fragment) + 1
+        return content_starts, src_starts
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class TagParser:
+    """Parsers and configuration of the renumbering, shared by renumbering sessions.
 
-    def _search_math_block(self, tokens: list[Token]) -> list[MathBlock]:
-        """Search math_block tokens recursively.
+    A parser is never modified after it is built, and its methods only write to the
+    stats given to them, so one parser can analyze cells from many threads at once.
+    The per-notebook numbering state lives in the sessions returned by ``session``.
+    """
 
-        1. If token type is "math_block", append its content to results.
-        2. If token has children, search children recursively.
-        3. Return results.
+    cache: "ParseCache | None" = None
+    engine: str = "pylatexenc"
+    ref_forms: tuple[str, ...] = DEFAULT_REF_FORMS
+    """ spellings of the references to renumber, keys of ``REF_FORMS`` """
+    markdown_profile: str = "full"
+    """ rules of the markdown parser, see ``block_parser`` """
+    md: MarkdownIt = field(init=False, repr=False)
+    latex_context: LatexContextDb = field(init=False, repr=False)
+    ref_markers: tuple[str, ...] = field(init=False, repr=False)
+    """ a text without these substrings cannot contain a reference """
+    ref_pattern: re.Pattern[str] | None = field(init=False, repr=False)
+    """ pattern of the macro references, scanned in inline math and math blocks """
+
+    def __post_init__(self) -> None:
+        if self.engine not in {"pylatexenc", "fast"}:
+            msg = f"unknown engine: {self.engine}"
+            raise ValueError(msg)
+        ref_forms = parse_ref_forms(self.ref_forms)
+        object.__setattr__(self, "ref_forms", ref_forms)
+        object.__setattr__(self, "md", block_parser(self.markdown_profile))
+        object.__setattr__(self, "latex_context", latex_context())
+        object.__setattr__(self, "ref_markers", ref_markers(ref_forms))
+        object.__setattr__(self, "ref_pattern", macro_pattern(ref_forms))
+
+    def session(self) -> "TagRenumberer":
+        """Return a new renumbering session using this parser."""
+        return TagRenumberer(parser=self)
+
+    def plan_cell(self, text: str, stats: RenumberStats) -> CellPlan | None:
+        """Return the plan of a cell, replayed from the cache if possible.
 
         Args:
-            tokens (list[Token]): List of tokens to search.
+            text (str): text of a markdown cell
+            stats (RenumberStats): stats to add the counters and times of the cell to
+        Returns:
+            CellPlan | None: plan of the cell, or None if the cell cannot contain
+            a math block nor a reference
+
+        """
+        stats.markdown_cells += 1
+        if MATH_BLOCK_MARKER not in text and not self.may_have_refs(text):
+            # fast path: nothing to parse
+            stats.skipped_cells += 1
+            return None
+        start = time.perf_counter()
+        parse_time = stats.markdown_time + stats.latex_time
+        # the references found depend on the forms, so they are part of the key
+        variant = ",".join(self.ref_forms)
+        plan = self.cache.get(text, variant) if self.cache else None
+        if plan is None:
+            plan = self.analyze_cell(text, stats)
+            if self.cache:
+                self.cache.put(text, plan, variant)
+        else:
+            stats.cached_cells += 1
+        parse_time = stats.markdown_time + stats.latex_time - parse_time
+        stats.rewrite_time += time.perf_counter() - start - parse_time
+        return plan
+
+    def analyze_cell(self, text: str, stats: RenumberStats) -> CellPlan:
+        """Find the tags to rewrite and the references of a cell.
 
+        Args:
+            text (str): text of a markdown cell
+            stats (RenumberStats): stats to add the parse times to
         Returns:
-            list[tuple[list[LatexNode], str]]: List of tuples of
-            LaTeX nodes and their original content.
+            CellPlan: rewrites and references with positions in ``text``
 
         """
-        results: list[MathBlock] = []
+        start = time.perf_counter()
+        env: EnvType = {}
+        tokens = self.md.parse(text, env)
+        stats.markdown_time += time.perf_counter() - start
+        locator = _SourceLocator(text)
+        plan = CellPlan()
         for token in tokens:
             if token.type == "math_block":
-                content = f"$${token.content}$$"
-                latex_walker = LatexWalker(content, latex_context=self.latex_context)
-                root_math_block = latex_walker.get_latex_nodes(pos=0)[0]
-                if not isinstance(root_math_block[0], LatexMathNode):
-                    logger.warning(
-                        "Unexpected structure in math block. The content of token: %s",
-                        token.content,
-                    )
-                    continue
-                layer0_nodes: list[LatexNode] = root_math_block[0].nodelist
-                results.append(MathBlock(layer0_nodes=layer0_nodes, content=f"$${token.content}$$"))
-            elif token.children:
-                results += self._search_math_block(token.children)
-        return results
+                start = time.perf_counter()
+                math_block = self._parse_math_block(token)
+                stats.latex_time += time.perf_counter() - start
+                tags: list[TagRewrite] = []
+                if math_block is not None:
+                    plan.math_blocks += 1
+                    if _find_aligner(math_block.layer0_nodes):
+                        plan.aligner_blocks += 1
+                    tags = self._find_block_tags(token, math_block, locator)
+                    plan.tags += tags
+                plan.refs += [
+                    ref
+                    for ref in self._find_block_refs(token, locator, stats)
+                    # a reference in the argument of a tag is rewritten with the tag
+                    if not any(tag.start <= ref.start < tag.start + tag.length for tag in tags)
+                ]
+            elif token.type == "inline":
+                plan.refs += self._find_refs(token, env, locator, stats)
+        return plan
 
-    def _search_math_inline(self, tokens: list[Token]) -> list[str]:
-        """Search math_inline tokens recursively.
+    def may_have_refs(self, text: str) -> bool:
+        """Tell whether a text may contain a reference of ``ref_forms``."""
+        return any(marker in text for marker in self.ref_markers)
 
-        1. If token type is "math_inline", append its content to results.
-        2. If token has children, search children recursively.
-        3. Return results.
+    def _find_block_tags(
+        self,
+        token: Token,
+        math_block: MathBlock,
+        locator: _SourceLocator,
+    ) -> list[TagRewrite]:
+        """Find the tag rewrites of a math_block token, located in the text of the cell."""
+        offset = token.meta["offset"]
+        tags: list[TagRewrite] = []
+        for rep in self._find_block_rewrites(math_block):
+            label = _tag_label(math_block.content, rep) if isinstance(rep, Replacement) else None
+            start, length = locator.span(offset + rep.start, rep.length)
+            tags.append(TagRewrite(start=start, length=length, label=label))
+        return tags
+
+    def _find_block_refs(
+        self,
+        token: Token,
+        locator: _SourceLocator,
+        stats: RenumberStats,
+    ) -> list[Reference]:
+        """Find the macro references of a math_block token, without parsing its LaTeX.
 
         Args:
-            tokens (list[Token]): List of tokens to search.
+            token (Token): math_block token
+            locator (_SourceLocator): locator of the text of the cell
+            stats (RenumberStats): stats to add the scan time to
+        Returns:
+            list[Reference]: references in ascending order of position
+
+        """
+        if self.ref_pattern is None or not self.may_have_refs(token.content):
+            return []
+        start = time.perf_counter()
+        # the content starts after the opening "$$"
+        offset = token.meta["offset"] + len(MATH_BLOCK_MARKER)
+        refs = [
+            Reference(*locator.span(offset + ref_start, length), label=label, form=form)
+            for ref_start, length, form, label in find_macro_refs(self.ref_pattern, token.content)
+        ]
+        stats.latex_time += time.perf_counter() - start
+        return refs
+
+    def _find_refs(
+        self,
+        inline: Token,
+        env: EnvType,
+        locator: _SourceLocator,
+        stats: RenumberStats,
+    ) -> list[Reference]:
+        """Find the references of an inline token left unparsed by ``block_parser``.
 
+        Args:
+            inline (Token): inline token
+            env (EnvType): environment of the block parse (holding the link references)
+            locator (_SourceLocator): locator of the text of the cell
+            stats (RenumberStats): stats to add the parse time to
         Returns:
-            list[str]: List of math inline contents.
+            list[Reference]: references in ascending order of position
 
         """
-        results: list[str] = []
-        for token in tokens:
-            if token.type == "math_inline":
-                results.append(f"${token.content}$")
-            elif token.children:
-                results += self._search_math_inline(token.children)
-        return results
+        if not self.may_have_refs(inline.content):
+            return []
+        start = time.perf_counter()
+        maths = _scan_inline_math(inline.content)
+        if maths is None:
+            maths = _inline_maths(self.md.inline.parse(inline.content, self.md, env, []))
+        stats.markdown_time += time.perf_counter() - start
+        refs: list[Reference] = []
+        paren = "paren" in self.ref_forms
+        for offset, content in maths:
+            ref = locator.reference(content, offset, inline) if paren else None
+            if ref is not None:
+                refs.append(ref)
+            elif self.ref_pattern is not None:
+                # the content starts after the opening "$"
+                content_offset = offset + 1
+                for ref_start, length, form, label in find_macro_refs(self.ref_pattern, content):
+                    macro_start = content_offset + ref_start
+                    macro = locator.inline_reference(inline, macro_start, length, label, form)
+                    if macro is not None:
+                        refs.append(macro)
+        return refs
 
-    def _ensure_sentinel_line_breaker_inplace(self, nodes: list[LatexNode]) -> None:
-        """Add a line breaker node with a sentinel value.
+    def _find_block_rewrites(self, math_block: MathBlock) -> list[Rewrite]:
+        """Find the tag rewrites of a math block.
+
+        Args:
+            math_block (MathBlock): math block to search
+        Returns:
+            list[Rewrite]: rewrites with positions in ``math_block.content``
+
+        """
+        layer0_nodes = math_block.layer0_nodes
+        aligner_node = _find_aligner(layer0_nodes)
+        if aligner_node:
+            # process each line in aligner environment
+            nodes = self._with_sentinel_line_breaker(aligner_node.nodelist)
+            return self._find_rewrites_in_aligner(nodes)
+        # process single line math block
+        return self._find_rewrite_in_single_line(layer0_nodes)
+
+    def _parse_math_block(self, token: Token) -> MathBlock | None:
+        """Parse the LaTeX of a math_block token.
+
+        Args:
+            token (Token): math_block token
+
+        Returns:
+            MathBlock | None: parsed math block, or None if the structure is unexpected.
+
+        """
+        content = f"$${token.content}$$"
+        if self.engine == "fast":
+            nodes = scan_math_block(content)
+            if nodes is not None:
+                return MathBlock(layer0_nodes=nodes, content=content)
+            logger.debug("falling back to pylatexenc for the math block: %s", token.content)
+        latex_walker = LatexWalker(content, latex_context=self.latex_context)
+        root_math_block = latex_walker.get_latex_nodes(pos=0)[0]
+        if not isinstance(root_math_block[0], LatexMathNode):
+            logger.warning(
+                "Unexpected structure in math block. The content of token: %s",
+                token.content,
+            )
+            return None
+        layer0_nodes: list[LatexNode] = root_math_block[0].nodelist
+        return MathBlock(layer0_nodes=layer0_nodes, content=content)
+
+    def _with_sentinel_line_breaker(self, nodes: list[LatexNode]) -> list[LatexNode]:
+        """Return the nodes followed by a line breaker node with a sentinel value if needed.
 
         In the ALIGNER environment, a line breaker is placed at the end of the final line
         as a sentinel, enabling uniform processing of all lines.
+        The nodes of the parse tree are left as they are.
 
         Args:
             nodes (list[LatexNode]): List of LaTeX nodes in ALIGNER environment.
 
+        Returns:
+            list[LatexNode]: ``nodes``, or a new list ending with the sentinel.
+
         """
-        need_sentinel = False
         for item in reversed(nodes):
             if isinstance(item, LatexMacroNode):
                 if item.macroname in LINE_BREAKER:
                     # sentinel found
-                    break
+                    return nodes
                 if item.macroname in {"tag", "notag"}:
                     # ignore tag, tag*, and notag macros
                     continue
-                need_sentinel = True
                 break
             if isinstance(item, LatexCommentNode):
                 # ignore comments
@@ -227,11 +760,12 @@ class TagRenumberer:
             if isinstance(item, LatexCharsNode) and item.chars.strip() == "":
                 # ignore whitespace
                 continue
-            need_sentinel = True
             break
-        if need_sentinel:
-            # add sentinel line breaker
-            nodes.append(LatexMacroNode(macroname="\\"))
+        else:
+            return nodes
+        # add sentinel line breaker at the end of the final line
+        end = nodes[-1].pos + nodes[-1].len
+        return [*nodes, LatexMacroNode(macroname="\\", pos=end, len=0)]
 
     def _find_rewrites_in_aligner(self, nodes: list[LatexNode]) -> list[Rewrite]:
         """Find all tag replacements and insertion in the ALIGNER environment.
@@ -341,3 +875,165 @@ class TagRenumberer:
                 ),
             ]
         return []
+
+
+class TagRenumberer:
+    """Renumbering session of one notebook at a time, on top of a shared ``TagParser``.
+
+    The session holds the numbering state (``next_tag``, ``update_map``) and the stats,
+    so it is cheap to create: use one session per thread, or ``reset`` it between notebooks.
+    """
+
+    def __init__(
+        self,
+        cache: "ParseCache | None" = None,
+        engine: str = "pylatexenc",
+        ref_forms: tuple[str, ...] = DEFAULT_REF_FORMS,
+        markdown_profile: str = "full",
+        *,
+        parser: TagParser | None = None,
+    ) -> None:
+        """Create a session.
+
+        Args:
+            cache (ParseCache | None): on-disk cache of cell plans, if no parser is given
+            engine (str): LaTeX engine, if no parser is given
+            ref_forms (tuple[str, ...]): spellings of the references, if no parser is given
+            markdown_profile (str): rules of the markdown parser, if no parser is given
+            parser (TagParser | None): parser to share, instead of building one
+
+        """
+        self.parser = parser or TagParser(cache, engine, ref_forms, markdown_profile)
+        self.update_map: dict[str, str] = {}
+        self.next_tag: int = 1
+        self.stats = RenumberStats()
+
+    def reset(self) -> None:
+        """Clear the per-notebook state so that the parsers can be reused for another notebook."""
+        self.update_map = {}
+        self.next_tag = 1
+        self.stats = RenumberStats()
+
+    def plan_cell(self, text: str) -> CellPlan | None:
+        """Return the plan of a cell, replayed from the cache if possible.
+
+        Args:
+            text (str): text of a markdown cell
+        Returns:
+            CellPlan | None: plan of the cell, or None if the cell cannot contain
+            a math block nor a reference
+
+        """
+        return self.parser.plan_cell(text, self.stats)
+
+    def analyze_cell(self, text: str) -> CellPlan:
+        """Find the tags to rewrite and the references of a cell.
+
+        The renumbering state (``next_tag``, ``update_map``) is not touched.
+
+        Args:
+            text (str): text of a markdown cell
+        Returns:
+            CellPlan: rewrites and references with positions in ``text``
+
+        """
+        return self.parser.analyze_cell(text, self.stats)
+
+    def number_plan(self, plan: CellPlan) -> int:
+        """Assign sequential numbers to the tags of a plan and map their labels.
+
+        Args:
+            plan (CellPlan): result of ``analyze_cell``
+        Returns:
+            int: number of the first tag of the plan
+
+        """
+        start = time.perf_counter()
+        first_tag = self.next_tag
+        self.stats.math_blocks += plan.math_blocks
+        self.stats.aligner_blocks += plan.aligner_blocks
+        for tag in plan.tags:
+            if tag.label is None:
+                self.stats.insertions += 1
+            else:
+                self.stats.replacements += 1
+            if tag.label:
+                if tag.label not in self.update_map:
+                    self.stats.update_map_size += 1
+                self.update_map[tag.label] = str(self.next_tag)
+            self.next_tag += 1
+        self.stats.rewrite_time += time.perf_counter() - start
+        return first_tag
+
+    def needs_renumbering(self, texts: list[str]) -> bool:
+        """Tell whether renumbering would change the cells, stopping at the first change.
+
+        The cells are analyzed in notebook order until a tag would get another number.
+        While no tag changes, every label is its own number, so a reference would only be
+        rewritten if it is spelled differently (such as ``$( 1 )$``): a reference to a tag
+        already seen is checked at once, the others once every cell is analyzed.
+
+        Args:
+            texts (list[str]): markdown sources in notebook order
+        Returns:
+            bool: whether ``render_plan`` would change any of them
+
+        """
+        pending: list[tuple[str, Reference]] = []
+        for text in texts:
+            plan = self.plan_cell(text)
+            if plan is None:
+                continue
+            first_tag = self.number_plan(plan)
+            for number, tag in enumerate(plan.tags, first_tag):
+                if text[tag.start : tag.start + tag.length] != rf"\tag{{{number}}}":
+                    return True
+            for ref in plan.refs:
+                if ref.label not in self.update_map:
+                    pending.append((text, ref))
+                elif self._ref_changed(text, ref):
+                    return True
+        return any(self._ref_changed(text, ref) for text, ref in pending)
+
+    def _ref_changed(self, text: str, ref: Reference) -> bool:
+        number = self.update_map.get(ref.label)
+        if number is None:
+            return False
+        return text[ref.start : ref.start + ref.length] != format_ref(ref.form, number)
+
+    def render_plan(self, text: str, plan: CellPlan, first_tag: int) -> str:
+        """Rewrite the tags and the references of a cell in a single pass.
+
+        The references are resolved with ``update_map``, so every plan of the notebook
+        must be numbered by ``number_plan`` before the first one is rendered.
+
+        Args:
+            text (str): text the plan was made from
+            plan (CellPlan): plan numbered from ``first_tag``
+            first_tag (int): result of ``number_plan``
+        Returns:
+            str: updated text
+
+        """
+        start = time.perf_counter()
+        refs = [
+            (ref.start, ref.length, format_ref(ref.form, self.update_map[ref.label]))
+            for ref in plan.refs
+            if ref.label in self.update_map
+        ]
+        self.stats.refs_rewritten += len(refs)
+        self.stats.refs_time += time.perf_counter() - start
+        start = time.perf_counter()
+        tags = (
+            (tag.start, tag.length, rf"\tag{{{number}}}")
+            for number, tag in enumerate(plan.tags, first_tag)
+        )
+        split_text: list[str] = []
+        pos = 0
+        for rewrite_start, length, new_text in heapq.merge(tags, refs):
+            split_text.append(text[pos:rewrite_start])
+            split_text.append(new_text)
+            pos = rewrite_start + length
+        split_text.append(text[pos:])
+        self.stats.rewrite_time += time.perf_counter() - start
+        return "".join(split_text)
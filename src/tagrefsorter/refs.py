@@ -0,0 +1,102 @@
+import argparse
+import functools
+import re
+from collections.abc import Iterable, Iterator
+
+REF_FORMS = {
+    "paren": "$({})$",
+    "eqref": "\\eqref{{{}}}",
+    "ref": "\\ref{{{}}}",
+}
+""" spelling of a reference to an equation, by form: ``paren`` is an inline math written as
+``$(x)$``, the others are macros found anywhere in inline math and math blocks """
+
+DEFAULT_REF_FORMS = ("paren",)
+
+_MACRO_FORMS = ("eqref", "ref")
+
+_MARKERS = {"paren": "$(", "eqref": "\\eqref", "ref": "\\ref"}
+
+
+def parse_ref_forms(forms: Iterable[str]) -> tuple[str, ...]:
+    """Check reference forms and return them in the order of ``REF_FORMS``, without duplicates.
+
+    Args:
+        forms (Iterable[str]): names of forms, keys of ``REF_FORMS``
+    Returns:
+        tuple[str, ...]: forms in canonical order
+    Raises:
+        ValueError: on an unknown form
+
+    """
+    forms = set(forms)
+    unknown = forms - REF_FORMS.keys()
+    if unknown:
+        msg = f"unknown reference form: {', '.join(sorted(unknown))}"
+        raise ValueError(msg)
+    return tuple(form for form in REF_FORMS if form in forms)
+
+
+def ref_forms_arg(value: str) -> tuple[str, ...]:
+    """Parse a comma separated ``--ref-forms`` command line argument.
+
+    Args:
+        value (str): names of forms separated by commas, for example ``paren,eqref``
+    Returns:
+        tuple[str, ...]: forms in canonical order
+    Raises:
+        argparse.ArgumentTypeError: on an unknown form
+
+    """
+    try:
+        return parse_ref_forms(form.strip() for form in value.split(","))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from e
+
+
+def format_ref(form: str, label: str) -> str:
+    r"""Spell a reference to ``label`` in ``form``, for example ``\eqref{3}``."""
+    return REF_FORMS[form].format(label)
+
+
+def ref_markers(forms: tuple[str, ...]) -> tuple[str, ...]:
+    """Return substrings such that a text holding none of them has no reference of ``forms``."""
+    return tuple(_MARKERS[form] for form in forms)
+
+
+@functools.cache
+def macro_pattern(forms: tuple[str, ...]) -> re.Pattern[str] | None:
+    r"""Return the pattern scanning LaTeX for the macro references of ``forms`` in one pass.
+
+    Besides the references, the pattern matches comments and escaped characters, so that
+    the scan skips them: ``\\ref{x}`` is a line break followed by text, not a reference.
+
+    Args:
+        forms (tuple[str, ...]): forms in canonical order
+    Returns:
+        re.Pattern[str] | None: pattern with the groups ``form`` and ``label``
+        (None for a match to skip), or None if no form is a macro
+
+    """
+    macros = [form for form in forms if form in _MACRO_FORMS]
+    if not macros:
+        return None
+    return re.compile(
+        rf"\\(?P<form>{'|'.join(macros)})[ \t]*\{{(?P<label>[^{{}}\n]*)\}}|%[^\n]*|\\.",
+    )
+
+
+def find_macro_refs(pattern: re.Pattern[str], latex: str) -> Iterator[tuple[int, int, str, str]]:
+    """Find the macro references of a LaTeX fragment in a single pass.
+
+    Args:
+        pattern (re.Pattern[str]): result of ``macro_pattern``
+        latex (str): content of an inline math or of a math block
+    Yields:
+        tuple[int, int, str, str]: start, length, form and label of each reference
+
+    """
+    for match in pattern.finditer(latex):
+        form = match["form"]
+        if form is not None:
+            yield match.start(), match.end() - match.start(), form, match["label"].strip()
@@ -0,0 +1,217 @@
+import re
+
+from pylatexenc.latexwalker import (
+    LatexCharsNode,
+    LatexCommentNode,
+    LatexEnvironmentNode,
+    LatexGroupNode,
+    LatexMacroNode,
+    LatexNode,
+)
+from pylatexenc.macrospec import ParsedMacroArgs
+
+_MACRO_NAME = re.compile(r"[A-Za-z]+")
+
+_ENVIRONMENT_NAME = re.compile(r"\s*\{([\w* ._-]+)\}")
+""" name after ``\\begin`` or ``\\end``, as read by pylatexenc """
+
+_COMMENT_END = re.compile(r"(\n|\r|\n\r)(?P<extraspace>\s*)")
+
+_TEXT = re.compile(r"[^\\{}%$]+")
+
+_PARAGRAPH = "\n\n"
+
+
+class _UnsupportedError(Exception):
+    """Raised on a construct the scanner does not classify like pylatexenc."""
+
+
+def scan_math_block(content: str) -> list[LatexNode] | None:
+    r"""Scan a math block into the nodes read by the tag rewrite logic.
+
+    Only ``\tag``/``\tag*`` with its argument, the other macros, comments, groups and
+    environments are told apart, so a block is scanned in one linear pass. The nodes have
+    the types, positions and lengths that ``LatexWalker`` gives them with the ``tag``
+    context of ``TagRenumberer``; runs of text and spaces are merged into one chars node.
+
+    Args:
+        content (str): math block written as ``$$...$$``
+    Returns:
+        list[LatexNode] | None: nodes inside the math delimiters, or None if the block
+        contains a construct (such as ``\[``, an unbalanced brace, or a ``\tag`` without
+        a braced or single character argument) that must be parsed by pylatexenc
+
+    """
+    try:
+        nodes, _ = _Scanner(content).scan_nodes(2, None)
+    except _UnsupportedError:
+        return None
+    return nodes
+
+
+class _Scanner:
+    def __init__(self, s: str) -> None:
+        self.s = s
+        self.end = len(s) - 2
+        """ position of the closing ``$$`` """
+
+    def scan_nodes(self, pos: int, close: str | None) -> tuple[list[LatexNode], int]:
+        r"""Scan nodes until the end of the math block, a ``}`` or an ``\end``.
+
+        Args:
+            pos (int): position to start from
+            close (str | None): None for the math block, ``}`` for a group,
+                or the name of the environment
+        Returns:
+            tuple[list[LatexNode], int]: nodes and the position after the closing token
+
+        """
+        s = self.s
+        nodes: list[LatexNode] = []
+        chars_start = pos
+        while pos < self.end:
+            c = s[pos]
+            if c not in "\\{}%":
+                m = _TEXT.match(s, pos)
+                if m is None:  # a "$", which markdown-it never leaves in a math block
+                    raise _UnsupportedError
+                pos = m.end()
+                continue
+            _flush_chars(s, nodes, chars_start, pos)
+            node: LatexNode
+            if c == "}":
+                if close != "}":
+                    raise _UnsupportedError
+                return nodes, pos + 1
+            if c == "{":
+                node, after = self._group(pos)
+            elif c == "%":
+                node, after = self._comment(pos)
+            else:
+                macro, after = self._macro(pos, close)
+                if macro is None:
+                    return nodes, after
+                node = macro
+            nodes.append(node)
+            pos = chars_start = after
+        if close is not None:
+            raise _UnsupportedError
+        _flush_chars(s, nodes, chars_start, pos)
+        return nodes, pos
+
+    def _group(self, pos: int) -> tuple[LatexGroupNode, int]:
+        nodes, after = self.scan_nodes(pos + 1, "}")
+        group = LatexGroupNode(nodelist=nodes, delimiters=("{", "}"), pos=pos, len=after - pos)
+        return group, after
+
+    def _macro(self, pos: int, close: str | None) -> tuple[LatexNode | None, int]:
+        r"""Read a macro or an environment, or None for the ``\end`` closing ``close``."""
+        name, after = self._macro_name(pos)
+        if name == "end":
+            env_name, after = self._environment_name(after)
+            if env_name != close:
+                raise _UnsupportedError
+            return None, after
+        if name == "begin":
+            env_name, after = self._environment_name(after)
+            body, after = self.scan_nodes(after, env_name)
+            env = LatexEnvironmentNode(
+                environmentname=env_name,
+                nodelist=body,
+                pos=pos,
+                len=after - pos,
+            )
+            return env, after
+        if name == "tag":
+            return self._tag(pos, after)
+        post = self._post_space(after) if name.isalpha() else after
+        macro = LatexMacroNode(
+            macroname=name,
+            macro_post_space=self.s[after:post],
+            pos=pos,
+            len=post - pos,
+        )
+        return macro, post
+
+    def _macro_name(self, pos: int) -> tuple[str, int]:
+        """Read the name of the macro at ``pos`` and return it with the position after it."""
+        s = self.s
+        if pos + 1 >= self.end:
+            raise _UnsupportedError
+        c = s[pos + 1]
+        if not c.isalpha():
+            if c in "[]()":  # math mode delimiters for pylatexenc
+                raise _UnsupportedError
+            return c, pos + 2
+        m = _MACRO_NAME.match(s, pos + 1)
+        if m is None or s[m.end()].isalpha():  # pylatexenc also takes non-ASCII letters
+            raise _UnsupportedError
+        return m[0], m.end()
+
+    def _environment_name(self, pos: int) -> tuple[str, int]:
+        m = _ENVIRONMENT_NAME.match(self.s, pos, self.end)
+        if m is None:
+            raise _UnsupportedError
+        return m[1], m.end()
+
+    def _post_space(self, pos: int) -> int:
+        """Return the end of the spaces after a macro name, stopping before a blank line."""
+        s = self.s
+        end = pos
+        while end < self.end and s[end].isspace():
+            end += 1
+            if end - pos >= len(_PARAGRAPH) and s.startswith(_PARAGRAPH, end - 2):
+                return end - 2
+        return end
+
+    def _comment(self, pos: int) -> tuple[LatexCommentNode, int]:
+        m = _COMMENT_END.search(self.s, pos, self.end)
+        if m is None:  # pylatexenc would read the closing "$$" as part of the comment
+            raise _UnsupportedError
+        after = m.start() if m["extraspace"].startswith(("\n", "\r")) else m.end()
+        node = LatexCommentNode(
+            comment=self.s[pos + 1 : m.start()],
+            comment_post_space=self.s[m.start() : after],
+            pos=pos,
+            len=after - pos,
+        )
+        return node, after
+
+    def _tag(self, pos: int, name_end: int) -> tuple[LatexMacroNode, int]:
+        r"""Read ``\tag`` (``*{`` arguments) whose name ends at ``name_end``."""
+        s = self.s
+        arg_pos = self._post_space(name_end)
+        if arg_pos >= self.end or s.startswith(_PARAGRAPH, arg_pos):
+            raise _UnsupportedError
+        star = None
+        if s[arg_pos] == "*":
+            star = LatexCharsNode(chars="*", pos=arg_pos, len=1)
+            arg_pos += 1
+            while arg_pos < self.end and s[arg_pos].isspace():
+                arg_pos += 1
+            if _PARAGRAPH in s[star.pos : arg_pos]:
+                raise _UnsupportedError
+        if arg_pos >= self.end:
+            raise _UnsupportedError
+        c = s[arg_pos]
+        arg: LatexNode
+        if c == "{":
+            arg, after = self._group(arg_pos)
+        elif c in "\\}%$" or c.isspace():
+            raise _UnsupportedError
+        else:
+            arg = LatexCharsNode(chars=c, pos=arg_pos, len=1)
+            after = arg_pos + 1
+        node = LatexMacroNode(
+            macroname="tag",
+            nodeargd=ParsedMacroArgs(argspec="*{", argnlist=[star, arg]),
+            macro_post_space=s[name_end : self._post_space(name_end)],
+            pos=pos,
+            len=after - pos,
+        )
+        return node, after
+
+
+def _flush_chars(s: str, nodes: list[LatexNode], start: int, end: int) -> None:
+    if end > start:
+        nodes.append(LatexCharsNode(chars=s[start:end], pos=start, len=end - start))
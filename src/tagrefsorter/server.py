@@ -0,0 +1,203 @@
+import argparse
+import functools
+import json
+import pathlib
+import sys
+from collections.abc import Callable
+from typing import Any, TextIO
+
+from . import __version__
+from .batch import ENGINES, MARKDOWN_PROFILES, new_renumberer, renumber_sources
+from .parser import TagRenumberer
+from .refs import DEFAULT_REF_FORMS, ref_forms_arg
+from .stream import read_markdown_sources, write_spliced
+
+# error codes of JSON-RPC 2.0
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class Server:
+    """JSON-RPC 2.0 server keeping one warm renumberer across requests.
+
+    Requests and responses are JSON documents, one per line. Notifications (requests without
+    ``id``) get no response, even when they fail.
+
+    Methods:
+        renumber: params are one of
+            ``{"sources": [str, ...]}``: markdown sources in notebook order,
+            ``{"notebook": {...}}``: an nbformat 4 notebook document,
+            ``{"path": str, "write": bool}``: a notebook file, rewritten if ``write`` is true.
+            The result holds ``changes``, a list of ``{"index": int, "source": str}``
+            (index of the source or of the cell), plus the updated ``sources`` or ``notebook``.
+        version: returns the version of tagrefsorter.
+        shutdown: stops the server after responding.
+
+    """
+
+    def __init__(self, renumberer_factory: Callable[[], TagRenumberer] = TagRenumberer) -> None:
+        """Create the server.
+
+        Args:
+            renumberer_factory (Callable[[], TagRenumberer]): builds the renumberer, with the
+                engine, reference forms and markdown profile of the results
+
+        """
+        self.renumberer = renumberer_factory()
+        self.running = True
+        self.methods: dict[str, Callable[[dict[str, Any]], Any]] = {
+            "renumber": self.renumber,
+            "version": lambda _: __version__,
+            "shutdown": self.shutdown,
+        }
+
+    def serve(self, stdin: TextIO, stdout: TextIO) -> None:
+        """Answer requests read from ``stdin`` until it is closed or ``shutdown`` is called."""
+        for line in stdin:
+            if not line.strip():
+                continue
+            response = self.handle_line(line)
+            if response is not None:
+                stdout.write(json.dumps(response, ensure_ascii=False) + "\n")
+                stdout.flush()
+            if not self.running:
+                break
+
+    def handle_line(self, line: str) -> dict[str, Any] | None:
+        """Handle one request line and return the response (None for a notification)."""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return _error_response(None, RpcError(PARSE_ERROR, f"Parse error: {e}"))
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            # the id of an invalid request cannot be trusted, so the error is always sent
+            return _error_response(None, RpcError(INVALID_REQUEST, "Invalid Request"))
+        request_id = request.get("id")
+        try:
+            method = self.methods.get(request["method"])
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, f"Method not found: {request['method']}")  # noqa: TRY301
+            params = request.get("params", {})
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "params must be an object")  # noqa: TRY301
+            result = method(params)
+        except RpcError as e:
+            response = _error_response(request_id, e)
+        except Exception as e:  # noqa: BLE001
+            response = _error_response(
+                request_id,
+                RpcError(SERVER_ERROR, f"{type(e).__name__}: {e}"),
+            )
+        else:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        if "id" not in request:
+            return None
+        return response
+
+    def renumber(self, params: dict[str, Any]) -> dict[str, Any]:
+        if "sources" in params:
+            sources = params["sources"]
+            if not isinstance(sources, list) or not all(isinstance(s, str) for s in sources):
+                raise RpcError(INVALID_PARAMS, "sources must be a list of strings")
+            texts = renumber_sources(sources, self.renumberer)
+            return {"sources": texts, "changes": _changes(range(len(sources)), sources, texts)}
+        if "notebook" in params:
+            return self._renumber_notebook(params["notebook"])
+        if "path" in params:
+            path = pathlib.Path(params["path"])
+            return self._renumber_path(path, write=bool(params.get("write")))
+        raise RpcError(INVALID_PARAMS, "one of sources, notebook or path is required")
+
+    def shutdown(self, _: dict[str, Any]) -> None:
+        self.running = False
+
+    def _renumber_notebook(self, nb: Any) -> dict[str, Any]:  # noqa: ANN401
+        if not isinstance(nb, dict) or not isinstance(nb.get("cells"), list):
+            raise RpcError(INVALID_PARAMS, "notebook must be an nbformat 4 document")
+        indices = [i for i, cell in enumerate(nb["cells"]) if cell.get("cell_type") == "markdown"]
+        sources = [_join_source(nb["cells"][i].get("source", "")) for i in indices]
+        texts = renumber_sources(sources, self.renumberer)
+        changes = _changes(indices, sources, texts)
+        for change in changes:
+            cell = nb["cells"][change["index"]]
+            if isinstance(cell.get("source"), list):
+                cell["source"] = change["source"].splitlines(keepends=True)
+            else:
+                cell["source"] = change["source"]
+        return {"notebook": nb, "changes": changes}
+
+    def _renumber_path(self, path: pathlib.Path, *, write: bool) -> dict[str, Any]:
+        with read_markdown_sources(path) as (buf, sources):
+            texts = renumber_sources([source.text for source in sources], self.renumberer)
+            changes = _changes(
+                [source.index for source in sources],
+                [source.text for source in sources],
+                texts,
+            )
+            if write and changes:
+                patches = [
+                    (source, text)
+                    for source, text in zip(sources, texts, strict=True)
+                    if text != source.text
+                ]
+                write_spliced(buf, path, patches)
+        return {"changes": changes, "written": write and bool(changes)}
+
+
+def _join_source(source: str | list[str]) -> str:
+    return source if isinstance(source, str) else "".join(source)
+
+
+def _changes(indices: Any, sources: list[str], texts: list[str]) -> list[dict[str, Any]]:  # noqa: ANN401
+    return [
+        {"index": index, "source": text}
+        for index, source, text in zip(indices, sources, texts, strict=True)
+        if text != source
+    ]
+
+
+def _error_response(request_id: Any, error: RpcError) -> dict[str, Any]:  # noqa: ANN401
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": error.code, "message": error.message},
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="tagrefsorter serve",
+        description="Serve JSON-RPC 2.0 requests (one JSON document per line) on stdin/stdout",
+    )
+    parser.add_argument("--engine", choices=ENGINES, default="pylatexenc", help="LaTeX engine")
+    parser.add_argument(
+        "--ref-forms",
+        type=ref_forms_arg,
+        default=DEFAULT_REF_FORMS,
+        metavar="FORMS",
+        help="Comma separated spellings of the references (default: paren)",
+    )
+    parser.add_argument(
+        "--markdown-profile",
+        choices=MARKDOWN_PROFILES,
+        default="full",
+        help="Markdown rules (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+    renumberer_factory = functools.partial(
+        new_renumberer,
+        engine=args.engine,
+        ref_forms=args.ref_forms,
+        markdown_profile=args.markdown_profile,
+    )
+    Server(renumberer_factory).serve(sys.stdin, sys.stdout)
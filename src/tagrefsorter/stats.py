@@ -0,0 +1,39 @@
+from dataclasses import dataclass, fields
+
+
+@dataclass
+class RenumberStats:
+    markdown_cells: int = 0
+    """ markdown cells given to the renumberer """
+    skipped_cells: int = 0
+    """ cells that took the fast path (no ``$$`` nor reference), skipping the parsers """
+    cached_cells: int = 0
+    """ cells whose analysis was replayed from the cache """
+    math_blocks: int = 0
+    aligner_blocks: int = 0
+    """ math blocks holding an environment of ``ALIGNER`` """
+    insertions: int = 0
+    """ tags added to lines without a tag """
+    replacements: int = 0
+    """ existing tags renumbered """
+    update_map_size: int = 0
+    """ distinct old labels mapped to a new number """
+    refs_rewritten: int = 0
+    """ references whose label was replaced """
+    read_time: float = 0.0
+    """ seconds spent reading notebooks (``nbformat.read`` or the streaming reader) """
+    markdown_time: float = 0.0
+    """ seconds spent parsing markdown (block structure and inline math) """
+    latex_time: float = 0.0
+    """ seconds spent parsing the LaTeX of math blocks """
+    rewrite_time: float = 0.0
+    """ seconds spent finding, locating and applying the tag rewrites """
+    refs_time: float = 0.0
+    """ seconds spent resolving and splicing references """
+    write_time: float = 0.0
+    """ seconds spent writing notebooks """
+
+    def merge(self, other: "RenumberStats") -> None:
+        """Add the counters of another stats object to this one."""
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
@@ -0,0 +1,353 @@
+import contextlib
+import json
+import mmap
+import os
+import pathlib
+import re
+import shutil
+import tempfile
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import BinaryIO
+
+_WHITESPACE = frozenset(b" \t\r\n")
+
+_STRUCTURAL = re.compile(rb'["{}\[\]]')
+""" characters that matter while skipping an object or an array """
+
+_LITERAL = re.compile(rb"[^,}\]\s]*")
+""" numbers, true, false and null """
+
+_LEADING_WHITESPACE = re.compile(rb"\s+")
+
+_TRAILING_WHITESPACE = re.compile(rb"(\s*)\]$")
+
+_QUOTE = 0x22
+_BACKSLASH = 0x5C
+
+
+class NotebookFormatError(ValueError):
+    pass
+
+
+@dataclass
+class MarkdownSource:
+    index: int
+    """ index of the cell in the notebook """
+    start: int
+    """ byte offset of the JSON value of "source" """
+    end: int
+    text: str
+    """ decoded source (lines joined) """
+
+
+@contextlib.contextmanager
+def read_markdown_sources(
+    path: pathlib.Path,
+) -> Iterator[tuple[mmap.mmap, list[MarkdownSource]]]:
+    """Read the sources of the markdown cells of a notebook without loading the rest.
+
+    The notebook is memory mapped, and the map stays open in the block so that the
+    updated sources can be spliced into it.
+
+    Args:
+        path (pathlib.Path): path of an nbformat 4 notebook
+    Yields:
+        tuple[mmap.mmap, list[MarkdownSource]]: bytes of the notebook, and its markdown
+        sources with their byte spans
+
+    """
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        yield buf, scan_markdown_sources(buf)
+
+
+def scan_markdown_sources(buf: bytes | mmap.mmap) -> list[MarkdownSource]:
+    """Scan the JSON of a notebook for the sources of markdown cells.
+
+    Only the values of "source" of markdown cells are decoded. Every other value
+    (outputs, attachments, metadata) is skipped by searching for its end,
+    so memory stays proportional to the markdown text.
+
+    Args:
+        buf (bytes | mmap.mmap): bytes of an nbformat 4 notebook, such as an mmap
+    Returns:
+        list[MarkdownSource]: markdown sources with their byte spans
+
+    Raises:
+        NotebookFormatError: if the JSON is malformed or the notebook is not nbformat 4
+
+    """
+    try:
+        return _Scanner(buf).scan_notebook()
+    except IndexError as e:
+        msg = "unexpected end of notebook"
+        raise NotebookFormatError(msg) from e
+
+
+def write_spliced(
+    buf: bytes | mmap.mmap,
+    path: pathlib.Path,
+    patches: list[tuple[MarkdownSource, str]],
+) -> None:
+    """Write a notebook with the sources of some markdown cells replaced.
+
+    Only the JSON values of the patched sources are re-encoded, in the layout of the
+    original value (a string, or a list of lines with the same indentation).
+    Every other byte is copied from ``buf`` as it is. The file is written atomically.
+
+    Args:
+        buf (bytes | mmap.mmap): bytes of the original notebook
+        path (pathlib.Path): path to write
+        patches (list[tuple[MarkdownSource, str]]): sources to replace and their new text,
+            in ascending order of position
+
+    """
+    with atomic_write(path) as f:
+        splice_sources(buf, f, patches)
+
+
+def splice_sources(
+    buf: bytes | mmap.mmap,
+    f: BinaryIO,
+    patches: list[tuple[MarkdownSource, str]],
+) -> None:
+    """Write the bytes of a notebook with the sources of some markdown cells replaced.
+
+    Args:
+        buf (bytes | mmap.mmap): bytes of the original notebook
+        f (BinaryIO): file to write to
+        patches (list[tuple[MarkdownSource, str]]): sources to replace and their new text,
+            in ascending order of position
+
+    """
+    with memoryview(buf) as view:
+        pos = 0
+        for source, text in patches:
+            f.write(view[pos : source.start])
+            f.write(_encode_source(text, buf, source))
+            pos = source.end
+        f.write(view[pos:])
+
+
+@contextlib.contextmanager
+def atomic_write(path: pathlib.Path) -> Iterator[BinaryIO]:
+    """Open a temporary file that replaces ``path`` once it is completely written.
+
+    Readers never see a partially written notebook, and ``path`` is left untouched
+    if writing fails. The permissions of an existing ``path`` are kept.
+
+    Args:
+        path (pathlib.Path): path to write
+    Yields:
+        BinaryIO: file to write to
+
+    """
+    with staged_write(path) as (f, tmp_path):
+        yield f
+    try:
+        tmp_path.replace(path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+@contextlib.contextmanager
+def staged_write(path: pathlib.Path) -> Iterator[tuple[BinaryIO, pathlib.Path]]:
+    """Open a temporary file next to ``path``, kept once it is completely written.
+
+    The caller then replaces ``path`` with the temporary file, or deletes it. The file
+    is deleted if writing fails, and gets the permissions of an existing ``path``.
+
+    Args:
+        path (pathlib.Path): path the temporary file is meant to replace
+    Yields:
+        tuple[BinaryIO, pathlib.Path]: file to write to and its path
+
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    tmp_path = pathlib.Path(tmp)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f, tmp_path
+            f.flush()
+            os.fsync(f.fileno())
+        with contextlib.suppress(FileNotFoundError):
+            shutil.copymode(path, tmp_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _encode_source(text: str, buf: bytes | mmap.mmap, source: MarkdownSource) -> bytes:
+    """Encode a source as JSON in the layout of the original value."""
+    if buf[source.start] != ord("["):
+        return json.dumps(text, ensure_ascii=False).encode()
+    lines = text.splitlines(keepends=True)
+    if not lines:
+        return b"[]"
+    original = bytes(buf[source.start : source.end])
+    item_indent = _LEADING_WHITESPACE.match(original, 1)
+    closing_indent = _TRAILING_WHITESPACE.search(original)
+    if item_indent and closing_indent and b"\n" in item_indent[0]:
+        separator = item_indent[0]
+        closing = closing_indent[1]
+    else:
+        # no line break in the original value (e.g. "[]"), use the layout of nbformat (indent=1)
+        line_start = buf.rfind(b"\n", 0, source.start) + 1
+        key_line = bytes(buf[line_start : source.start])
+        key_indent = key_line[: len(key_line) - len(key_line.lstrip(b" "))]
+        separator = b"\n" + key_indent + b" "
+        closing = b"\n" + key_indent
+    items = b",".join(separator + json.dumps(line, ensure_ascii=False).encode() for line in lines)
+    return b"[" + items + closing + b"]"
+
+
+class _Scanner:
+    def __init__(self, buf: bytes | mmap.mmap) -> None:
+        self.buf = buf
+        self.pos = 0
+
+    def scan_notebook(self) -> list[MarkdownSource]:
+        sources: list[MarkdownSource] | None = None
+        nbformat_version: bytes | None = None
+        for key in self._iter_object_keys():
+            if key == "cells":
+                sources = self._scan_cells()
+            elif key == "nbformat":
+                start = self.pos
+                self._skip_value()
+                nbformat_version = bytes(self.buf[start : self.pos])
+            else:
+                self._skip_value()
+        if nbformat_version != b"4" or sources is None:
+            msg = "only nbformat 4 notebooks can be streamed"
+            raise NotebookFormatError(msg)
+        return sources
+
+    def _scan_cells(self) -> list[MarkdownSource]:
+        sources: list[MarkdownSource] = []
+        self._expect(b"[")
+        index = 0
+        self._skip_whitespace()
+        if self.buf[self.pos] == ord("]"):
+            self.pos += 1
+            return sources
+        while True:
+            source = self._scan_cell(index)
+            if source is not None:
+                sources.append(source)
+            index += 1
+            if not self._next_item(b"]"):
+                return sources
+
+    def _scan_cell(self, index: int) -> MarkdownSource | None:
+        cell_type: str | None = None
+        span: tuple[int, int] | None = None
+        for key in self._iter_object_keys():
+            if key == "cell_type":
+                cell_type = self._read_string()
+            elif key == "source":
+                start = self.pos
+                self._skip_value()
+                span = (start, self.pos)
+            else:
+                self._skip_value()
+        if cell_type != "markdown" or span is None:
+            return None
+        source = json.loads(bytes(self.buf[span[0] : span[1]]))
+        text = source if isinstance(source, str) else "".join(source)
+        return MarkdownSource(index=index, start=span[0], end=span[1], text=text)
+
+    def _iter_object_keys(self) -> Iterator[str]:
+        """Yield the keys of an object, leaving ``pos`` at the start of each value."""
+        self._expect(b"{")
+        self._skip_whitespace()
+        if self.buf[self.pos] == ord("}"):
+            self.pos += 1
+            return
+        while True:
+            self._skip_whitespace()
+            key = self._read_string()
+            self._expect(b":")
+            self._skip_whitespace()
+            yield key
+            if not self._next_item(b"}"):
+                return
+
+    def _next_item(self, close: bytes) -> bool:
+        """Consume a comma (True) or the closing bracket (False)."""
+        self._skip_whitespace()
+        c = self.buf[self.pos]
+        self.pos += 1
+        if c == ord(","):
+            return True
+        if c == close[0]:
+            return False
+        msg = f"unexpected character at byte {self.pos - 1}"
+        raise NotebookFormatError(msg)
+
+    def _expect(self, char: bytes) -> None:
+        self._skip_whitespace()
+        if self.buf[self.pos] != char[0]:
+            msg = f"expected {char.decode()!r} at byte {self.pos}"
+            raise NotebookFormatError(msg)
+        self.pos += 1
+
+    def _skip_whitespace(self) -> None:
+        buf = self.buf
+        pos = self.pos
+        while buf[pos] in _WHITESPACE:
+            pos += 1
+        self.pos = pos
+
+    def _string_end(self, start: int) -> int:
+        """Return the offset after the closing quote of the string opened at ``start``."""
+        buf = self.buf
+        pos = start + 1
+        while True:
+            quote = buf.find(b'"', pos)
+            if quote < 0:
+                msg = "unterminated string"
+                raise NotebookFormatError(msg)
+            backslash = quote - 1
+            while buf[backslash] == _BACKSLASH:
+                backslash -= 1
+            if (quote - 1 - backslash) % 2 == 0:
+                return quote + 1
+            pos = quote + 1
+
+    def _read_string(self) -> str:
+        if self.buf[self.pos] != _QUOTE:
+            msg = f"expected a string at byte {self.pos}"
+            raise NotebookFormatError(msg)
+        start = self.pos
+        self.pos = self._string_end(start)
+        return json.loads(bytes(self.buf[start : self.pos]))
+
+    def _skip_value(self) -> None:
+        c = self.buf[self.pos]
+        if c == _QUOTE:
+            self.pos = self._string_end(self.pos)
+        elif c in b"{[":
+            depth = 0
+            pos = self.pos
+            while True:
+                m = _STRUCTURAL.search(self.buf, pos)
+                if m is None:
+                    msg = "unterminated object or array"
+                    raise NotebookFormatError(msg)
+                c = self.buf[m.start()]
+                if c == _QUOTE:
+                    pos = self._string_end(m.start())
+                    continue
+                pos = m.end()
+                depth += 1 if c in b"{[" else -1
+                if depth == 0:
+                    break
+            self.pos = pos
+        else:
+            m = _LITERAL.match(self.buf, self.pos)
+            if m is None or m.end() == self.pos:
+                msg = f"unexpected value at byte {self.pos}"
+                raise NotebookFormatError(msg)
+            self.pos = m.end()
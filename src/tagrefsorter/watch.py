@@ -0,0 +1,207 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import pathlib
+import select
+import struct
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING, Protocol
+
+from .batch import IGNORED_DIRS, NOTEBOOK_SUFFIX, FileResult, new_renumberer, process_notebook
+
+if TYPE_CHECKING:
+    from .parser import TagRenumberer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 0.5
+""" seconds to wait after the last save of a notebook before renumbering it """
+
+POLL_INTERVAL = 1.0
+""" seconds between two scans of the polling watcher """
+
+# flags of inotify(7)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT = struct.Struct("iIII")
+
+Fingerprint = tuple[int, int, int]
+
+
+class Watcher(Protocol):
+    def wait(self, timeout: float | None) -> set[pathlib.Path]:
+        """Block until notebooks are saved or ``timeout`` expires, and return them."""
+        ...
+
+    def close(self) -> None: ...
+
+
+def watch(
+    paths: list[pathlib.Path],
+    renumberer_factory: Callable[[], "TagRenumberer"] = new_renumberer,
+    on_result: Callable[[FileResult], None] | None = None,
+    *,
+    debounce: float = DEFAULT_DEBOUNCE,
+    stream: bool = False,
+    stop: threading.Event | None = None,
+) -> None:
+    """Renumber notebooks shortly after they are saved, until ``stop`` is set.
+
+    The renumberer is built once and stays warm across events. Rapid saves of a notebook
+    are debounced, and the writes made by tagrefsorter itself are ignored.
+
+    Args:
+        paths (list[pathlib.Path]): directories (watched recursively) or notebooks
+        renumberer_factory (Callable[[], TagRenumberer]): builds the renumberer
+        on_result (Callable[[FileResult], None] | None): called with the result of each notebook
+        debounce (float): seconds to wait after the last save before renumbering
+        stream (bool): use the streaming reader (see ``process_notebook``)
+        stop (threading.Event | None): event ending the loop
+
+    """
+    renumberer = renumberer_factory()
+    watcher = make_watcher(paths)
+    own_writes: dict[pathlib.Path, Fingerprint | None] = {}
+    pending: dict[pathlib.Path, float] = {}
+    try:
+        while stop is None or not stop.is_set():
+            timeout = POLL_INTERVAL
+            if pending:
+                timeout = max(0.0, min(min(pending.values()) - time.monotonic(), timeout))
+            for path in watcher.wait(timeout):
+                if path in own_writes and own_writes[path] == _fingerprint(path):
+                    continue
+                pending[path] = time.monotonic() + debounce
+            now = time.monotonic()
+            for path in [path for path, deadline in pending.items() if deadline <= now]:
+                del pending[path]
+                result = process_notebook(path, renumberer=renumberer, stream=stream)
+                if result.changed:
+                    own_writes[path] = _fingerprint(path)
+                if on_result:
+                    on_result(result)
+    finally:
+        watcher.close()
+
+
+def make_watcher(paths: list[pathlib.Path]) -> Watcher:
+    """Return an inotify watcher on Linux, and a polling watcher elsewhere."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except OSError as e:
+            logger.warning("inotify is not available (%s), falling back to polling", e)
+    return PollingWatcher(paths)
+
+
+def _fingerprint(path: pathlib.Path) -> Fingerprint | None:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _iter_dirs(paths: Iterable[pathlib.Path]) -> Iterable[pathlib.Path]:
+    for path in paths:
+        if not path.is_dir():
+            continue
+        for root, dirs, _ in os.walk(path):
+            dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+            yield pathlib.Path(root)
+
+
+class InotifyWatcher:
+    def __init__(self, paths: list[pathlib.Path]) -> None:
+        libc_name = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._dirs: dict[int, pathlib.Path] = {}
+        self._files = {path.resolve() for path in paths if not path.is_dir()}
+        self._roots = [path.resolve() for path in paths if path.is_dir()]
+        for directory in {path.parent for path in self._files}:
+            self._add_watch(directory)
+        for directory in _iter_dirs(paths):
+            self._add_watch(directory)
+
+    def _add_watch(self, directory: pathlib.Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(directory))
+        self._dirs[wd] = directory
+
+    def wait(self, timeout: float | None) -> set[pathlib.Path]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        saved: set[pathlib.Path] = set()
+        data = os.read(self._fd, 64 * 1024)
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = os.fsdecode(data[pos : pos + length].rstrip(b"\0"))
+            pos += length
+            if mask & _IN_Q_OVERFLOW:
+                logger.warning("inotify event queue overflowed, some saves may be missed")
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / name
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO) and name not in IGNORED_DIRS:
+                    for sub in _iter_dirs([path]):
+                        self._add_watch(sub)
+            elif name.endswith(NOTEBOOK_SUFFIX) and mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                resolved = path.resolve()
+                # the parent of a notebook given by path may hold other notebooks
+                if resolved in self._files or any(resolved.is_relative_to(r) for r in self._roots):
+                    saved.add(path)
+        return saved
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    def __init__(self, paths: list[pathlib.Path], interval: float = POLL_INTERVAL) -> None:
+        self._paths = paths
+        self._interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[pathlib.Path, Fingerprint | None]:
+        notebooks = [path for path in self._paths if not path.is_dir()]
+        for directory in _iter_dirs(self._paths):
+            notebooks.extend(
+                entry for entry in directory.iterdir() if entry.name.endswith(NOTEBOOK_SUFFIX)
+            )
+        return {path: _fingerprint(path) for path in notebooks}
+
+    def wait(self, timeout: float | None) -> set[pathlib.Path]:
+        time.sleep(self._interval if timeout is None else min(timeout, self._interval))
+        snapshot = self._scan()
+        saved = {
+            path
+            for path, fingerprint in snapshot.items()
+            if fingerprint is not None and self._snapshot.get(path) != fingerprint
+        }
+        self._snapshot = snapshot
+        return saved
+
+    def close(self) -> None:
+        pass
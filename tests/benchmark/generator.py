@@ -0,0 +1,99 @@
+import random
+from dataclasses import dataclass
+
+import nbformat
+
+
+@dataclass
+class NotebookSpec:
+    cells: int = 100
+    """ markdown cells """
+    equations_per_cell: int = 5
+    """ math blocks in each cell """
+    align_lines: int = 0
+    """ lines of the align environment of every other math block (0: single line only) """
+    tag_ratio: float = 0.5
+    r""" probability that a line already has a ``\tag`` """
+    ref_density: float = 1.0
+    """ references per math block """
+    code_cells: int = 0
+    """ code cells inserted between the markdown cells """
+    link_ratio: float = 0.0
+    """ probability that a paragraph has a link, which the inline scanner leaves to markdown-it """
+    seed: int = 0
+
+    @property
+    def equations(self) -> int:
+        return self.cells * self.equations_per_cell
+
+
+def _line(rng: random.Random, spec: NotebookSpec, i: int) -> tuple[str, str | None]:
+    """Return a line of math and the label of its tag (None if untagged)."""
+    body = f"x_{{{i}}} = \\frac{{a + b}}{{c_{{{i}}}}} + \\sum_{{k=1}}^{{n}} k^{{2}}"
+    if rng.random() < spec.tag_ratio:
+        label = str(rng.randrange(1, 10 * spec.equations + 1))
+        return f"{body} \\tag{{{label}}}", label
+    return body, None
+
+
+def _math_block(rng: random.Random, spec: NotebookSpec, i: int) -> tuple[str, list[str]]:
+    if spec.align_lines and i % 2:
+        lines = [_line(rng, spec, i) for _ in range(spec.align_lines)]
+        body = " \\\\\n".join(line for line, _ in lines)
+        labels = [label for _, label in lines if label]
+        return f"$$\n\\begin{{align}}\n{body}\n\\end{{align}}\n$$", labels
+    line, label = _line(rng, spec, i)
+    return f"$${line}$$", [label] if label else []
+
+
+def generate_sources(spec: NotebookSpec) -> list[str]:
+    """Generate the sources of the markdown cells of a synthetic notebook.
+
+    Args:
+        spec (NotebookSpec): shape of the notebook
+    Returns:
+        list[str]: markdown sources in notebook order
+
+    """
+    rng = random.Random(spec.seed)  # noqa: S311
+    labels: list[str] = []
+    sources: list[str] = []
+    equation = 0
+    for cell in range(spec.cells):
+        paragraphs = [f"## Section {cell}"]
+        for _ in range(spec.equations_per_cell):
+            block, block_labels = _math_block(rng, spec, equation)
+            labels.extend(block_labels)
+            equation += 1
+            refs = int(spec.ref_density) + (rng.random() < spec.ref_density % 1)
+            targets = [f"$({rng.choice(labels)})$" for _ in range(refs) if labels]
+            link = ""
+            if spec.link_ratio and rng.random() < spec.link_ratio:
+                link = f" (see [*the notes*](notes.md#eq-{equation}) &amp; **below**)"
+            paragraphs.append(
+                f"By {', '.join(targets) or 'definition'}{link}, we have\n\n{block}",
+            )
+        sources.append("\n\n".join(paragraphs) + "\n")
+    return sources
+
+
+def generate_notebook(spec: NotebookSpec) -> nbformat.NotebookNode:
+    """Generate a synthetic notebook.
+
+    Args:
+        spec (NotebookSpec): shape of the notebook
+    Returns:
+        nbformat.NotebookNode: notebook with the markdown cells of ``generate_sources``
+        and ``spec.code_cells`` code cells spread between them
+
+    """
+    nb = nbformat.v4.new_notebook()
+    sources = generate_sources(spec)
+    step = max(1, len(sources) // spec.code_cells) if spec.code_cells else 0
+    code = 0
+    for i, source in enumerate(sources):
+        nb.cells.append(nbformat.v4.new_markdown_cell(source))
+        if step and i % step == 0 and code < spec.code_cells:
+            nb.cells.append(nbformat.v4.new_code_cell(f"print({i})"))
+            code += 1
+    return nb
@@ -0,0 +1,83 @@
+import argparse
+import pathlib
+import tempfile
+from dataclasses import dataclass, fields
+
+import nbformat
+
+from tagrefsorter.batch import ENGINES, MARKDOWN_PROFILES, new_renumberer, process_notebook
+from tagrefsorter.parser import TagRenumberer
+
+from .generator import NotebookSpec, generate_notebook
+
+
+@dataclass
+class PhaseTimes:
+    """Seconds spent in each phase of renumbering a notebook."""
+
+    read: float = 0.0
+    """ reading the notebook with nbformat """
+    markdown: float = 0.0
+    """ markdown-it parse of the cells """
+    latex: float = 0.0
+    """ LaTeX parse of the math blocks """
+    rewrite: float = 0.0
+    """ finding, locating and applying the tag rewrites """
+    refs: float = 0.0
+    """ splicing the references """
+    write: float = 0.0
+    """ writing the notebook """
+
+    @property
+    def total(self) -> float:
+        return sum(getattr(self, f.name) for f in fields(self))
+
+
+def time_phases(path: pathlib.Path, renumberer: TagRenumberer | None = None) -> PhaseTimes:
+    """Renumber a notebook in place with ``process_notebook`` and time each phase.
+
+    Args:
+        path (pathlib.Path): notebook to renumber in place
+        renumberer (TagRenumberer | None): renumberer to use
+    Returns:
+        PhaseTimes: seconds spent in each phase
+
+    """
+    result = process_notebook(path, renumberer=renumberer)
+    if result.stats is None:
+        raise RuntimeError(result.error)
+    return PhaseTimes(
+        **{f.name: getattr(result.stats, f"{f.name}_time") for f in fields(PhaseTimes)},
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Print the phase times of a synthetic notebook."""
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.benchmark.phases",
+        description="Time the phases of renumbering a synthetic notebook",
+    )
+    defaults = NotebookSpec()
+    for f in fields(NotebookSpec):
+        value = getattr(defaults, f.name)
+        parser.add_argument(f"--{f.name.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument("--engine", choices=ENGINES, default="pylatexenc")
+    parser.add_argument("--markdown-profile", choices=MARKDOWN_PROFILES, default="full")
+    args = parser.parse_args(argv)
+    spec = NotebookSpec(**{f.name: getattr(args, f.name) for f in fields(NotebookSpec)})
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp, "synthetic.ipynb")
+        nbformat.write(generate_notebook(spec), path)
+        renumberer = new_renumberer(engine=args.engine, markdown_profile=args.markdown_profile)
+        times = time_phases(path, renumberer)
+    print(  # noqa: T201
+        f"{spec.equations} equations in {spec.cells} cells"
+        f" ({args.engine}, {args.markdown_profile} markdown)",
+    )
+    for f in fields(PhaseTimes):
+        print(f"  {f.name:<8} {getattr(times, f.name):8.3f}s")  # noqa: T201
+    print(f"  {'total':<8} {times.total:8.3f}s")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
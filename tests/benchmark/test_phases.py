@@ -0,0 +1,55 @@
+import pathlib
+from dataclasses import fields
+
+import nbformat
+import pytest
+
+from tagrefsorter.batch import ENGINES, new_renumberer, renumber_sources
+
+from .generator import NotebookSpec, generate_notebook, generate_sources
+from .phases import PhaseTimes, time_phases
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        NotebookSpec(cells=20, equations_per_cell=3, seed=1),
+        NotebookSpec(cells=5, equations_per_cell=4, align_lines=3, tag_ratio=1.0),
+        NotebookSpec(cells=5, equations_per_cell=2, tag_ratio=0.0, ref_density=0.0),
+        NotebookSpec(cells=10, equations_per_cell=2, ref_density=2.5, code_cells=3),
+        NotebookSpec(cells=10, equations_per_cell=2, link_ratio=0.5),
+    ],
+)
+def test_generate_notebook(spec: NotebookSpec) -> None:
+    nb = generate_notebook(spec)
+    sources = [cell.source for cell in nb.cells if cell.cell_type == "markdown"]
+    assert sources == generate_sources(spec)
+    assert len(sources) == spec.cells
+    assert sum(cell.cell_type == "code" for cell in nb.cells) == spec.code_cells
+    text = "".join(sources)
+    assert text.count("$$") == 2 * spec.equations
+    assert ("\\tag{" in text) == (spec.tag_ratio > 0)
+    assert ("$(" in text) == (spec.ref_density > 0)
+    assert ("\\begin{align}" in text) == bool(spec.align_lines)
+    assert ("](notes.md" in text) == (spec.link_ratio > 0)
+    # every line of math ends up with exactly one tag
+    renumbered = "".join(renumber_sources(sources))
+    lines = spec.equations
+    if spec.align_lines:
+        lines += (spec.align_lines - 1) * (spec.equations // 2)
+    assert renumbered.count("\\tag{") == lines
+    assert f"\\tag{{{lines}}}" in renumbered
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_time_phases(engine: str, tmp_path: pathlib.Path) -> None:
+    spec = NotebookSpec(cells=20, equations_per_cell=5, align_lines=3)
+    path = tmp_path / "nb.ipynb"
+    nbformat.write(generate_notebook(spec), path)
+    renumberer = new_renumberer(engine=engine)
+    times = time_phases(path, renumberer)
+    assert all(getattr(times, f.name) > 0 for f in fields(PhaseTimes))
+    assert times.total == pytest.approx(sum(getattr(times, f.name) for f in fields(PhaseTimes)))
+    expected = renumber_sources(generate_sources(spec))
+    nb = nbformat.read(path, as_version=4)
+    assert [cell.source for cell in nb.cells] == expected
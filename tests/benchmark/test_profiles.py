@@ -0,0 +1,32 @@
+import pytest
+
+from tagrefsorter.batch import MARKDOWN_PROFILES, new_renumberer, renumber_sources
+
+from .generator import NotebookSpec, generate_sources
+
+RUNS = 3
+
+
+def _markdown_time(sources: list[str], profile: str) -> float:
+    times = []
+    for _ in range(RUNS):
+        renumberer = new_renumberer(engine="fast", markdown_profile=profile)
+        renumber_sources(sources, renumberer)
+        times.append(renumberer.stats.markdown_time)
+    return min(times)
+
+
+@pytest.mark.parametrize("profile", MARKDOWN_PROFILES)
+def test_same_output(profile: str) -> None:
+    sources = generate_sources(NotebookSpec(cells=20, align_lines=3, link_ratio=0.5))
+    renumberer = new_renumberer(markdown_profile=profile)
+    assert renumber_sources(sources, renumberer) == renumber_sources(sources)
+
+
+@pytest.mark.slow
+def test_minimal_profile_is_faster() -> None:
+    # links send the paragraphs to the inline rules of markdown-it, where the profiles differ
+    sources = generate_sources(NotebookSpec(cells=200, align_lines=3, link_ratio=1.0))
+    full = _markdown_time(sources, "full")
+    minimal = _markdown_time(sources, "minimal")
+    assert minimal < full, f"markdown: {full * 1e3:.0f}ms (full) -> {minimal * 1e3:.0f}ms (minimal)"
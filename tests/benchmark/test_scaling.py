@@ -0,0 +1,92 @@
+import time
+from collections.abc import Callable
+
+import pytest
+
+from tagrefsorter.batch import ENGINES, new_renumberer, renumber_sources
+
+from .generator import NotebookSpec, generate_sources
+
+GROWTH_LIMIT = 1.5
+""" largest allowed ratio of the time per equation between the large and the small notebook """
+
+RUNS = 3
+
+
+def _time_per_equation(spec: NotebookSpec, engine: str) -> float:
+    sources = generate_sources(spec)
+    renumberer = new_renumberer(engine=engine)
+    times = []
+    for _ in range(RUNS if spec.equations <= 10_000 else 1):
+        start = time.perf_counter()
+        renumber_sources(sources, renumberer)
+        times.append(time.perf_counter() - start)
+    return min(times) / spec.equations
+
+
+def _check_linear(
+    small: NotebookSpec,
+    large: NotebookSpec,
+    engine: str,
+    record_property: Callable[[str, object], None],
+) -> None:
+    """Assert that the time per equation grows less than ``GROWTH_LIMIT`` times."""
+    small_time = _time_per_equation(small, engine)
+    large_time = _time_per_equation(large, engine)
+    ratio = large_time / small_time
+    record_property("growth_ratio", round(ratio, 3))
+    record_property("growth_limit", GROWTH_LIMIT)
+    assert ratio < GROWTH_LIMIT, (
+        f"time per equation grew {ratio:.2f}x from {small.equations} to {large.equations} "
+        f"equations ({small_time * 1e6:.0f}us -> {large_time * 1e6:.0f}us)"
+    )
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize(
+    ("small", "large"),
+    [
+        # many cells
+        (
+            NotebookSpec(cells=100, equations_per_cell=10, align_lines=3),
+            NotebookSpec(cells=1000, equations_per_cell=10, align_lines=3),
+        ),
+        # one long cell, where searching the text or concatenating results would be quadratic
+        (
+            NotebookSpec(cells=1, equations_per_cell=1000, align_lines=3),
+            NotebookSpec(cells=1, equations_per_cell=10_000, align_lines=3),
+        ),
+    ],
+    ids=["cells", "single-cell"],
+)
+def test_scaling(
+    small: NotebookSpec,
+    large: NotebookSpec,
+    record_property: Callable[[str, object], None],
+) -> None:
+    _check_linear(small, large, "fast", record_property)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(
+    ("small", "large"),
+    [
+        (
+            NotebookSpec(cells=100, equations_per_cell=10, align_lines=3),
+            NotebookSpec(cells=10_000, equations_per_cell=10, align_lines=3),
+        ),
+        (
+            NotebookSpec(cells=1, equations_per_cell=1000, align_lines=3),
+            NotebookSpec(cells=1, equations_per_cell=100_000, align_lines=3),
+        ),
+    ],
+    ids=["cells", "single-cell"],
+)
+def test_scaling_100k(
+    small: NotebookSpec,
+    large: NotebookSpec,
+    engine: str,
+    record_property: Callable[[str, object], None],
+) -> None:
+    _check_linear(small, large, engine, record_property)
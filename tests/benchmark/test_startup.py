@@ -0,0 +1,95 @@
+import os
+import pathlib
+import subprocess
+import sys
+import time
+
+import pytest
+
+import tagrefsorter
+
+HEAVY_MODULES = ["nbformat", "markdown_it", "mdit_py_plugins", "pylatexenc", "tagrefsorter.parser"]
+""" modules that must not be imported until a notebook is renumbered """
+
+STARTUP_BUDGET = 0.3
+""" seconds that ``--version`` may take on top of a bare interpreter """
+
+RUNS = 5
+
+# runs the CLI, then prints the heavy modules that were imported on the last line of stderr
+PROBE = f"""
+import atexit, sys
+atexit.register(
+    lambda: print(" ".join(m for m in {HEAVY_MODULES!r} if m in sys.modules), file=sys.stderr)
+)
+from tagrefsorter.cli import main
+main()
+"""
+
+# imports the CLI module only, then prints the heavy modules that were imported
+IMPORT_PROBE = f"""
+import sys
+import tagrefsorter.cli
+print(*(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+"""
+
+
+def _env() -> dict[str, str]:
+    src = str(pathlib.Path(tagrefsorter.__file__).parents[1])
+    return {**os.environ, "PYTHONPATH": os.pathsep.join([src, os.environ.get("PYTHONPATH", "")])}
+
+
+def _run(*args: str, cwd: pathlib.Path | None = None) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(  # noqa: S603
+        [sys.executable, "-c", PROBE, *args],
+        capture_output=True,
+        text=True,
+        env=_env(),
+        cwd=cwd,
+        check=False,
+    )
+
+
+def _best_time(*args: str) -> float:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], capture_output=True, env=_env(), check=False)  # noqa: S603
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [["--version"], ["--help"], ["missing.ipynb"], ["notebook.txt"], ["nb.ipynb", "--output", "x"]],
+)
+def test_no_heavy_imports(args: list[str], tmp_path: pathlib.Path) -> None:
+    (tmp_path / "notebook.txt").write_text("")
+    result = _run(*args, cwd=tmp_path)
+    assert result.stderr.splitlines()[-1] == ""
+
+
+def test_heavy_imports_when_renumbering(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "nb.ipynb"
+    path.write_text('{"cells": [], "metadata": {}, "nbformat": 4, "nbformat_minor": 5}')
+    result = _run(str(path))
+    assert result.returncode == 0
+    assert "tagrefsorter.parser" in result.stderr.splitlines()[-1]
+
+
+def test_import_cli_is_light() -> None:
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", IMPORT_PROBE],
+        capture_output=True,
+        text=True,
+        env=_env(),
+        check=True,
+    )
+    assert result.stdout.split() == []
+
+
+@pytest.mark.slow
+def test_startup_budget() -> None:
+    version = "import sys; sys.argv[1:] = ['--version']; from tagrefsorter.cli import main; main()"
+    overhead = _best_time("-c", version) - _best_time("-c", "pass")
+    assert overhead < STARTUP_BUDGET, f"--version took {overhead:.3f}s over a bare interpreter"
@@ -1,16 +1,11 @@
+import pathlib
+
+import nbformat
 import pytest
-from markdown_it import MarkdownIt
-from mdit_py_plugins.texmath import texmath_plugin
 from pylatexenc.macrospec import LatexContextDb, MacroSpec
 from pylatexenc.macrospec._argparsers import MacroStandardArgsParser
 
-
-@pytest.fixture(scope="session")
-def md_parser() -> MarkdownIt:
-    """MarkdownIt parser with texmath plugin enabled."""
-    md = MarkdownIt().use(texmath_plugin)
-    md.block.ruler.disable("math_block_eqno")
-    return md
+from tests.constants import NotebookWriter
 
 
 @pytest.fixture(scope="session")
@@ -20,3 +15,43 @@ def latex_context() -> LatexContextDb:
     latex_context = LatexContextDb()
     latex_context.add_context_category(None, macros=[tag_spec], prepend=True)
     return latex_context
+
+
+@pytest.fixture
+def write_notebook(tmp_path: pathlib.Path) -> NotebookWriter:
+    """Factory fixture that writes a notebook under tmp_path.
+
+    Strings are written as markdown cells, and notebook nodes (e.g. code cells) as they are.
+
+    :return: Function that takes a path relative to tmp_path and cells and returns the path
+    :rtype: NotebookWriter
+    """
+
+    def _writer(name: str | pathlib.Path, cells: list[str | nbformat.NotebookNode]) -> pathlib.Path:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        nb = nbformat.v4.new_notebook()
+        nb.cells = [
+            nbformat.v4.new_markdown_cell(cell) if isinstance(cell, str) else cell for cell in cells
+        ]
+        nbformat.write(nb, path)
+        return path
+
+    return _writer
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption("--runslow", action="store_true", help="run the tests marked as slow")
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line("markers", "slow: long running benchmark, run with --runslow")
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    if config.getoption("--runslow"):
+        return
+    skip_slow = pytest.mark.skip(reason="needs --runslow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
@@ -1,4 +1,11 @@
+import pathlib
 import re
+from collections.abc import Callable
+
+import nbformat
 
 RE_BLOCK = re.compile(r"^\${2}([^$]*?)\${2}$", re.MULTILINE)
 RE_INLINE = re.compile(r"^\$(\S[^$]*?[^\s\\]{1}?)\$$")
+
+NotebookWriter = Callable[[str | pathlib.Path, list[str | nbformat.NotebookNode]], pathlib.Path]
+""" type of the ``write_notebook`` fixture """
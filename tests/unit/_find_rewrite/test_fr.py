@@ -2,7 +2,7 @@ from dataclasses import dataclass, field
 
 from pylatexenc.latexwalker import LatexNode
 
-from tagrefsorter.parser import Insertion, Replacement, TagRenumberer
+from tagrefsorter.parser import Insertion, Replacement, TagParser
 
 
 @dataclass
@@ -72,9 +72,9 @@ def assert_replacement(content: str, act: Replacement, spec: ReplacementSpecData
 
 
 def test_fria(fria_case: list[AlignerCellResultSpec]) -> None:
-    tag_renumberer = TagRenumberer()
+    tag_parser = TagParser()
     for case in fria_case:
-        rewrites = tag_renumberer._find_rewrites_in_aligner(case.input)
+        rewrites = tag_parser._find_rewrites_in_aligner(case.input)
         for rewrite, spec in zip(rewrites, case.specs, strict=True):
             if isinstance(spec, AlignerInsertionSpecData):
                 assert isinstance(rewrite, Insertion)
@@ -85,9 +85,9 @@ def test_fria(fria_case: list[AlignerCellResultSpec]) -> None:
 
 
 def test_frisl(frisl_case: list[SingleLineCellResultSpec]) -> None:
-    tag_renumberer = TagRenumberer()
+    tag_parser = TagParser()
     for case in frisl_case:
-        rewrites = tag_renumberer._find_rewrite_in_single_line(case.input)
+        rewrites = tag_parser._find_rewrite_in_single_line(case.input)
         for rewrite, spec in zip(rewrites, case.specs, strict=True):
             if isinstance(spec, SingleLineInsertionSpecData):
                 assert isinstance(rewrite, Insertion)
@@ -0,0 +1,122 @@
+import random
+
+import pytest
+from markdown_it.token import Token
+
+from tagrefsorter.parser import (
+    Reference,
+    TagRenumberer,
+    _scan_inline_math,
+    _SourceLocator,
+    block_parser,
+)
+
+ATOMS = [
+    "$(1)$", "$(a)$", "$( b )$", "$(1) $", "$ (1)$", "$x$", "$", "$$", "5$", "$(3)$7",
+    "\\$", "\\", "\\(", "`", "``", "`$(1)$`", "`` a ` $(2)$ ``", "x", " ", "\t", "\n", "\n\n",
+    "*", "_", "&#36;", "[", "](u)", "[l]", "<", "<b>", "> ", "- ", "1. ", "    ", "```\n",
+    "# ", "$(1", ")$", "![", "![img $(9)$](u)", "![a ![b $(1)$](w) $(2)$](x)",
+]  # fmt: skip
+
+
+def _random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(ATOMS) for _ in range(rng.randrange(1, 30)))
+
+
+def _inline_parse(token: Token) -> list[Token]:
+    """Return the tokens of the inline rules of markdown-it for an inline token."""
+    md = block_parser()
+    return md.inline.parse(token.content, md, {}, [])
+
+
+def _maths(tokens: list[Token], base: int = 0) -> list[tuple[int, str]]:
+    """Return the inline math of an inline parse, recursing into the alt text of images."""
+    maths: list[tuple[int, str]] = []
+    for token in tokens:
+        if token.type == "math_inline":
+            maths.append((base + token.meta["offset"], token.content))
+        elif token.children:
+            maths += _maths(token.children, base + token.meta["offset"])
+    return maths
+
+
+def _refs_with_inline_parser(text: str) -> list[Reference]:
+    """Find the references like before the scanner, with the inline rules of markdown-it."""
+    tokens = block_parser().parse(text)
+    locator = _SourceLocator(text)
+    refs: list[Reference] = []
+    for token in tokens:
+        if token.type != "inline":
+            continue
+        for offset, content in _maths(_inline_parse(token)):
+            ref = locator.reference(content, offset, token)
+            if ref is not None:
+                refs.append(ref)
+    return refs
+
+
+@pytest.mark.parametrize(
+    ("src", "expected"),
+    [
+        ("$(1)$ and $(2)$", [(0, "(1)"), (10, "(2)")]),
+        ("\\$(1)$ $(2)$", [(7, "(2)")]),
+        ("`$(1)$` $(2)$", [(8, "(2)")]),
+        ("`` ` $(1)$ `` ` $(2)$", [(16, "(2)")]),
+        ("5$(1)$ $(2)$7", []),
+        ("$$ $(1)$", [(3, "(1)")]),
+        ("$a$(1)$", []),
+        ("see [$(1)$](u)", None),
+        ("<b>$(1)$</b>", None),
+    ],
+)
+def test_scan_inline_math(src: str, expected: list[tuple[int, str]] | None) -> None:
+    assert _scan_inline_math(src) == expected
+
+
+def test_scan_inline_math_matches_inline_parser() -> None:
+    rng = random.Random(0)  # noqa: S311
+    for _ in range(2000):
+        text = _random_text(rng)
+        for token in block_parser().parse(text):
+            if token.type != "inline":
+                continue
+            maths = _scan_inline_math(token.content)
+            if maths is not None:
+                expected = [
+                    (child.meta["offset"], child.content)
+                    for child in _inline_parse(token)
+                    if child.type == "math_inline"
+                ]
+                assert maths == expected, text
+
+
+def test_refs_match_inline_parser() -> None:
+    rng = random.Random(1)  # noqa: S311
+    tag_renumberer = TagRenumberer()
+    for _ in range(2000):
+        text = _random_text(rng)
+        assert tag_renumberer.analyze_cell(text).refs == _refs_with_inline_parser(text), text
+
+
+def test_inline_parser_runs_only_for_links(monkeypatch: pytest.MonkeyPatch) -> None:
+    tag_renumberer = TagRenumberer()
+    parse = tag_renumberer.parser.md.inline.parse
+    calls: list[str] = []
+
+    def _parse(src: str, *args: object) -> object:
+        calls.append(src)
+        return parse(src, *args)
+
+    monkeypatch.setattr(tag_renumberer.parser.md.inline, "parse", _parse)
+    text = "By $(1)$, `$(2)$` and \\$(3)$.\n\n> [see $(4)$](u)\n\n$(5)$"
+    refs = tag_renumberer.analyze_cell(text).refs
+    assert [ref.label for ref in refs] == ["1", "4", "5"]
+    assert calls == ["[see $(4)$](u)"]
+
+
+def test_refs_in_image_alt_text() -> None:
+    text = "![img $(9)$](u) and $(9)$ ![a ![b $(9)$](w) $(9)$](x)"
+    refs = TagRenumberer().analyze_cell(text).refs
+    assert [ref.start for ref in refs] == [6, 20, 34, 44]
+    for ref in refs:
+        assert text[ref.start : ref.start + ref.length] == "$(9)$"
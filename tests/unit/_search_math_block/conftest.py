@@ -1,11 +1,10 @@
 from collections.abc import Callable
 
 import pytest
-from markdown_it import MarkdownIt
 from nbformat import NotebookNode
 from pylatexenc.latexwalker import LatexNode
 
-from tagrefsorter.parser import MathBlock
+from tagrefsorter.parser import MathBlock, block_parser
 
 from .test_smb import ExpectedCellResult
 
@@ -19,13 +18,12 @@ EXPECTED_RESULTS_STR = [
 
 @pytest.fixture(scope="session")
 def smb_case(
-    md_parser: MarkdownIt,
     load_markdown_cells: Callable[[str], list[NotebookNode]],
     get_layer0_nodes: Callable[[str], list[LatexNode]],
 ) -> list[ExpectedCellResult]:
-    """Fixture that provides test cases for the _search_math_block function.
+    """Fixture that provides test cases for parsing the math blocks of a cell.
 
-    It parses the source of each cell in the smb_cells fixture using the md_parser
+    It parses the source of each cell in the smb_cells fixture using the block_parser
     and pairs it with the expected results.
 
     :return: List of ExpectedCellResult objects, each containing
@@ -36,7 +34,7 @@ def smb_case(
     expected_results: list[ExpectedCellResult] = []
     for smb_cell, exp_strs in zip(smb_cells, EXPECTED_RESULTS_STR, strict=True):
         expected_cell_result = ExpectedCellResult()
-        expected_cell_result.input = md_parser.parse(smb_cell.source)
+        expected_cell_result.input = block_parser().parse(smb_cell.source)
         for exp_str in exp_strs:
             layer0_nodes = get_layer0_nodes(exp_str)
             expected_cell_result.output.append(
@@ -75,9 +75,14 @@ def compare_latex_nodes(actual: LatexNode, expected: LatexNode) -> None:
 
 
 def test_smb(smb_case: list[ExpectedCellResult]) -> None:
-    tag_renumberer = parser.TagRenumberer()
+    tag_parser = parser.TagParser()
     for expected_cell_result in smb_case:
-        math_blocks = tag_renumberer._search_math_block(expected_cell_result.input)
+        math_blocks = [
+            math_block
+            for token in expected_cell_result.input
+            if token.type == "math_block"
+            and (math_block := tag_parser._parse_math_block(token)) is not None
+        ]
         for math_block, exp in zip(math_blocks, expected_cell_result.output, strict=True):
             assert math_block.content == exp.content
             for math_node, exp_node in zip(math_block.layer0_nodes, exp.layer0_nodes, strict=True):
@@ -3,9 +3,23 @@ from markdown_it.token import Token
 from tagrefsorter import parser
 
 
+def _math_inlines(tag_parser: parser.TagParser, tokens: list[Token]) -> list[str]:
+    """Return the inline math of the inline tokens, like ``TagParser._find_refs``."""
+    results: list[str] = []
+    for token in tokens:
+        if token.type != "inline":
+            continue
+        maths = parser._scan_inline_math(token.content)
+        if maths is None:
+            md = tag_parser.md
+            maths = parser._inline_maths(md.inline.parse(token.content, md, {}, []))
+        results += [f"${content}$" for _, content in maths]
+    return results
+
+
 def test_smi(smi_case: list[tuple[list[Token], list[str]]]) -> None:
-    tag_renumberer = parser.TagRenumberer()
+    tag_parser = parser.TagParser()
     for source, expected in smi_case:
-        math_inlines = tag_renumberer._search_math_inline(source)
+        math_inlines = _math_inlines(tag_parser, source)
         for math_inline, exp in zip(math_inlines, expected, strict=True):
             assert math_inline == exp
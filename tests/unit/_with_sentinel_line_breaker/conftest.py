@@ -3,10 +3,10 @@ from collections.abc import Callable
 import pytest
 from nbformat import NotebookNode
 
-from .test_eslbi import ExpectedCellResult, LatexNode
+from .test_wslb import ExpectedCellResult, LatexNode
 
-_ENSURE_SENTINEL_LINE_BREAKER_INPLACE_FIXTURE_DIR = (
-    "tests/unit/_ensure_sentinel_line_breaker_inplace/eslbi_fixtures.ipynb"
+_WITH_SENTINEL_LINE_BREAKER_FIXTURE_DIR = (
+    "tests/unit/_with_sentinel_line_breaker/wslb_fixtures.ipynb"
 )
 
 # Whether to add a sentinel line breaker
@@ -17,11 +17,11 @@ EXPECTED_RESULTS = [
 
 
 @pytest.fixture(scope="session")
-def eslbi_case(
+def wslb_case(
     load_markdown_cells: Callable[[str], list[NotebookNode]],
     get_aligner_contents: Callable[[str], list[LatexNode]],
 ) -> list[ExpectedCellResult]:
-    """Fixture that provides test cases for the _ensure_sentinel_line_breaker_inplace function.
+    """Fixture that provides test cases for the _with_sentinel_line_breaker method.
 
     It pairs input LatexNode lists with expected boolean outputs.
 
@@ -29,10 +29,10 @@ def eslbi_case(
     a list of LatexNode objects and a boolean output
     :rtype: list[ExpectedCellResult]
     """
-    eslbi_cells = load_markdown_cells(_ENSURE_SENTINEL_LINE_BREAKER_INPLACE_FIXTURE_DIR)
+    wslb_cells = load_markdown_cells(_WITH_SENTINEL_LINE_BREAKER_FIXTURE_DIR)
     expected_results: list[ExpectedCellResult] = []
-    for eslbi_case, exp in zip(eslbi_cells, EXPECTED_RESULTS, strict=True):
-        aligner_contents: list[LatexNode] = get_aligner_contents(eslbi_case.source)
+    for wslb_case, exp in zip(wslb_cells, EXPECTED_RESULTS, strict=True):
+        aligner_contents: list[LatexNode] = get_aligner_contents(wslb_case.source)
         expected_results.append(
             ExpectedCellResult(
                 input=aligner_contents,
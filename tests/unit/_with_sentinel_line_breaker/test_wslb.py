@@ -0,0 +1,29 @@
+from copy import deepcopy
+from dataclasses import dataclass, field
+
+from pylatexenc.latexwalker import LatexMacroNode, LatexNode
+
+from tagrefsorter import parser
+
+
+@dataclass
+class ExpectedCellResult:
+    input: list[LatexNode] = field(default_factory=list)
+    should_add: bool = False
+
+
+def test_wslb(wslb_case: list[ExpectedCellResult]) -> None:
+    tag_parser = parser.TagParser()
+    for case in wslb_case:
+        input_copy = deepcopy(case.input)
+        nodes = tag_parser._with_sentinel_line_breaker(nodes=input_copy)
+        # the nodes of the parse tree are not modified
+        assert len(input_copy) == len(case.input)
+        assert case.should_add == (len(nodes) == len(case.input) + 1)
+        if case.should_add:
+            assert nodes[:-1] == input_copy
+            assert isinstance(nodes[-1], LatexMacroNode)
+            assert nodes[-1].macroname == "\\"
+            assert nodes[-1].pos == input_copy[-1].pos + input_copy[-1].len
+        else:
+            assert nodes is input_copy
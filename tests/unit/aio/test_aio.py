@@ -0,0 +1,124 @@
+import asyncio
+import threading
+
+import nbformat
+import pytest
+
+from tagrefsorter import aio
+from tagrefsorter.aio import (
+    AsyncRenumberer,
+    RenumberResult,
+    renumber_bytes,
+    renumber_notebook_async,
+)
+
+
+def _notebook_bytes() -> bytes:
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [
+        nbformat.v4.new_markdown_cell("$$\na = b \\tag{2}\n$$"),
+        nbformat.v4.new_code_cell("x = 1"),
+        nbformat.v4.new_markdown_cell("see $(2)$"),
+        nbformat.v4.new_markdown_cell("no math"),
+    ]
+    return nbformat.writes(nb).encode("utf-8")
+
+
+def test_renumber_bytes() -> None:
+    result = renumber_bytes(_notebook_bytes())
+    assert result.changed
+    assert result.changed_cells == [0, 2]
+    assert result.stats.replacements == 1
+    assert result.stats.refs_rewritten == 1
+    nb = nbformat.reads(result.data.decode("utf-8"), as_version=4)
+    assert [cell.source for cell in nb.cells] == [
+        "$$\na = b \\tag{1}\n$$",
+        "x = 1",
+        "see $(1)$",
+        "no math",
+    ]
+    # renumbering is idempotent, the bytes are returned as they are
+    again = renumber_bytes(result.data)
+    assert not again.changed
+    assert again.data is result.data
+
+
+def test_renumber_bytes_markdown() -> None:
+    result = renumber_bytes(b"$$\nx \\tag{5}\n$$\n\nsee $(5)$\n")
+    assert result.changed_cells == [0]
+    assert result.data == b"$$\nx \\tag{1}\n$$\n\nsee $(1)$\n"
+    # a JSON object given as markdown is renumbered as text
+    assert not renumber_bytes(b'{"a": 1}', markdown=True).changed
+
+
+def test_renumber_bytes_invalid() -> None:
+    with pytest.raises(nbformat.reader.NotJSONError):
+        renumber_bytes(b"{", markdown=False)
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_async_renumberer(processes: bool) -> None:  # noqa: FBT001
+    data = _notebook_bytes()
+
+    async def run() -> list[RenumberResult]:
+        async with AsyncRenumberer(2, processes=processes) as renumberer:
+            return await asyncio.gather(*(renumberer.renumber(data) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert all(result.data == renumber_bytes(data).data for result in results)
+    assert all(result.changed_cells == [0, 2] for result in results)
+
+
+def test_default_renumberer() -> None:
+    # the shared renumberer is bounded, and can be used from successive event loops
+    for _ in range(2):
+        result = asyncio.run(renumber_notebook_async(b"$$x \\tag{5}$$\n"))
+        assert result.data == b"$$x \\tag{1}$$\n"
+    default = aio._default_renumberer()
+    assert default.max_concurrency == aio.DEFAULT_MAX_CONCURRENCY
+
+
+def test_concurrency_and_cancellation(monkeypatch: pytest.MonkeyPatch) -> None:
+    lock = threading.Lock()
+    running: list[bytes] = []
+    peak = 0
+    release = threading.Event()
+
+    def fake_renumber_bytes(data: bytes, *_: object, **__: object) -> RenumberResult:
+        nonlocal peak
+        with lock:
+            running.append(data)
+            peak = max(peak, len(running))
+        release.wait(timeout=10)
+        with lock:
+            running.remove(data)
+        return RenumberResult(data)
+
+    monkeypatch.setattr(aio, "renumber_bytes", fake_renumber_bytes)
+
+    async def run() -> list[bytes]:
+        async with AsyncRenumberer(2, processes=False) as renumberer:
+            tasks = [
+                asyncio.create_task(renumber_notebook_async(bytes([i]), renumberer))
+                for i in range(5)
+            ]
+            while len(running) < 2:  # noqa: ASYNC110
+                await asyncio.sleep(0.01)
+            # a running and a waiting document are cancelled
+            tasks[0].cancel()
+            tasks[4].cancel()
+            await asyncio.sleep(0.05)
+            assert len(running) == 2
+            release.set()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert isinstance(results[0], asyncio.CancelledError)
+        assert isinstance(results[4], asyncio.CancelledError)
+        return [r.data for r in results if isinstance(r, RenumberResult)]
+
+    assert asyncio.run(run()) == [b"\x01", b"\x02", b"\x03"]
+    assert peak == 2
+
+
+def test_max_concurrency() -> None:
+    with pytest.raises(ValueError, match="max_concurrency"):
+        AsyncRenumberer(0)
@@ -0,0 +1,222 @@
+import dataclasses
+import io
+import json
+import pathlib
+
+import nbformat
+import pytest
+
+from tagrefsorter.batch import (
+    PARALLEL_MIN_CELLS,
+    NotebookSources,
+    WorkerPool,
+    check_notebook,
+    collect_notebooks,
+    dump_sources,
+    process_notebook,
+    process_stdio,
+    renumber_sources,
+    run_batch,
+)
+from tagrefsorter.parser import TagRenumberer
+from tagrefsorter.stats import RenumberStats
+from tests.constants import NotebookWriter
+
+
+def test_collect_notebooks(write_notebook: NotebookWriter, tmp_path: pathlib.Path) -> None:
+    a = write_notebook("a.ipynb", [])
+    b = write_notebook("sub/b.ipynb", [])
+    write_notebook("sub/.ipynb_checkpoints/b-checkpoint.ipynb", [])
+    (tmp_path / "note.md").write_text("")
+    (tmp_path / "sub" / "skipped.md").write_text("")
+    (tmp_path / "note.txt").write_text("")
+    nb_paths, errors = collect_notebooks(
+        [
+            str(a),
+            str(tmp_path / "sub"),
+            str(tmp_path / "*.ipynb"),
+            str(tmp_path / "note.md"),
+            str(tmp_path / "note.txt"),
+        ],
+    )
+    # directories are searched for notebooks only
+    assert nb_paths == [a, b, tmp_path / "note.md"]
+    assert [e.path for e in errors] == [tmp_path / "note.txt"]
+
+
+def test_collect_notebooks_missing(tmp_path: pathlib.Path) -> None:
+    nb_paths, errors = collect_notebooks(
+        [str(tmp_path / "missing.ipynb"), str(tmp_path / "*.ipynb")],
+    )
+    assert nb_paths == []
+    assert len(errors) == 2
+    assert not any(e.ok for e in errors)
+
+
+def test_run_batch(write_notebook: NotebookWriter, tmp_path: pathlib.Path) -> None:
+    paths = [write_notebook(f"nb{i}.ipynb", [r"$$x\tag{9}$$", "$(9)$"]) for i in range(3)]
+    broken = tmp_path / "broken.ipynb"
+    broken.write_text("{")
+    results = run_batch([paths[0], broken, *paths[1:]], jobs=2)
+    assert [r.ok for r in results] == [True, False, True, True]
+    for path in paths:
+        cells = nbformat.read(path, as_version=4).cells
+        assert [c.source for c in cells] == [r"$$x\tag{1}$$", "$(1)$"]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_process_notebook_stats(write_notebook: NotebookWriter, *, stream: bool) -> None:
+    path = write_notebook(
+        "nb.ipynb",
+        [
+            "text",
+            "$$\n\\begin{align}\na \\tag{x} \\\\\nb \\tag{y} \\\\\nc\n\\end{align}\n$$",
+            "$$d \\tag{x}$$\n\n$(x)$ $(y)$ $(z)$",
+        ],
+    )
+    result = process_notebook(path, stream=stream)
+    assert result.stats is not None
+    stats = dataclasses.asdict(result.stats)
+    assert {name: value for name, value in stats.items() if isinstance(value, int)} == {
+        "markdown_cells": 3,
+        "skipped_cells": 1,
+        "cached_cells": 0,
+        "math_blocks": 2,
+        "aligner_blocks": 1,
+        "insertions": 1,
+        "replacements": 3,
+        "update_map_size": 2,
+        "refs_rewritten": 2,
+    }
+    times = [value for value in stats.values() if isinstance(value, float)]
+    assert len(times) == 6
+    assert all(value > 0 for value in times)
+
+
+def test_run_batch_stats(write_notebook: NotebookWriter, tmp_path: pathlib.Path) -> None:
+    paths = [write_notebook(f"nb{i}.ipynb", [r"$$x\tag{9}$$", "$(9)$"]) for i in range(3)]
+    broken = tmp_path / "broken.ipynb"
+    broken.write_text("{")
+    results = run_batch([*paths, broken], jobs=2)
+    assert results[-1].stats is None
+    total = RenumberStats()
+    for result in results[:-1]:
+        assert result.stats is not None
+        total.merge(result.stats)
+    assert (total.markdown_cells, total.replacements, total.refs_rewritten) == (6, 3, 3)
+
+
+def test_renumber_sources_pool() -> None:
+    sources = [
+        f"$$x_{i} \\tag{{{300 - i}}}$$\n\nsee $({299 - i})$" if i % 3 else "text"
+        for i in range(PARALLEL_MIN_CELLS * 2)
+    ]
+    sequential = TagRenumberer()
+    expected = renumber_sources(sources, sequential)
+    with WorkerPool(2) as pool:
+        renumberer = pool.renumberer
+        assert renumber_sources(sources, renumberer, pool) == expected
+        assert pool._executor is not None
+    counters = [f.name for f in dataclasses.fields(RenumberStats) if not f.name.endswith("_time")]
+    for name in counters:
+        assert getattr(renumberer.stats, name) == getattr(sequential.stats, name)
+
+
+def test_run_batch_single_notebook(write_notebook: NotebookWriter) -> None:
+    sources = [f"$$x_{i} \\tag{{a{i}}}$$\n\n$(a{i + 1})$" for i in range(PARALLEL_MIN_CELLS)]
+    path = write_notebook("nb.ipynb", sources)
+    [result] = run_batch([path], jobs=2)
+    assert result.ok
+    assert result.stats is not None
+    assert result.stats.replacements == PARALLEL_MIN_CELLS
+    cells = nbformat.read(path, as_version=4).cells
+    assert cells[0].source == "$$x_0 \\tag{1}$$\n\n$(2)$"
+    last = PARALLEL_MIN_CELLS - 1
+    assert cells[-1].source == f"$$x_{last} \\tag{{{last + 1}}}$$\n\n$(a{last + 1})$"
+
+
+def test_dump_sources_without_nb(tmp_path: pathlib.Path) -> None:
+    # an nbformat 3 notebook cannot be spliced, so it is read from the bytes
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [nbformat.v4.new_markdown_cell("$$x \\tag{5}$$")]
+    raw = nbformat.writes(nbformat.convert(nb, 3)).encode("utf-8")
+    sources = NotebookSources(tmp_path / "a.ipynb", raw, ["$$x \\tag{5}$$"])
+    f = io.BytesIO()
+    dump_sources(sources, ["$$x \\tag{1}$$"], f)
+    written = nbformat.reads(f.getvalue().decode("utf-8"), as_version=4)
+    assert written.nbformat == 4
+    assert [cell.source for cell in written.cells] == ["$$x \\tag{1}$$"]
+
+
+def test_process_markdown(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "doc.md"
+    lines = ["# Doc", "$(b)$", "$$a$$", "```\r\n$$c \\tag{b}$$\r\n```", "$$b \\tag{b}$$"]
+    path.write_bytes("\r\n\r\n".join(lines).encode())
+    result = process_notebook(path, tmp_path / "out.md", stream=True)
+    assert result.ok, result.error
+    assert result.changed
+    lines[1:3] = ["$(2)$", "$$a\\tag{1}$$"]
+    lines[4] = "$$b \\tag{2}$$"
+    assert (tmp_path / "out.md").read_bytes() == "\r\n\r\n".join(lines).encode()
+
+
+def test_process_stdio(write_notebook: NotebookWriter) -> None:
+    stdout = io.BytesIO()
+    result = process_stdio(io.BytesIO(b"{x} $(1)$\n\n$$a \\tag{1}$$\n"), stdout)
+    assert result.ok, result.error
+    assert stdout.getvalue() == b"{x} $(1)$\n\n$$a \\tag{1}$$\n"
+    assert not result.changed
+
+    raw = write_notebook("a.ipynb", ["$$a$$", "$(x)$\n\n$$b \\tag{x}$$"]).read_bytes()
+    stdout = io.BytesIO()
+    result = process_stdio(io.BytesIO(raw), stdout)
+    assert result.ok, result.error
+    cells = json.loads(stdout.getvalue())["cells"]
+    assert ["".join(cell["source"]) for cell in cells] == [
+        "$$a\\tag{1}$$",
+        "$(2)$\n\n$$b \\tag{2}$$",
+    ]
+
+    stdout = io.BytesIO()
+    assert not process_stdio(io.BytesIO(b'{"cells": 1}'), stdout).ok
+    assert stdout.getvalue() == b""
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_check_notebook(write_notebook: NotebookWriter, *, stream: bool) -> None:
+    path = write_notebook("nb.ipynb", ["$$a \\tag{1}$$", "prose", "$$b$$\nsee $(1)$\n"])
+    content = path.read_bytes()
+    result = check_notebook(path, stream=stream)
+    assert result.ok
+    assert result.changed
+    assert result.diff is None
+    result = check_notebook(path, stream=stream, diff=True)
+    assert result.diff == (
+        f"--- a/{path.as_posix()}:cell 2\n"
+        f"+++ b/{path.as_posix()}:cell 2\n"
+        "@@ -1,2 +1,2 @@\n"
+        "-$$b$$\n"
+        "+$$b\\tag{2}$$\n"
+        " see $(1)$\n"
+    )
+    # nothing is written
+    assert path.read_bytes() == content
+    clean = write_notebook("clean.ipynb", ["$$a \\tag{1}$$"])
+    result = check_notebook(clean, diff=True)
+    assert not result.changed
+    assert result.diff == ""
+
+
+def test_check_markdown_without_newline(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "doc.md"
+    path.write_text("$$a \\tag{3}$$")
+    result = check_notebook(path, diff=True)
+    assert result.diff == (
+        f"--- a/{path.as_posix()}\n"
+        f"+++ b/{path.as_posix()}\n"
+        "@@ -1 +1 @@\n"
+        "-$$a \\tag{3}$$\n"
+        "\\ No newline at end of cell\n"
+        "+$$a \\tag{1}$$\n"
+        "\\ No newline at end of cell\n"
+    )
@@ -0,0 +1,128 @@
+import pathlib
+
+import nbformat
+import pytest
+
+from tagrefsorter import book
+from tagrefsorter.batch import renumber_sources
+from tagrefsorter.book import (
+    NotebookPlan,
+    _apply_notebook,
+    _ApplyJob,
+    number_book,
+    plan_notebook,
+    run_book,
+)
+from tagrefsorter.parser import CellPlan, TagRenumberer, TagRewrite
+from tests.constants import NotebookWriter
+
+BOOK = [
+    # chapter 1 refers to a tag of chapter 3
+    [
+        "# Chapter 1",
+        "$$a \\tag{x}$$\n\nsee $(z)$",
+        "$$\n\\begin{align}\nb \\\\\nc \\tag{y}\n\\end{align}\n$$",
+    ],
+    # no math at all
+    ["# Chapter 2"],
+    ["$$d \\tag{z}$$\n\n$(x)$ and $(y)$", "$$e \\tag{x}$$", "$(x)$"],
+]
+
+
+def _sources(path: pathlib.Path) -> list[str]:
+    return [cell.source for cell in nbformat.read(path, as_version=4).cells]
+
+
+def _expected(book: list[list[str]]) -> list[list[str]]:
+    """Renumber the book as a single notebook holding all cells."""
+    texts = renumber_sources([source for chapter in book for source in chapter])
+    results = []
+    for chapter in book:
+        results.append(texts[: len(chapter)])
+        texts = texts[len(chapter) :]
+    return results
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+@pytest.mark.parametrize("stream", [False, True])
+def test_run_book(
+    write_notebook: NotebookWriter,
+    jobs: int,
+    *,
+    stream: bool,
+) -> None:
+    paths = [write_notebook(f"ch{i}.ipynb", chapter) for i, chapter in enumerate(BOOK)]
+    results = run_book(paths, jobs, stream=stream)
+    assert [r.ok for r in results] == [True, True, True]
+    assert [r.changed for r in results] == [True, False, True]
+    assert [_sources(path) for path in paths] == _expected(BOOK)
+    assert _sources(paths[2]) == ["$$d \\tag{4}$$\n\n$(5)$ and $(3)$", "$$e \\tag{5}$$", "$(5)$"]
+    stats = [r.stats for r in results]
+    assert all(s is not None for s in stats)
+    assert sum(s.markdown_cells for s in stats if s) == 7
+    assert sum(s.update_map_size for s in stats if s) == 3
+
+
+def test_run_book_failure(write_notebook: NotebookWriter, tmp_path: pathlib.Path) -> None:
+    paths = [write_notebook(f"ch{i}.ipynb", chapter) for i, chapter in enumerate(BOOK)]
+    broken = tmp_path / "broken.ipynb"
+    broken.write_text("{")
+    results = run_book([paths[0], broken, paths[2]], jobs=2)
+    assert not any(r.ok for r in results)
+    assert "another notebook" in str(results[0].error)
+    assert [_sources(path) for path in paths] == BOOK
+
+
+def test_run_book_write_failure(
+    write_notebook: NotebookWriter,
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    paths = [write_notebook(f"ch{i}.ipynb", chapter) for i, chapter in enumerate(BOOK)]
+    dump_sources = book.dump_sources
+
+    def _dump_sources(sources: object, texts: list[str], f: object) -> None:
+        if texts[0] == "$$d \\tag{4}$$\n\n$(5)$ and $(3)$":
+            msg = "disk full"
+            raise OSError(msg)
+        dump_sources(sources, texts, f)  # type: ignore[arg-type]
+
+    monkeypatch.setattr(book, "dump_sources", _dump_sources)
+    results = run_book(paths)
+    assert [r.error for r in results] == [
+        "not written because another notebook of the book failed",
+        "not written because another notebook of the book failed",
+        "OSError: disk full",
+    ]
+    # the first chapter was renumbered before the last one failed, but not written
+    assert [_sources(path) for path in paths] == BOOK
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["ch0.ipynb", "ch1.ipynb", "ch2.ipynb"]
+
+
+def test_number_book() -> None:
+    def plan(*labels: str | None) -> CellPlan:
+        return CellPlan(tags=[TagRewrite(start=0, length=0, label=label) for label in labels])
+
+    plans = [
+        NotebookPlan(pathlib.Path("a"), plans=[plan("x", None), None, plan("y")]),
+        NotebookPlan(pathlib.Path("b"), plans=[None]),
+        NotebookPlan(pathlib.Path("c"), plans=[plan(None, "x")]),
+    ]
+    assert [p.tag_count for p in plans] == [3, 0, 2]
+    first_tags, update_map = number_book(plans)
+    assert first_tags == [1, 4, 4]
+    assert update_map == {"x": "5", "y": "3"}
+
+
+def test_notebook_changed(write_notebook: NotebookWriter) -> None:
+    path = write_notebook("ch.ipynb", BOOK[0])
+    renumberer = TagRenumberer()
+    plan = plan_notebook(path, renumberer)
+    assert plan.error is None
+    assert plan.plans[0] is None
+    assert plan.tag_count == 3
+    write_notebook(path, ["$$changed$$"])
+    result, staged = _apply_notebook(_ApplyJob(plan, 1, {}), renumberer, stream=False)
+    assert result.error == "notebook changed while the book was numbered"
+    assert staged is None
+    assert _sources(path) == ["$$changed$$"]
@@ -0,0 +1,72 @@
+import os
+import pathlib
+
+from tagrefsorter.batch import renumber_sources
+from tagrefsorter.cache import ParseCache
+from tagrefsorter.parser import CellPlan, Reference, TagRenumberer, TagRewrite
+
+CELLS = [
+    "$$\n\\begin{align}\na &= b \\tag{x} \\\\\nc &= d\n\\end{align}\n$$\n\nsee $(y)$",
+    "$$e \\tag{y}$$\n\n$(x)$",
+]
+
+
+def test_cache_round_trip(tmp_path: pathlib.Path) -> None:
+    cache = ParseCache(tmp_path)
+    plan = CellPlan(
+        tags=[TagRewrite(start=3, length=0, label=None), TagRewrite(start=9, length=7, label="a")],
+        refs=[Reference(start=20, length=5, label="b")],
+    )
+    assert cache.get("text") is None
+    cache.put("text", plan)
+    assert cache.get("text") == plan
+    assert cache.get("other text") is None
+
+
+def test_replay_matches_parse(tmp_path: pathlib.Path) -> None:
+    expected = renumber_sources(CELLS, TagRenumberer())
+    first = TagRenumberer(cache=ParseCache(tmp_path))
+    assert renumber_sources(CELLS, first) == expected
+    assert first.stats.cached_cells == 0
+    second = TagRenumberer(cache=ParseCache(tmp_path))
+    second.analyze_cell = None  # type: ignore[assignment,method-assign]
+    assert renumber_sources(CELLS, second) == expected
+    assert second.stats.cached_cells == len(CELLS)
+
+
+def test_evict_other_versions(tmp_path: pathlib.Path) -> None:
+    stale = tmp_path / "v0.0.0-0" / "ab"
+    stale.mkdir(parents=True)
+    (stale / "ab.json").write_text("{}")
+    cache = ParseCache(tmp_path)
+    cache.put("text", CellPlan())
+    cache.evict()
+    assert not (tmp_path / "v0.0.0-0").exists()
+    assert cache.get("text") == CellPlan()
+
+
+def test_evict_least_recently_used(tmp_path: pathlib.Path) -> None:
+    cache = ParseCache(tmp_path)
+    for i in range(4):
+        cache.put(f"cell {i}", CellPlan())
+        path = cache._path(f"cell {i}")
+        os.utime(path, (i, i))
+    size = cache._path("cell 0").stat().st_size
+    cache.max_bytes = size * 2
+    assert cache.evict() == 2
+    assert cache.get("cell 0") is None
+    assert cache.get("cell 1") is None
+    assert cache.get("cell 3") == CellPlan()
+
+
+def test_variant(tmp_path: pathlib.Path) -> None:
+    cache = ParseCache(tmp_path)
+    plan = CellPlan(refs=[Reference(start=4, length=9, label="b", form="eqref")])
+    cache.put("text", plan, "paren,eqref")
+    assert cache.get("text", "paren,eqref") == plan
+    assert cache.get("text") is None
+    # a cache filled with other reference forms is not replayed
+    cells = ["$$e \\tag{y}$$\n\n$\\eqref{y}$"]
+    assert renumber_sources(cells, TagRenumberer(cache=cache)) == ["$$e \\tag{1}$$\n\n$\\eqref{y}$"]
+    expected = ["$$e \\tag{1}$$\n\n$\\eqref{1}$"]
+    assert renumber_sources(cells, TagRenumberer(cache=cache, ref_forms=("eqref",))) == expected
@@ -0,0 +1,184 @@
+import io
+import json
+import pathlib
+import sys
+
+import nbformat
+import pytest
+
+from tagrefsorter.cli import main
+from tests.constants import NotebookWriter
+
+
+def _read(path: pathlib.Path) -> list[str]:
+    return [cell.source for cell in nbformat.read(path, as_version=4).cells]
+
+
+def _main(monkeypatch: pytest.MonkeyPatch, *args: str) -> None:
+    monkeypatch.setattr(sys, "argv", ["tagrefsorter", *args])
+    main()
+
+
+def test_stats(
+    write_notebook: NotebookWriter,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    tmp_path: pathlib.Path,
+) -> None:
+    a = write_notebook("a.ipynb", ["$$x$$", "$$y \\tag{2}$$\n\n$(2)$"])
+    b = write_notebook("b.ipynb", ["no math"])
+    stats_path = tmp_path / "stats.json"
+    _main(monkeypatch, str(a), str(b), "--stats", "--stats-json", str(stats_path))
+    summary = json.loads(stats_path.read_text())
+    assert summary["notebooks"] == 2
+    assert summary["markdown_cells"] == 3
+    assert summary["skipped_cells"] == 1
+    assert summary["math_blocks"] == 2
+    assert (summary["insertions"], summary["replacements"]) == (1, 1)
+    assert summary["refs_rewritten"] == 1
+    assert summary["wall_time"] >= summary["latex_time"] > 0
+    # the table on stderr has the same rows
+    err = capsys.readouterr().err
+    assert [line.split()[0] for line in err.splitlines()] == list(summary)
+
+
+def test_stats_with_watch(monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path) -> None:
+    with pytest.raises(SystemExit):
+        _main(monkeypatch, str(tmp_path), "--watch", "--stats")
+
+
+def test_book(
+    write_notebook: NotebookWriter,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: pathlib.Path,
+) -> None:
+    write_notebook("book/01.ipynb", ["$$a \\tag{x}$$\n\n$(y)$"])
+    write_notebook("book/02.ipynb", ["$$b \\tag{y}$$\n\n$(x)$"])
+    _main(monkeypatch, str(tmp_path / "book"), "--book")
+    assert [_read(tmp_path / "book" / name) for name in ["01.ipynb", "02.ipynb"]] == [
+        ["$$a \\tag{1}$$\n\n$(2)$"],
+        ["$$b \\tag{2}$$\n\n$(1)$"],
+    ]
+
+
+def test_stdio(monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]) -> None:
+    stdout = io.TextIOWrapper(io.BytesIO())
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(b"$(x)$\n\n$$a \\tag{x}$$\n")))
+    monkeypatch.setattr(sys, "stdout", stdout)
+    _main(monkeypatch, "-", "--stats")
+    assert stdout.buffer.getvalue() == b"$(1)$\n\n$$a \\tag{1}$$\n"
+    assert "refs_rewritten" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("args", [["-", "a.ipynb"], ["-", "--output", "a.ipynb"], ["-", "--book"]])
+def test_stdio_with_other_options(monkeypatch: pytest.MonkeyPatch, args: list[str]) -> None:
+    with pytest.raises(SystemExit):
+        _main(monkeypatch, *args)
+
+
+def test_markdown_output(monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "doc.md"
+    path.write_text("$$a$$\n")
+    _main(monkeypatch, str(path), "--output", str(tmp_path / "out.md"))
+    assert (tmp_path / "out.md").read_text() == "$$a\\tag{1}$$\n"
+    with pytest.raises(SystemExit):
+        _main(monkeypatch, str(path), "--output", str(tmp_path / "out.ipynb"))
+
+
+def test_manifest(
+    write_notebook: NotebookWriter,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    tmp_path: pathlib.Path,
+) -> None:
+    a = write_notebook("nbs/a.ipynb", ["$$a$$"])
+    manifest = tmp_path / "manifest.json"
+    _main(monkeypatch, str(a), "--manifest", str(manifest))
+    assert capsys.readouterr().out == f"Overwritten: {a}\n"
+    a.touch()
+    _main(monkeypatch, str(a), "--manifest", str(manifest), "--stats")
+    out, err = capsys.readouterr()
+    assert out == f"Skipped: {a}\n"
+    assert ["skipped_notebooks", "1"] in [line.split() for line in err.splitlines()]
+    with pytest.raises(SystemExit):
+        _main(monkeypatch, str(a), "--manifest", str(manifest), "--book")
+
+
+def test_check(
+    write_notebook: NotebookWriter,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    clean = write_notebook("clean.ipynb", ["$$a \\tag{1}$$"])
+    dirty = write_notebook("dirty.ipynb", ["$$a \\tag{2}$$"])
+    _main(monkeypatch, str(clean), "--check")
+    with pytest.raises(SystemExit) as exc_info:
+        _main(monkeypatch, str(clean), str(dirty), "--check")
+    assert exc_info.value.code == 1
+    out, err = capsys.readouterr()
+    assert out == ""
+    assert err == f"Would change: {dirty}\n1 would change, 1 unchanged, 0 failed\n"
+    assert _read(dirty) == ["$$a \\tag{2}$$"]
+
+
+def test_diff(
+    write_notebook: NotebookWriter,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    dirty = write_notebook("dirty.ipynb", ["$$a \\tag{2}$$"])
+    # --diff alone does not fail
+    _main(monkeypatch, str(dirty), "--diff")
+    out, err = capsys.readouterr()
+    assert out.splitlines()[2:] == [
+        "@@ -1 +1 @@",
+        "-$$a \\tag{2}$$",
+        "\\ No newline at end of cell",
+        "+$$a \\tag{1}$$",
+        "\\ No newline at end of cell",
+    ]
+    assert err == f"Would change: {dirty}\n"
+    with pytest.raises(SystemExit):
+        _main(monkeypatch, str(dirty), "--diff", "--check", "--jobs", "2")
+    assert capsys.readouterr().out == out
+    assert _read(dirty) == ["$$a \\tag{2}$$"]
+
+
+@pytest.mark.parametrize("option", ["--output", "--manifest", "--book", "--watch"])
+def test_check_with_other_options(
+    write_notebook: NotebookWriter,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: pathlib.Path,
+    option: str,
+) -> None:
+    path = write_notebook("a.ipynb", [])
+    args = [option, str(tmp_path / "b.ipynb")] if option in {"--output", "--manifest"} else [option]
+    with pytest.raises(SystemExit):
+        _main(monkeypatch, str(path), "--check", *args)
+    with pytest.raises(SystemExit):
+        _main(monkeypatch, "-", "--diff")
+
+
+def test_ref_forms(
+    write_notebook: NotebookWriter,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    path = write_notebook("a.ipynb", ["$\\eqref{b}$ $(b)$ $\\ref{b}$", "$$x \\tag{b}$$"])
+    _main(monkeypatch, str(path), "--ref-forms", "eqref, ref")
+    assert _read(path) == ["$\\eqref{1}$ $(b)$ $\\ref{1}$", "$$x \\tag{1}$$"]
+    capsys.readouterr()
+    with pytest.raises(SystemExit):
+        _main(monkeypatch, str(path), "--ref-forms", "paren,cite")
+    assert "unknown reference form: cite" in capsys.readouterr().err
+
+
+def test_markdown_profile(
+    write_notebook: NotebookWriter,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    path = write_notebook("a.ipynb", ["[see](u) $(b)$ *and* **more**", "$$x \\tag{b}$$"])
+    _main(monkeypatch, str(path), "--markdown-profile", "minimal")
+    assert _read(path) == ["[see](u) $(1)$ *and* **more**", "$$x \\tag{1}$$"]
+    with pytest.raises(SystemExit):
+        _main(monkeypatch, str(path), "--markdown-profile", "gfm")
@@ -0,0 +1,115 @@
+import functools
+import os
+import pathlib
+import sys
+
+import nbformat
+import pytest
+
+from tagrefsorter.batch import new_renumberer
+from tagrefsorter.cli import main
+from tagrefsorter.index import IndexedRef, IndexedTag, LabelIndex
+from tests.constants import NotebookWriter
+
+CODE_CELL = nbformat.v4.new_code_cell("x = 1")
+""" leading cell of the notebooks, so that the indices of markdown cells start at 1 """
+
+
+def test_queries(write_notebook: NotebookWriter, tmp_path: pathlib.Path) -> None:
+    a = write_notebook("nbs/a.ipynb", [CODE_CELL, "$$x \\tag{e}$$", "by $(e)$ and $(f)$"])
+    b = write_notebook("nbs/b.ipynb", [CODE_CELL, "$$y$$\n\n$$z \\tag{e}$$\n\n$$w \\tag{e}$$"])
+    with LabelIndex(tmp_path / "index.sqlite") as index:
+        results = index.update([a, b])
+        assert [result.changed for result in results] == [True, True]
+        assert index.definitions("e") == [
+            IndexedTag("nbs/a.ipynb", 1, 4, "e", 1),
+            IndexedTag("nbs/b.ipynb", 1, 11, "e", 2),
+            IndexedTag("nbs/b.ipynb", 1, 26, "e", 3),
+        ]
+        assert index.references("e") == [IndexedRef("nbs/a.ipynb", 2, 3, "e")]
+        assert index.dangling() == [IndexedRef("nbs/a.ipynb", 2, 13, "f")]
+        assert [tag.path for tag in index.duplicates()] == ["nbs/b.ipynb", "nbs/b.ipynb"]
+        assert index.definitions("missing") == []
+
+
+def test_incremental_update(write_notebook: NotebookWriter, tmp_path: pathlib.Path) -> None:
+    a = write_notebook("a.ipynb", [CODE_CELL, "$$x \\tag{e}$$"])
+    b = write_notebook("b.ipynb", [CODE_CELL, "$(e)$"])
+    path = tmp_path / "index.sqlite"
+    with LabelIndex(path) as index:
+        index.update([a, b])
+    with LabelIndex(path) as index:
+        # unchanged, touched (same content) and modified notebooks
+        assert [result.skipped for result in index.update([a, b])] == [True, True]
+        os.utime(a, ns=(0, 0))
+        write_notebook(b, [CODE_CELL, "$$y \\tag{e}$$"])
+        results = index.update([a, b])
+        assert [(result.skipped, result.changed) for result in results] == [
+            (True, False),
+            (False, True),
+        ]
+        assert index.references("e") == []
+        assert [tag.path for tag in index.definitions("e")] == ["a.ipynb", "b.ipynb"]
+        # a deleted notebook is forgotten, one that cannot be read keeps its entries
+        a.unlink()
+        b.write_text("{")
+        results = index.update([b])
+        assert not results[0].ok
+        assert [tag.path for tag in index.definitions("e")] == ["b.ipynb"]
+
+
+def test_ref_forms(write_notebook: NotebookWriter, tmp_path: pathlib.Path) -> None:
+    a = write_notebook("a.ipynb", [CODE_CELL, "$$x \\tag{e}$$", "$(e)$ and $\\eqref{e}$"])
+    all_forms = functools.partial(new_renumberer, ref_forms=("paren", "eqref"))
+    with LabelIndex(tmp_path / "index.sqlite") as index:
+        index.update([a])
+        assert index.references("e") == [IndexedRef("a.ipynb", 2, 0, "e")]
+        # an update with other forms parses the notebooks again
+        assert [result.changed for result in index.update([a], 1, all_forms)] == [True]
+        assert index.references("e") == [
+            IndexedRef("a.ipynb", 2, 0, "e"),
+            IndexedRef("a.ipynb", 2, 11, "e", "eqref"),
+        ]
+        assert [result.skipped for result in index.update([a], 1, all_forms)] == [True]
+
+
+def test_other_version(
+    write_notebook: NotebookWriter,
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    a = write_notebook("a.ipynb", [CODE_CELL, "$$x \\tag{e}$$"])
+    path = tmp_path / "index.sqlite"
+    with LabelIndex(path) as index:
+        index.update([a])
+    monkeypatch.setattr("tagrefsorter.index.__version__", "0.0.0-other")
+    with LabelIndex(path) as index:
+        assert index.definitions("e") == []
+        assert [result.changed for result in index.update([a])] == [True]
+
+
+def test_cli(
+    write_notebook: NotebookWriter,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    tmp_path: pathlib.Path,
+) -> None:
+    write_notebook("a.ipynb", [CODE_CELL, "$$x \\tag{e}$$\n\n$(f)$ $\\eqref{e}$"])
+    monkeypatch.chdir(tmp_path)
+
+    def _main(*args: str) -> str:
+        monkeypatch.setattr(sys, "argv", ["tagrefsorter", "index", *args])
+        main()
+        return capsys.readouterr().out
+
+    assert _main("update", "--jobs", "2") == "Indexed: a.ipynb\n1 indexed, 0 unchanged, 0 failed\n"
+    assert _main("update") == "0 indexed, 1 unchanged, 0 failed\n"
+    assert _main("defs", "e") == "a.ipynb:1:4\t\\tag{e}\t(1)\n"
+    assert _main("refs", "f") == "a.ipynb:1:15\t$(f)$\n"
+    assert _main("update", "--ref-forms", "paren,eqref") == (
+        "Indexed: a.ipynb\n1 indexed, 0 unchanged, 0 failed\n"
+    )
+    assert _main("refs", "e") == "a.ipynb:1:22\t\\eqref{e}\n"
+    assert _main("dangling") == "a.ipynb:1:15\t$(f)$\n"
+    assert _main("duplicates") == ""
+    assert (tmp_path / ".tagrefsorter-index.sqlite").exists()
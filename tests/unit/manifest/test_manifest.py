@@ -0,0 +1,125 @@
+import os
+import pathlib
+
+import pytest
+
+from tagrefsorter import manifest as manifest_module
+from tagrefsorter.manifest import Manifest, run_incremental
+from tests.constants import NotebookWriter
+
+
+def _run(paths: list[pathlib.Path], manifest_path: pathlib.Path) -> list[tuple[bool, bool]]:
+    manifest = Manifest(manifest_path)
+    results = run_incremental(paths, manifest)
+    manifest.save()
+    assert all(result.ok for result in results)
+    return [(result.skipped, result.changed) for result in results]
+
+
+def _age(path: pathlib.Path) -> None:
+    # older than the manifest, as if renumbered in an earlier second
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**10))
+
+
+def test_run_incremental(
+    write_notebook: NotebookWriter,
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    a = write_notebook("a.ipynb", ["$$a$$"])
+    b = write_notebook("b.ipynb", ["$$b \\tag{1}$$"])
+    manifest_path = tmp_path / "manifest.json"
+    assert _run([a, b], manifest_path) == [(False, True), (False, False)]
+    _age(a)
+    _age(b)
+    assert _run([a, b], manifest_path) == [(True, False), (True, False)]
+
+    # a trusted fingerprint is not even hashed
+    def _fail(_: pathlib.Path) -> str:
+        raise AssertionError
+
+    with monkeypatch.context() as m:
+        m.setattr(manifest_module, "file_digest", _fail)
+        assert _run([a, b], manifest_path) == [(True, False), (True, False)]
+
+    # a new mtime with the same content is hashed and skipped
+    a.touch()
+    assert _run([a], manifest_path) == [(True, False)]
+    # an edit is renumbered
+    write_notebook(b, ["$$b \\tag{9}$$", "$$c$$"])
+    assert _run([a, b], manifest_path) == [(True, False), (False, True)]
+
+
+def test_run_incremental_copies(
+    write_notebook: NotebookWriter,
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    a = write_notebook("a.ipynb", ["$$a$$"])
+    b = tmp_path / "b.ipynb"
+    b.write_bytes(a.read_bytes())
+    calls: list[list[pathlib.Path]] = []
+    run_batch = manifest_module.run_batch
+
+    def _run_batch(paths: list[pathlib.Path], *args: object, **kwargs: object) -> object:
+        calls.append(paths)
+        return run_batch(paths, *args, **kwargs)
+
+    monkeypatch.setattr(manifest_module, "run_batch", _run_batch)
+    manifest_path = tmp_path / "manifest.json"
+    assert _run([a, b], manifest_path) == [(False, True), (False, True)]
+    assert calls == [[a]]
+    assert a.read_bytes() == b.read_bytes()
+    assert "\\tag{1}" in a.read_text()
+    # a copy of a renumbered notebook is known without being renumbered
+    c = tmp_path / "c.ipynb"
+    c.write_bytes(a.read_bytes())
+    assert _run([c], manifest_path) == [(True, False)]
+    assert calls[-1] == []
+
+
+def test_manifest_forgets_unseen_files(
+    write_notebook: NotebookWriter,
+    tmp_path: pathlib.Path,
+) -> None:
+    a = write_notebook("a.ipynb", ["$$a \\tag{1}$$"])
+    b = write_notebook("b.ipynb", ["$$b \\tag{1}$$"])
+    manifest_path = tmp_path / "manifest.json"
+    _run([a, b], manifest_path)
+    # b is renamed, and a is deleted
+    content = a.read_bytes()
+    renamed = b.rename(tmp_path / "renamed.ipynb")
+    a.unlink()
+    assert set(Manifest(manifest_path).files) == set()
+    _run([renamed], manifest_path)
+    assert set(Manifest(manifest_path).files) == {"renamed.ipynb"}
+    # the content of the deleted notebook is not trusted anymore
+    c = tmp_path / "c.ipynb"
+    c.write_bytes(content)
+    assert _run([c], manifest_path) == [(False, False)]
+    assert set(Manifest(manifest_path).files) == {"c.ipynb"}
+
+
+def test_manifest_of_another_release(
+    write_notebook: NotebookWriter,
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    a = write_notebook("a.ipynb", ["$$a \\tag{1}$$"])
+    manifest_path = tmp_path / "manifest.json"
+    _run([a], manifest_path)
+    assert Manifest(manifest_path).files
+    monkeypatch.setattr(manifest_module, "__version__", "0.0.0.dev0")
+    assert Manifest(manifest_path).files == {}
+
+
+def test_manifest_of_other_ref_forms(
+    write_notebook: NotebookWriter,
+    tmp_path: pathlib.Path,
+) -> None:
+    a = write_notebook("a.ipynb", ["$$a \\tag{1}$$"])
+    manifest_path = tmp_path / "manifest.json"
+    _run([a], manifest_path)
+    assert Manifest(manifest_path, ("paren",)).files
+    assert Manifest(manifest_path, ("paren", "eqref")).files == {}
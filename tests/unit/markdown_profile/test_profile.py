@@ -0,0 +1,83 @@
+import random
+
+import pytest
+from markdown_it import MarkdownIt
+
+from tagrefsorter.batch import renumber_sources
+from tagrefsorter.parser import TagParser, TagRenumberer, _inline_maths, block_parser
+
+ATOMS = [
+    "$(1)$", "$(a)$", "$x$", "$", "$$", "$$x \\tag{a}$$", "$$\n", "5$", "\\$", "\\", "`", "``",
+    "`$(1)$`", "x", " ", "\n", "\n\n", "*", "**", "_", "~~", "&#36;", "&amp;", "[", "]", "](u)",
+    '](u "$(1)$")', "![", "[l]", '[l]: u "$(1)$"\n', "<", ">", "<b>", "</b>", "<div>\n",
+    "<!-- $(1)$ -->", "<http://$(1)$>", "> ", "- ", "* ", "1. ", "    ", "\t", "```\n", "~~~\n",
+    "# ", "===\n", "---\n", "***\n", "|", "| a | $(1)$ |\n", "$(1", ")$", "\\tag{b}",
+]  # fmt: skip
+
+
+def _random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(ATOMS) for _ in range(rng.randrange(1, 40)))
+
+
+def _math_tokens(md: MarkdownIt, text: str) -> list[tuple[str, str, int, str | None]]:
+    """Return the math of a text, with the content of its inline token (None for a block)."""
+    results: list[tuple[str, str, int, str | None]] = []
+    for token in md.parse(text, {}):
+        if token.type == "math_block":
+            results.append((token.type, token.content, token.meta["offset"], None))
+        elif token.type == "inline":
+            inline = md.inline.parse(token.content, md, {}, [])
+            results += [
+                ("math_inline", content, offset, token.content)
+                for offset, content in _inline_maths(inline)
+            ]
+    return results
+
+
+def _block_tokens(md: MarkdownIt, text: str) -> list[tuple[str, str, list[int] | None]]:
+    """Return the tokens of a block parse read by the renumberer."""
+    return [
+        (token.type, token.content, token.map)
+        for token in md.parse(text, {})
+        if token.type in {"inline", "math_block"}
+    ]
+
+
+def test_same_math_tokens() -> None:
+    full = block_parser("full")
+    minimal = block_parser("minimal")
+    rng = random.Random(0)  # noqa: S311
+    for _ in range(3000):
+        text = _random_text(rng)
+        assert _math_tokens(minimal, text) == _math_tokens(full, text), text
+        assert _block_tokens(minimal, text) == _block_tokens(full, text), text
+
+
+@pytest.mark.parametrize("engine", ["pylatexenc", "fast"])
+def test_same_plans(engine: str) -> None:
+    rng = random.Random(1)  # noqa: S311
+    cells = [
+        "## Energy\n\nBy $(e)$ (see [*notes*](n.md#e) &amp; **below**), we have\n\n$$E \\tag{e}$$",
+        "$$\n\\begin{align}\na \\tag{e} \\\\\nb\n\\end{align}\n$$\n\n- item $(e)$\n  $$c$$",
+        *(_random_text(rng) for _ in range(300)),
+    ]
+    full = TagRenumberer(engine=engine)
+    minimal = TagRenumberer(engine=engine, markdown_profile="minimal")
+    assert [minimal.analyze_cell(cell) for cell in cells] == [
+        full.analyze_cell(cell) for cell in cells
+    ]
+    assert renumber_sources(cells, minimal) == renumber_sources(cells, full)
+
+
+def test_rules() -> None:
+    md = block_parser("minimal")
+    assert md.options["html"]
+    enabled = {
+        rule.name
+        for ruler in (md.core.ruler, md.block.ruler, md.inline.ruler, md.inline.ruler2)
+        for rule in ruler.__rules__
+        if rule.enabled
+    }
+    assert not enabled & {"emphasis", "entity", "newline", "strikethrough", "table", "text_join"}
+    with pytest.raises(ValueError, match="unknown markdown profile"):
+        TagParser(markdown_profile="gfm")
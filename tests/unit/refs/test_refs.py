@@ -0,0 +1,53 @@
+import argparse
+
+import pytest
+
+from tagrefsorter.refs import (
+    REF_FORMS,
+    find_macro_refs,
+    format_ref,
+    macro_pattern,
+    parse_ref_forms,
+    ref_forms_arg,
+)
+
+
+def test_parse_ref_forms() -> None:
+    assert parse_ref_forms(["ref", "paren", "ref"]) == ("paren", "ref")
+    assert parse_ref_forms([]) == ()
+    with pytest.raises(ValueError, match="unknown reference form: cite"):
+        parse_ref_forms(["eqref", "cite"])
+
+
+def test_ref_forms_arg() -> None:
+    assert ref_forms_arg("ref, paren") == ("paren", "ref")
+    with pytest.raises(argparse.ArgumentTypeError, match="unknown reference form: cite"):
+        ref_forms_arg("eqref,cite")
+
+
+def test_format_ref() -> None:
+    assert [format_ref(form, "3") for form in REF_FORMS] == ["$(3)$", "\\eqref{3}", "\\ref{3}"]
+
+
+@pytest.mark.parametrize(
+    ("latex", "expected"),
+    [
+        ("\\eqref{a} = \\ref{ b }", [(0, 9, "eqref", "a"), (12, 9, "ref", "b")]),
+        ("\\eqref {a}", [(0, 10, "eqref", "a")]),
+        ("\\\\ref{a} \\\\\\ref{b}", [(11, 7, "ref", "b")]),
+        ("% \\eqref{a}\n\\eqref{b}", [(12, 9, "eqref", "b")]),
+        ("\\%\\eqref{a}", [(2, 9, "eqref", "a")]),
+        ("\\pageref{a} \\refx{b} \\eqref{c{d}} \\eqref{e\nf}", []),
+    ],
+)
+def test_find_macro_refs(latex: str, expected: list[tuple[int, int, str, str]]) -> None:
+    pattern = macro_pattern(("paren", "eqref", "ref"))
+    assert pattern is not None
+    assert list(find_macro_refs(pattern, latex)) == expected
+
+
+def test_macro_pattern_of_some_forms() -> None:
+    assert macro_pattern(("paren",)) is None
+    pattern = macro_pattern(("eqref",))
+    assert pattern is not None
+    assert list(find_macro_refs(pattern, "\\ref{a} \\eqref{b}")) == [(8, 9, "eqref", "b")]
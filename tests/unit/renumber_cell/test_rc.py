@@ -0,0 +1,231 @@
+import pickle
+
+import pytest
+
+from tagrefsorter.batch import renumber_sources
+from tagrefsorter.parser import CellPlan, Reference, TagRenumberer
+
+
+def test_number_plan_records_refs() -> None:
+    tag_renumberer = TagRenumberer()
+    text = (
+        "$(b)$ before\n\n$$x \\tag{b}$$\n\n$$\n\\begin{align}\ny \\\\\nz\n\\end{align}\n$$\n\n$(a)$"
+    )
+    plan = tag_renumberer.analyze_cell(text)
+    assert [ref.label for ref in plan.refs] == ["b", "a"]
+    for ref in plan.refs:
+        assert text[ref.start : ref.start + ref.length] == f"$({ref.label})$"
+    assert tag_renumberer.number_plan(plan) == 1
+    assert tag_renumberer.update_map == {"b": "1"}
+    assert tag_renumberer.next_tag == 4
+    new_text = tag_renumberer.render_plan(text, plan, 1)
+    assert new_text.count("\\tag{") == 3
+    assert new_text.startswith("$(1)$ before")
+    assert new_text.endswith("$(a)$")
+
+
+def test_render_plan_refs() -> None:
+    tag_renumberer = TagRenumberer()
+    tag_renumberer.update_map = {"a": "2"}
+    text = "$(a)$ and $( a )$ and $(c)$"
+    plan = CellPlan(
+        refs=[
+            Reference(start=0, length=5, label="a"),
+            Reference(start=10, length=7, label="a"),
+            Reference(start=22, length=5, label="c"),
+        ],
+    )
+    assert tag_renumberer.render_plan(text, plan, 1) == "$(2)$ and $(2)$ and $(c)$"
+    assert tag_renumberer.stats.refs_rewritten == 2
+
+
+def test_refs_to_later_cells() -> None:
+    cells = ["See $(2)$.", "$$a \\tag{2}$$", "$$b \\tag{1}$$\n\n$(1)$"]
+    assert renumber_sources(cells, TagRenumberer()) == [
+        "See $(1)$.",
+        "$$a \\tag{1}$$",
+        "$$b \\tag{2}$$\n\n$(2)$",
+    ]
+
+
+def test_renumber_cell_fast_path(monkeypatch: pytest.MonkeyPatch) -> None:
+    tag_renumberer = TagRenumberer()
+
+    def _fail(*_: object) -> None:
+        msg = "the parser must not run on a math-free cell"
+        raise AssertionError(msg)
+
+    # the parser is shared by all renumberers, so it is patched only for this test
+    monkeypatch.setattr(tag_renumberer.parser.md, "parse", _fail)
+    texts = ["# Title\n\nprose only", "inline $x$ and 5$ only", ""]
+    assert [tag_renumberer.plan_cell(text) for text in texts] == [None, None, None]
+    assert tag_renumberer.stats.markdown_cells == 3
+    assert tag_renumberer.stats.skipped_cells == 3
+
+
+def test_renumber_cell_counts_parsed_cells() -> None:
+    tag_renumberer = TagRenumberer()
+    renumber_sources(["$$x$$", "$(1)$", "prose"], tag_renumberer)
+    assert tag_renumberer.stats.markdown_cells == 3
+    assert tag_renumberer.stats.skipped_cells == 1
+    tag_renumberer.reset()
+    assert tag_renumberer.stats.markdown_cells == 0
+
+
+@pytest.mark.parametrize(
+    ("cells", "expected"),
+    [
+        (
+            ["$$x \\tag{5}$$", "`$(5)$` in code and $(5)$ outside"],
+            ["$$x \\tag{1}$$", "`$(5)$` in code and $(1)$ outside"],
+        ),
+        (
+            ["$$x \\tag{5}$$", "\\$(5)$ escaped, 3$(5)$ after a digit, $(5)$"],
+            ["$$x \\tag{1}$$", "\\$(5)$ escaped, 3$(5)$ after a digit, $(1)$"],
+        ),
+        (
+            ["`$$x \\tag{5}$$`\n\n$$x \\tag{5}$$"],
+            ["`$$x \\tag{5}$$`\n\n$$x \\tag{1}$$"],
+        ),
+        (
+            ["> quote $(5)$\n> more $(5)$ $(5)$\n\n$$y \\tag{5}$$"],
+            ["> quote $(1)$\n> more $(1)$ $(1)$\n\n$$y \\tag{1}$$"],
+        ),
+        (
+            ["$$x \\tag{9}$$", "![img $(9)$](u) and $(9)$ [l $(9)$](v)"],
+            ["$$x \\tag{1}$$", "![img $(1)$](u) and $(1)$ [l $(1)$](v)"],
+        ),
+        (
+            ["$$x \\tag{9}$$", "![a ![b $(9)$](w) $(9)$](x) and $(9)$\n> [l $(9)$](v) $(9)$"],
+            ["$$x \\tag{1}$$", "![a ![b $(1)$](w) $(1)$](x) and $(1)$\n> [l $(1)$](v) $(1)$"],
+        ),
+    ],
+)
+def test_renumber_cell_locates_by_offset(cells: list[str], expected: list[str]) -> None:
+    assert renumber_sources(cells, TagRenumberer()) == expected
+
+
+def test_renumber_cell_crlf() -> None:
+    cell = "$$a \\tag{7}$$\n\n$$\n\\begin{align}\nx \\\\\ny \\tag{7}\n\\end{align}\n$$\n$(7)$"
+    expected = (
+        "$$a \\tag{1}$$\n\n$$\n\\begin{align}\nx \\tag{2}\\\\\ny \\tag{3}\n\\end{align}\n$$\n$(3)$"
+    )
+    tag_renumberer = TagRenumberer()
+    plan = tag_renumberer.analyze_cell(cell.replace("\n", "\r\n"))
+    first_tag = tag_renumberer.number_plan(plan)
+    rendered = tag_renumberer.render_plan(cell.replace("\n", "\r\n"), plan, first_tag)
+    assert rendered == expected.replace("\n", "\r\n")
+
+
+def test_plan_is_compact() -> None:
+    plan = TagRenumberer().analyze_cell("$$a$$\n\n$$b \\tag{x}$$\n\n$(x)$")
+    assert not hasattr(plan, "__dict__")
+    assert not hasattr(plan.tags[0], "__dict__")
+    assert not hasattr(plan.refs[0], "__dict__")
+    assert pickle.loads(pickle.dumps(plan)) == plan  # noqa: S301
+
+
+def test_math_block_ending_outside_blockquote() -> None:
+    text = ">$$\n# $$"
+    assert TagRenumberer().analyze_cell(text) == CellPlan()
+
+
+@pytest.mark.parametrize(
+    ("cells", "expected"),
+    [
+        (["$$a \\tag{1}$$", "$(1)$", "prose"], False),
+        (["see $(2)$", "$$a \\tag{1}$$", "$$b \\tag{2}$$"], False),
+        (["$$\n\\begin{align}\na \\tag{1} \\\\\nb \\notag\n\\end{align}\n$$"], False),
+        (["$(x)$ is not a tag"], False),
+        (["$$a \\tag{2}$$"], True),
+        (["$$a$$"], True),
+        (["$$a \\tag{ 1 }$$"], True),
+        (["$$a \\tag{1}$$", "$$b \\tag{1}$$"], True),
+        (["$$a \\tag{1}$$", "$( 1 )$"], True),
+        (["$( 2 )$", "$$a \\tag{1}$$", "$$b \\tag{2}$$"], True),
+    ],
+)
+def test_needs_renumbering(cells: list[str], *, expected: bool) -> None:
+    assert (renumber_sources(cells, TagRenumberer()) != cells) == expected
+    assert TagRenumberer().needs_renumbering(cells) == expected
+
+
+def test_needs_renumbering_stops_at_first_change() -> None:
+    tag_renumberer = TagRenumberer()
+    assert tag_renumberer.needs_renumbering(["$$a \\tag{1}$$", "$$b$$", "$$c \\tag{3}$$"])
+    assert tag_renumberer.stats.markdown_cells == 2
+
+
+ALL_FORMS = ("paren", "eqref", "ref")
+
+
+@pytest.mark.parametrize(
+    ("cells", "expected"),
+    [
+        (
+            ["see $\\eqref{b}$, $(a)$ and $x = \\ref{ a }$", "$$x \\tag{a}$$\n\n$$y \\tag{b}$$"],
+            ["see $\\eqref{2}$, $(1)$ and $x = \\ref{1}$", "$$x \\tag{1}$$\n\n$$y \\tag{2}$$"],
+        ),
+        (
+            ["$$\n\\begin{align}\na \\tag{b} \\\\\nb = \\eqref{b} % \\ref{b}\n\\end{align}\n$$"],
+            [
+                (
+                    "$$\n\\begin{align}\na \\tag{1} \\\\\nb = \\eqref{1} % \\ref{b}\n\\tag{2}"
+                    "\\end{align}\n$$"
+                ),
+            ],
+        ),
+        (
+            ["> $$x \\tag{a} \\\\ref{a}$$\n>\n> by $\\eqref{a}$\n\n`$\\eqref{a}$` \\eqref{a}"],
+            ["> $$x \\tag{1} \\\\ref{a}$$\n>\n> by $\\eqref{1}$\n\n`$\\eqref{a}$` \\eqref{a}"],
+        ),
+        (
+            ["$$x \\tag{\\ref{a}}$$", "$$y \\tag{a}$$\n\n$\\ref{a}$"],
+            ["$$x \\tag{1}$$", "$$y \\tag{2}$$\n\n$\\ref{2}$"],
+        ),
+    ],
+)
+def test_ref_forms(cells: list[str], expected: list[str]) -> None:
+    assert renumber_sources(cells, TagRenumberer(ref_forms=ALL_FORMS)) == expected
+    crlf = [cell.replace("\n", "\r\n") for cell in cells]
+    assert renumber_sources(crlf, TagRenumberer(ref_forms=ALL_FORMS)) == [
+        text.replace("\n", "\r\n") for text in expected
+    ]
+    assert TagRenumberer(ref_forms=ALL_FORMS).needs_renumbering(cells)
+    assert not TagRenumberer(ref_forms=ALL_FORMS).needs_renumbering(expected)
+
+
+def test_ref_forms_not_enabled() -> None:
+    cells = ["$$x \\tag{a}$$", "$\\eqref{a}$ $(a)$ $\\ref{a}$"]
+    assert renumber_sources(cells, TagRenumberer()) == [
+        "$$x \\tag{1}$$",
+        "$\\eqref{a}$ $(1)$ $\\ref{a}$",
+    ]
+    assert renumber_sources(cells, TagRenumberer(ref_forms=("eqref",))) == [
+        "$$x \\tag{1}$$",
+        "$\\eqref{1}$ $(a)$ $\\ref{a}$",
+    ]
+    tag_renumberer = TagRenumberer(ref_forms=("eqref",))
+    assert tag_renumberer.plan_cell("see $(a)$") is None
+    assert tag_renumberer.stats.skipped_cells == 1
+
+
+def test_ref_forms_scan_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    cells = [
+        "$$x \\tag{a}$$ and $(a)$, $\\eqref{a}$, $y = \\ref{a}$\n\n[link](u) $(a)$",
+        "$$\n\\begin{gather}\nx = \\eqref{a} \\\\\ny\n\\end{gather}\n$$",
+    ]
+    calls: list[str] = []
+    tag_renumberer = TagRenumberer()
+    md = tag_renumberer.parser.md
+    for name, parse in [("block", md.parse), ("inline", md.inline.parse)]:
+        monkeypatch.setattr(
+            md if name == "block" else md.inline,
+            "parse",
+            lambda *args, _name=name, _parse=parse: calls.append(_name) or _parse(*args),
+        )
+    renumber_sources(cells, tag_renumberer)
+    default_calls = list(calls)
+    calls.clear()
+    renumber_sources(cells, TagRenumberer(ref_forms=ALL_FORMS))
+    assert calls == default_calls == ["block", "inline", "block"]
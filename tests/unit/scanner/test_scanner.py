@@ -0,0 +1,125 @@
+import pathlib
+import random
+
+import nbformat
+import pytest
+from pylatexenc.latexwalker import LatexMathNode, LatexWalker
+
+from tagrefsorter.batch import renumber_sources
+from tagrefsorter.parser import MathBlock, Rewrite, TagParser, TagRenumberer
+from tagrefsorter.scanner import scan_math_block
+
+BLOCKS = [
+    "$$$$",
+    "$$ $$",
+    "$$x = y$$",
+    "$$x \\tag{1}$$",
+    "$$x \\tag {2} y \\notag  z$$",
+    "$$\\tag 3$$",
+    "$$\\tag 12$$",
+    "$$ \\tag*{A}  \\\\  b\\\\[2pt] $$",
+    "$$\\tag *{B}\n$$",
+    "$$\\tag\n{eq:x}$$",
+    "$$ a \\tag{ 6 } \\\\ b $$",
+    "$$a % c \\tag{2}\n$$",
+    "$$a % c\n\n  b$$",
+    "$$x \\alpha  \n  $$",
+    "$$\\tag{1}  \\notag\n\n$$",
+    "$$\n\\begin{align}\na &= b \\tag{2}\\\\\nc &= d \\\\\ne &= f \\notag \\\\\ng\n\\end{align}$$",
+    "$$\n\\begin{gather}\na \\tag*{A} \\\\\nb \\tag 3\n\\end{gather}\n$$",
+    "$$\\begin{align}\n% comment \\tag{9}\nx \\tag{eq:x} \\\\ % c\ny \\label{a}\n\\end{align}$$",
+    "$$\\begin{alignat}{2}\nx&y\\\\\n\\begin{cases}a\\\\b\\end{cases}\\tag{5}\n\\end{alignat}$$",
+    "$$\\begin{align}\na \\\\\nb \\alpha \n\\end{align}$$",
+    "$$\\begin {align}a \\newline b\\end{align} \\tag{4}$$",
+    "$$\\begin{align*}a \\\\ b\\end{align*}$$",
+    "$$ {a \\\\ b} \\begin{x}\\\\\\end{x} c \\, d\\ e \\{ \\% f$$",
+]
+
+UNSUPPORTED = [
+    "$$\\[ x \\]$$",
+    "$$a}b$$",
+    "$${a$$",
+    "$$\\tag$$",
+    "$$\\tag\\alpha$$",
+    "$$\\tag}$$",
+    "$$a %x$$",
+    "$$\\é x$$",
+    "$$\\begin{align}a$$",
+    "$$\\begin{align}a\\end{gather}$$",
+]
+
+ATOMS = [
+    *[
+        "x",
+        "a &= b",
+        " ",
+        "\n",
+        "\n\n",
+        "\\tag{1}",
+        "\\tag {2}",
+        "\\tag 3",
+        "\\tag*{A}",
+        "\\tag *{B}",
+    ],
+    *["\\notag", "\\notag ", "\\\\", "\\\\[2pt]", "\\newline", "\\frac{1}{2}", "\\,", "\\ "],
+    *["\\alpha \n", "% comment \\tag{9}\n", "% c\n  ", "% c\n\n", "{a \\\\ b}", "{\\tag{7}}"],
+    *["\\begin{cases} a \\\\ b \\end{cases}", "\\label{l}", "\\{", "\\}", "\\%", "[", "]"],
+]
+
+
+def _random_block(rnd: random.Random) -> str:
+    inner = "".join(rnd.choice(ATOMS) for _ in range(rnd.randint(0, 10)))
+    env = rnd.choice(["align", "alignat", "gather", "align*", "equation", None, None])
+    if env is not None:
+        inner = rnd.choice(["", "\n"]) + f"\\begin{{{env}}}{inner}\\end{{{env}}}"
+    return "$$" + inner + rnd.choice(["", " ", "\n", " \\tag{8}"]) + "$$"
+
+
+def _rewrites(nodes: list, content: str) -> list[Rewrite]:
+    math_block = MathBlock(content=content, layer0_nodes=nodes)
+    return TagParser()._find_block_rewrites(math_block)
+
+
+def _pylatexenc_rewrites(content: str) -> list[Rewrite]:
+    walker = LatexWalker(content, latex_context=TagParser().latex_context)
+    math_node = walker.get_latex_nodes(pos=0)[0][0]
+    assert isinstance(math_node, LatexMathNode)
+    return _rewrites(math_node.nodelist, content)
+
+
+@pytest.mark.parametrize("content", BLOCKS)
+def test_scan_math_block(content: str) -> None:
+    nodes = scan_math_block(content)
+    assert nodes is not None
+    assert _rewrites(nodes, content) == _pylatexenc_rewrites(content)
+
+
+def test_scan_random_blocks() -> None:
+    rnd = random.Random(0)  # noqa: S311
+    for _ in range(2000):
+        content = _random_block(rnd)
+        nodes = scan_math_block(content)
+        assert nodes is not None, content
+        assert _rewrites(nodes, content) == _pylatexenc_rewrites(content), content
+
+
+@pytest.mark.parametrize("content", UNSUPPORTED)
+def test_scan_math_block_unsupported(content: str) -> None:
+    assert scan_math_block(content) is None
+
+
+def test_fast_engine_matches_pylatexenc() -> None:
+    cells = [
+        cell.source
+        for path in sorted(pathlib.Path("tests/unit").glob("*/*.ipynb"))
+        for cell in nbformat.read(path, as_version=4).cells
+        if cell.cell_type == "markdown"
+    ]
+    cells += [f"{block}\n\nsee $(3)$ and $(A)$" for block in BLOCKS + UNSUPPORTED]
+    fast = renumber_sources(cells, TagRenumberer(engine="fast"))
+    assert fast == renumber_sources(cells, TagRenumberer())
+
+
+def test_unknown_engine() -> None:
+    with pytest.raises(ValueError, match="unknown engine"):
+        TagRenumberer(engine="regex")
@@ -0,0 +1,161 @@
+import functools
+import io
+import json
+import pathlib
+import sys
+
+import nbformat
+import pytest
+
+from tagrefsorter import __version__, cli
+from tagrefsorter.batch import new_renumberer
+from tagrefsorter.server import (
+    INVALID_PARAMS,
+    INVALID_REQUEST,
+    METHOD_NOT_FOUND,
+    PARSE_ERROR,
+    Server,
+    main,
+)
+
+SOURCES = [
+    "$$\na = b \\tag{2}\n$$",
+    "see $(2)$",
+    "$$\nc = d\n$$",
+]
+RENUMBERED = [
+    "$$\na = b \\tag{1}\n$$",
+    "see $(1)$",
+    "$$\nc = d\n\\tag{2}$$",
+]
+
+
+def _request(server: Server, method: str, params: dict | None = None) -> dict:
+    line = json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params or {}})
+    response = server.handle_line(line)
+    assert response is not None
+    return response
+
+
+def test_sources() -> None:
+    result = _request(Server(), "renumber", {"sources": SOURCES})["result"]
+    assert result["sources"] == RENUMBERED
+    assert result["changes"] == [
+        {"index": 0, "source": RENUMBERED[0]},
+        {"index": 1, "source": RENUMBERED[1]},
+        {"index": 2, "source": RENUMBERED[2]},
+    ]
+
+
+def test_requests_are_independent() -> None:
+    server = Server()
+    renumberer = server.renumberer
+    _request(server, "renumber", {"sources": SOURCES})
+    result = _request(server, "renumber", {"sources": ["$$\nx\n$$"]})["result"]
+    assert result["sources"] == ["$$\nx\n\\tag{1}$$"]
+    assert server.renumberer is renumberer
+
+
+def test_notebook() -> None:
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [
+        nbformat.v4.new_code_cell("print(1)"),
+        *[nbformat.v4.new_markdown_cell(source) for source in SOURCES],
+    ]
+    document = json.loads(nbformat.writes(nb))
+    result = _request(Server(), "renumber", {"notebook": document})["result"]
+    assert [change["index"] for change in result["changes"]] == [1, 2, 3]
+    updated = nbformat.reads(json.dumps(result["notebook"]), as_version=4)
+    assert [cell.source for cell in updated.cells[1:]] == RENUMBERED
+
+
+def test_path(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "nb.ipynb"
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [nbformat.v4.new_markdown_cell(source) for source in SOURCES]
+    nbformat.write(nb, path)
+    original = path.read_bytes()
+
+    result = _request(Server(), "renumber", {"path": str(path)})["result"]
+    assert result == {
+        "changes": [{"index": i, "source": source} for i, source in enumerate(RENUMBERED)],
+        "written": False,
+    }
+    assert path.read_bytes() == original
+
+    result = _request(Server(), "renumber", {"path": str(path), "write": True})["result"]
+    assert result["written"]
+    assert [cell.source for cell in nbformat.read(path, as_version=4).cells] == RENUMBERED
+
+
+def test_errors(tmp_path: pathlib.Path) -> None:
+    server = Server()
+    assert server.handle_line("{")["error"]["code"] == PARSE_ERROR  # type: ignore[index]
+    assert _request(server, "format")["error"]["code"] == METHOD_NOT_FOUND
+    assert _request(server, "renumber")["error"]["code"] == INVALID_PARAMS
+    assert _request(server, "renumber", {"sources": [1]})["error"]["code"] == INVALID_PARAMS
+    error = _request(server, "renumber", {"path": str(tmp_path / "missing.ipynb")})["error"]
+    assert "FileNotFoundError" in error["message"]
+    assert server.handle_line("[]") == {
+        "jsonrpc": "2.0",
+        "id": None,
+        "error": {"code": INVALID_REQUEST, "message": "Invalid Request"},
+    }
+
+
+@pytest.mark.parametrize(
+    "params",
+    [{}, {"sources": [1]}, {"path": "missing.ipynb"}],
+)
+def test_failed_notifications_get_no_response(params: dict) -> None:
+    server = Server()
+    assert (
+        server.handle_line(json.dumps({"jsonrpc": "2.0", "method": "renumber", "params": params}))
+        is None
+    )
+    assert server.handle_line(json.dumps({"jsonrpc": "2.0", "method": "format"})) is None
+
+
+def test_options() -> None:
+    sources = ["$$x \\tag{a}$$", "see $\\eqref{a}$ and $(a)$"]
+    server = Server(functools.partial(new_renumberer, engine="fast", ref_forms=("eqref",)))
+    result = _request(server, "renumber", {"sources": sources})["result"]
+    assert result["sources"] == ["$$x \\tag{1}$$", "see $\\eqref{1}$ and $(a)$"]
+
+
+def test_main_options(monkeypatch: pytest.MonkeyPatch) -> None:
+    sources = ["$$x \\tag{a}$$", "see $\\eqref{a}$ and $(a)$"]
+    request = {"jsonrpc": "2.0", "id": 1, "method": "renumber", "params": {"sources": sources}}
+    stdout = io.StringIO()
+    monkeypatch.setattr(sys, "stdin", io.StringIO(json.dumps(request) + "\n"))
+    monkeypatch.setattr(sys, "stdout", stdout)
+    main(["--engine", "fast", "--ref-forms", "eqref", "--markdown-profile", "minimal"])
+    response = json.loads(stdout.getvalue())
+    assert response["result"]["sources"] == ["$$x \\tag{1}$$", "see $\\eqref{1}$ and $(a)$"]
+
+
+def test_cli_serve(monkeypatch: pytest.MonkeyPatch) -> None:
+    request = {"jsonrpc": "2.0", "id": 1, "method": "renumber", "params": {"sources": SOURCES}}
+    stdout = io.StringIO()
+    monkeypatch.setattr(sys, "stdin", io.StringIO(json.dumps(request) + "\n"))
+    monkeypatch.setattr(sys, "stdout", stdout)
+    monkeypatch.setattr(sys, "argv", ["tagrefsorter", "serve", "--engine", "fast"])
+    cli.main()
+    assert json.loads(stdout.getvalue())["result"]["sources"] == RENUMBERED
+
+
+def test_serve() -> None:
+    requests = [
+        {"jsonrpc": "2.0", "id": 1, "method": "version"},
+        {"jsonrpc": "2.0", "method": "version"},
+        {"jsonrpc": "2.0", "id": 2, "method": "renumber", "params": {"sources": SOURCES}},
+        {"jsonrpc": "2.0", "id": 3, "method": "shutdown"},
+        {"jsonrpc": "2.0", "id": 4, "method": "version"},
+    ]
+    stdin = io.StringIO("".join(json.dumps(request) + "\n" for request in requests))
+    stdout = io.StringIO()
+    Server().serve(stdin, stdout)
+    responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert [response["id"] for response in responses] == [1, 2, 3]
+    assert responses[0]["result"] == __version__
+    assert responses[1]["result"]["sources"] == RENUMBERED
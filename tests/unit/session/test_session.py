@@ -0,0 +1,64 @@
+import dataclasses
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tagrefsorter.batch import renumber_sources
+from tagrefsorter.parser import TagParser, TagRenumberer
+
+CELLS = [
+    "See $(b)$ and $(a)$.",
+    "$$x \\tag{a}$$",
+    "$$\n\\begin{align}\ny \\tag{b} \\\\\nz \\notag \\\\\nw\n\\end{align}\n$$",
+    "prose only",
+    "$$\n\\begin{gather}\np \\\\\nq % last line\n\\end{gather}\n$$\n\n$(a)$",
+]
+
+
+def _notebooks(count: int) -> list[list[str]]:
+    rng = random.Random(0)  # noqa: S311
+    return [rng.choices(CELLS, k=rng.randint(1, 12)) for _ in range(count)]
+
+
+def test_parser_is_immutable() -> None:
+    tag_parser = TagParser()
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        tag_parser.engine = "fast"  # type: ignore[misc]
+    with pytest.raises(ValueError, match="unknown engine"):
+        TagParser(engine="regex")
+
+
+def test_sessions_share_the_parser() -> None:
+    tag_parser = TagParser(engine="fast")
+    first, second = tag_parser.session(), tag_parser.session()
+    assert first.parser is second.parser is tag_parser
+    # interleaved sessions do not see each other's numbering
+    first_plan = first.plan_cell(CELLS[1])
+    second_plan = second.plan_cell(CELLS[2])
+    assert first_plan is not None
+    assert second_plan is not None
+    assert first.number_plan(first_plan) == second.number_plan(second_plan) == 1
+    assert first.update_map == {"a": "1"}
+    assert second.update_map == {"b": "1"}
+    assert first.stats.markdown_cells == second.stats.markdown_cells == 1
+
+
+def test_parse_tree_is_not_modified() -> None:
+    session = TagRenumberer()
+    text = CELLS[4]
+    plan = session.analyze_cell(text)
+    assert plan == session.analyze_cell(text)
+    assert len(plan.tags) == 2
+
+
+@pytest.mark.parametrize("engine", ["pylatexenc", "fast"])
+def test_threads_share_one_parser(engine: str) -> None:
+    notebooks = _notebooks(64)
+    expected = [renumber_sources(cells, TagRenumberer(engine=engine)) for cells in notebooks]
+    tag_parser = TagParser(engine=engine)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(lambda cells: renumber_sources(cells, tag_parser.session()), notebooks),
+        )
+    assert results == expected
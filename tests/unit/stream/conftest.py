@@ -0,0 +1,31 @@
+import base64
+import pathlib
+
+import nbformat
+import pytest
+
+MARKDOWN_SOURCES = [
+    '# Title with "quotes", \\\\ backslashes and unicode: 数式',
+    "$$\n\\begin{align}\na &= b \\tag{x} \\\\\nc &= d\n\\end{align}\n$$",
+    "",
+    "see $(x)$ and $(y)$ with } ] { [ inside",
+    "$$e \\tag{y}$$",
+]
+
+
+@pytest.fixture
+def notebook_path(tmp_path: pathlib.Path) -> pathlib.Path:
+    """Notebook mixing markdown cells with code cells that have large outputs."""
+    nb = nbformat.v4.new_notebook()
+    png = base64.b64encode(bytes(range(256)) * 64).decode()
+    for i, source in enumerate(MARKDOWN_SOURCES):
+        nb.cells.append(nbformat.v4.new_markdown_cell(source))
+        code = nbformat.v4.new_code_cell(f'print("cell {i} \\"$$x\\tag{{1}}$$\\"")')
+        code.outputs = [
+            nbformat.v4.new_output("display_data", data={"image/png": png, "text/plain": "[]{}"}),
+            nbformat.v4.new_output("stream", name="stdout", text='"escaped" \\ $(x)$\n'),
+        ]
+        nb.cells.append(code)
+    path = tmp_path / "nb.ipynb"
+    nbformat.write(nb, path)
+    return path
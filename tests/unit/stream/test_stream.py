@@ -0,0 +1,101 @@
+import json
+import pathlib
+
+import nbformat
+import pytest
+
+from tagrefsorter.batch import process_notebook, update_nb
+from tagrefsorter.stream import (
+    NotebookFormatError,
+    atomic_write,
+    read_markdown_sources,
+    scan_markdown_sources,
+)
+
+from .conftest import MARKDOWN_SOURCES
+
+
+def test_read_markdown_sources(notebook_path: pathlib.Path) -> None:
+    with read_markdown_sources(notebook_path) as (buf, sources):
+        assert [source.text for source in sources] == MARKDOWN_SOURCES
+        assert [source.index for source in sources] == [0, 2, 4, 6, 8]
+        for source in sources:
+            value = json.loads(buf[source.start : source.end])
+            assert "".join(value) == source.text
+
+
+def test_scan_rejects_other_formats() -> None:
+    with pytest.raises(NotebookFormatError):
+        scan_markdown_sources(b'{"nbformat": 3, "worksheets": []}')
+    with pytest.raises(NotebookFormatError):
+        scan_markdown_sources(b'{"nbformat": 4, "cells": [{"source": "x"')
+
+
+def test_stream_matches_nbformat(notebook_path: pathlib.Path, tmp_path: pathlib.Path) -> None:
+    streamed = tmp_path / "streamed.ipynb"
+    loaded = tmp_path / "loaded.ipynb"
+    assert process_notebook(notebook_path, streamed, stream=True).ok
+    assert process_notebook(notebook_path, loaded).ok
+    streamed_nb = nbformat.read(streamed, as_version=4)
+    loaded_nb = nbformat.read(loaded, as_version=4)
+    assert [c.source for c in streamed_nb.cells] == [c.source for c in loaded_nb.cells]
+    assert [c.get("outputs") for c in streamed_nb.cells] == [
+        c.get("outputs") for c in loaded_nb.cells
+    ]
+    assert streamed_nb.cells[2].source.count("\\tag{") == 2
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_splice_is_byte_identical_to_nbformat(
+    notebook_path: pathlib.Path,
+    tmp_path: pathlib.Path,
+    *,
+    stream: bool,
+) -> None:
+    expected = tmp_path / "expected.ipynb"
+    nb = nbformat.read(notebook_path, as_version=4)
+    nbformat.write(update_nb(nb), expected)
+    assert process_notebook(notebook_path, stream=stream).changed
+    assert notebook_path.read_bytes() == expected.read_bytes()
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_unchanged_notebook_is_not_written(
+    notebook_path: pathlib.Path,
+    *,
+    stream: bool,
+) -> None:
+    assert process_notebook(notebook_path).changed
+    before = notebook_path.stat()
+    result = process_notebook(notebook_path, stream=stream)
+    assert result.ok
+    assert not result.changed
+    after = notebook_path.stat()
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+
+
+def test_splice_keeps_string_sources(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "nb.ipynb"
+    template = (
+        '{"cells": [{"cell_type": "markdown", "metadata": {},'
+        ' "source": "$$x\\\\tag{%s}$$\\n\\n$(%s)$"}],'
+        ' "metadata": {}, "nbformat": 4, "nbformat_minor": 5}'
+    )
+    path.write_text(template % ("5", "5"))
+    assert process_notebook(path, stream=True).changed
+    assert path.read_text() == template % ("1", "1")
+
+
+def _write_and_fail(path: pathlib.Path) -> None:
+    with atomic_write(path) as f:
+        f.write(b"partial")
+        raise RuntimeError
+
+
+def test_atomic_write_keeps_original_on_failure(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "nb.ipynb"
+    path.write_bytes(b"original")
+    with pytest.raises(RuntimeError):
+        _write_and_fail(path)
+    assert path.read_bytes() == b"original"
+    assert list(tmp_path.iterdir()) == [path]
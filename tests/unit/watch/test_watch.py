@@ -0,0 +1,61 @@
+import pathlib
+import queue
+import threading
+from typing import TYPE_CHECKING
+
+import nbformat
+import pytest
+
+from tagrefsorter.watch import InotifyWatcher, PollingWatcher, make_watcher, watch
+
+if TYPE_CHECKING:
+    from tagrefsorter.batch import FileResult
+
+TIMEOUT = 10
+
+
+def _save(path: pathlib.Path, sources: list[str]) -> None:
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [nbformat.v4.new_markdown_cell(source) for source in sources]
+    nbformat.write(nb, path)
+
+
+def _sources(path: pathlib.Path) -> list[str]:
+    return [cell.source for cell in nbformat.read(path, as_version=4).cells]
+
+
+def test_make_watcher(tmp_path: pathlib.Path) -> None:
+    watcher = make_watcher([tmp_path])
+    assert isinstance(watcher, InotifyWatcher | PollingWatcher)
+    watcher.close()
+
+
+def test_watch(tmp_path: pathlib.Path) -> None:
+    (tmp_path / "sub").mkdir()
+    path = tmp_path / "sub" / "nb.ipynb"
+    _save(path, ["draft"])
+    results: queue.Queue[FileResult] = queue.Queue()
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=watch,
+        args=([tmp_path],),
+        kwargs={"on_result": results.put, "debounce": 0.05, "stop": stop},
+    )
+    thread.start()
+    try:
+        # rapid saves are debounced into a single run
+        for label in ["8", "9"]:
+            _save(path, [f"$$x \\tag{{{label}}}$$", f"$({label})$"])
+        result = results.get(timeout=TIMEOUT)
+        assert result.ok
+        assert result.changed
+        assert _sources(path) == ["$$x \\tag{1}$$", "$(1)$"]
+        _save(path, ["$$y$$", "$$x \\tag{1}$$", "$(1)$"])
+        result = results.get(timeout=TIMEOUT)
+        assert _sources(path) == ["$$y\\tag{1}$$", "$$x \\tag{2}$$", "$(2)$"]
+        # the writes of tagrefsorter itself are ignored
+        with pytest.raises(queue.Empty):
+            results.get(timeout=1.5)
+    finally:
+        stop.set()
+        thread.join(TIMEOUT)
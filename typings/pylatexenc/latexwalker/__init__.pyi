@@ -6,25 +6,68 @@ from pylatexenc.macrospec._argparsers import ParsedMacroArgs
 class LatexNode:
     pos: int
     len: int
-    def __init__(self) -> None: ...
+    def __init__(
+        self,
+        pos: int | None = None,
+        len: int | None = None,  # noqa: A002
+    ) -> None: ...
 
 class LatexCharsNode(LatexNode):
     chars: str
-    def __init__(self, chars: str) -> None: ...
+    def __init__(
+        self,
+        chars: str,
+        pos: int | None = None,
+        len: int | None = None,  # noqa: A002
+    ) -> None: ...
+
+class LatexGroupNode(LatexNode):
+    nodelist: list[LatexNode]
+    delimiters: tuple[str, str]
+    def __init__(
+        self,
+        nodelist: list[LatexNode],
+        delimiters: tuple[str, str] = ("{", "}"),
+        pos: int | None = None,
+        len: int | None = None,  # noqa: A002
+    ) -> None: ...
 
 class LatexCommentNode(LatexNode):
     comment: str
-    def __init__(self, comment: str) -> None: ...
+    comment_post_space: str
+    def __init__(
+        self,
+        comment: str,
+        comment_post_space: str = "",
+        pos: int | None = None,
+        len: int | None = None,  # noqa: A002
+    ) -> None: ...
 
 class LatexMacroNode(LatexNode):
     macroname: str
     nodeargd: ParsedMacroArgs
-    def __init__(self, macroname: str) -> None: ...
+    macro_post_space: str
+    def __init__(
+        self,
+        macroname: str,
+        nodeargd: ParsedMacroArgs = ...,
+        macro_post_space: str = "",
+        pos: int | None = None,
+        len: int | None = None,  # noqa: A002
+    ) -> None: ...
 
 class LatexEnvironmentNode(LatexNode):
     environmentname: str
     nodelist: list[LatexNode]
-    def __init__(self, environmentname: str, nodelist: list[LatexNode]) -> None: ...
+    nodeargd: ParsedMacroArgs
+    def __init__(
+        self,
+        environmentname: str,
+        nodelist: list[LatexNode],
+        nodeargd: ParsedMacroArgs = ...,
+        pos: int | None = None,
+        len: int | None = None,  # noqa: A002
+    ) -> None: ...
 
 class LatexMathNode(LatexNode):
     nodelist: list[LatexNode]